@@ -1,52 +1,57 @@
-# Importing the needed modules 
+# Importing the needed modules
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from Utils.Agents import Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam
-import json, os
+from Utils.LLMClient import get_llm
+from Utils.Pipeline import run_diagnosis
+from Utils.Extraction import read_file_content
+from Utils.Batch import run_batch, list_reports, BATCH_CONCURRENCY
+from Utils.Results import result_store
+import argparse, json, os
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-# read the medical report
-with open("Medical Reports\Medical Rerort - Michael Johnson - Panic Attack Disorder.txt", "r") as file:
-    medical_report = file.read()
-
-agents = {
-    "Cardiologist": Cardiologist(medical_report),
-    "Psychologist": Psychologist(medical_report),
-    "Pulmonologist": Pulmonologist(medical_report)
-}
-
-# Function to run each agent and get their response
-def get_response(agent_name, agent):
-    response = agent.run()
-    return agent_name, response
-
-# Run the agents concurrently and collect responses
-responses = {}
-with ThreadPoolExecutor() as executor:
-    futures = {executor.submit(get_response, name, agent): name for name, agent in agents.items()}
-    
-    for future in as_completed(futures):
-        agent_name, response = future.result()
-        responses[agent_name] = response
-
-team_agent = MultidisciplinaryTeam(
-    cardiologist_report=responses["Cardiologist"],
-    psychologist_report=responses["Psychologist"],
-    pulmonologist_report=responses["Pulmonologist"]
-)
-
-# Run the MultidisciplinaryTeam agent to generate the final diagnosis
-final_diagnosis = team_agent.run()
-final_diagnosis_text = "### Final Diagnosis:\n\n" + final_diagnosis
-txt_output_path = "results/final_diagnosis.txt"
-
-# Ensure the directory exists
-os.makedirs(os.path.dirname(txt_output_path), exist_ok=True)
-
-# Write the final diagnosis to the text file
-with open(txt_output_path, "w") as txt_file:
-    txt_file.write(final_diagnosis_text)
-
-print(f"Final diagnosis has been saved to {txt_output_path}")
-
-
+DEFAULT_REPORT = os.path.join("Medical Reports", "Medical Rerort - Michael Johnson - Panic Attack Disorder.txt")
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze medical reports with the specialist agents")
+    parser.add_argument("report", nargs="?", default=DEFAULT_REPORT, help="report to analyze (TXT or PDF)")
+    parser.add_argument("--batch", metavar="DIR", help="analyze every PDF/TXT report in a directory")
+    parser.add_argument("--output", default="results/batch_results.jsonl",
+                        help="JSONL results file for --batch; rerun with the same file to resume")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="reports analyzed at once in --batch mode")
+    args = parser.parse_args()
+
+    # Create the shared client once, before the pipeline loop starts
+    get_llm()
+
+    if args.batch:
+        # Analyze the whole directory, streaming one JSON line per report
+        reports = [(os.path.basename(path), path) for path in list_reports(args.batch)]
+
+        def show_progress(counts):
+            done = counts["completed"] + counts["failed"] + counts["skipped"]
+            print(f"[{done}/{counts['total']}] completed={counts['completed']} "
+                  f"failed={counts['failed']} skipped={counts['skipped']}")
+
+        summary = run_batch(reports, args.output, args.concurrency, on_progress=show_progress)
+        result_store.flush()
+        print(json.dumps(summary, indent=2))
+        print(f"Throughput: {summary['reports_per_minute']} reports/minute")
+    else:
+        # read the medical report
+        medical_report = read_file_content(args.report)
+
+        # Run the specialists concurrently and synthesize the final diagnosis
+        results = run_diagnosis(medical_report, os.path.basename(args.report))
+        for role, error in results["failed_specialists"].items():
+            print(f"Warning: {role} did not complete ({error})")
+
+        print("### Final Diagnosis:\n\n" + results["final_diagnosis"])
+
+        # Diagnoses are written in the background; wait for this one before exiting
+        result_store.flush()
+        print(f"Diagnosis {results['result_id']} has been saved to {result_store.path}")
+
+
+# Guarded so worker processes (e.g. for PDF extraction) can import this safely
+if __name__ == "__main__":
+    main()
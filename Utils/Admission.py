@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from .Metrics import ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+
+# Model calls in flight across the whole process, whatever started them.
+# PIPELINE_MAX_CONCURRENCY, which used to cap only diagnoses, still works.
+MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT", os.environ.get("PIPELINE_MAX_CONCURRENCY", "8")))
+# Model calls that may wait for a slot before new requests are turned away with 429
+MAX_QUEUED = int(os.environ.get("ADMISSION_MAX_QUEUED", "64"))
+
+# Lower numbers go first: chat replies, then interactive analyses, then batches
+PRIORITIES = {"chat": 0, "analysis": 1, "batch": 2}
+DEFAULT_PRIORITY = "analysis"
+
+# The priority class of whatever model calls the current request makes
+request_priority = ContextVar("request_priority", default=DEFAULT_PRIORITY)
+
+
+class Overloaded(Exception):
+    """Raised when a request arrives while its priority class's queue is full"""
+
+    def __init__(self, priority, retry_after):
+        super().__init__(f"Server busy: too many {priority} requests waiting, retry in {retry_after}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class AdmissionController:
+    """Process-wide limit on in-flight model calls, with a priority-ordered wait queue
+
+    Every model call takes a slot; when none is free it waits, and freed
+    slots go to the waiting call with the best priority, oldest first.
+    Requests are admitted up front with admit(), which rejects them when the
+    calls already queued ahead of them fill MAX_QUEUED, so a burst gets a fast
+    429 instead of slowing every request down together.
+    """
+
+    def __init__(self, max_inflight=MAX_INFLIGHT, max_queued=MAX_QUEUED):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.inflight = 0
+        self._waiting = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        # Moving average of how long a call holds its slot, for Retry-After
+        self._hold_seconds = 5.0
+        self.stats = {name: {"admitted": 0, "rejected": 0, "queued": 0} for name in PRIORITIES}
+
+    def _ahead(self, rank):
+        # Called with the lock held
+        return sum(1 for entry in self._waiting if entry[0] <= rank)
+
+    def retry_after(self, priority=None):
+        """Seconds until a request of this class would likely get a slot"""
+        rank = PRIORITIES[priority or request_priority.get()]
+        with self._lock:
+            ahead = self._ahead(rank)
+        return max(1, math.ceil((ahead + 1) / self.max_inflight * self._hold_seconds))
+
+    def admit(self, priority):
+        """Start a request of this priority class; raises Overloaded if its queue is full"""
+        rank = PRIORITIES[priority]
+        request_priority.set(priority)
+        with self._lock:
+            ahead = self._ahead(rank)
+            if ahead >= self.max_queued:
+                self.stats[priority]["rejected"] += 1
+            else:
+                self.stats[priority]["admitted"] += 1
+                return
+        ADMISSION_REJECTED.inc(priority)
+        raise Overloaded(priority, self.retry_after(priority))
+
+    def _claim(self, priority, wake):
+        # A slot right away, or a queued waiter; called with the lock held
+        rank = PRIORITIES[priority]
+        if self.inflight < self.max_inflight and self._ahead(rank) == 0:
+            self.inflight += 1
+            return None
+        waiter = _Waiter(wake)
+        heapq.heappush(self._waiting, (rank, next(self._order), waiter))
+        self.stats[priority]["queued"] += 1
+        return waiter
+
+    def _withdraw(self, waiter):
+        # The waiter gave up; pass on a slot it was granted meanwhile
+        with self._lock:
+            if not waiter.granted:
+                self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+                heapq.heapify(self._waiting)
+                return
+        self.release()
+
+    def acquire(self):
+        """Take a slot for a model call, blocking while the queue ahead drains"""
+        priority = request_priority.get()
+        started = time.perf_counter()
+        event = threading.Event()
+        with self._lock:
+            waiter = self._claim(priority, event.set)
+        if waiter is not None:
+            try:
+                event.wait()
+            except BaseException:
+                self._withdraw(waiter)
+                raise
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, priority)
+        return time.perf_counter()
+
+    async def aacquire(self):
+        """Async version of acquire, waiting without blocking the event loop"""
+        priority = request_priority.get()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        with self._lock:
+            waiter = self._claim(priority, lambda: loop.call_soon_threadsafe(_wake, granted))
+        if waiter is not None:
+            try:
+                await granted
+            except BaseException:
+                self._withdraw(waiter)
+                raise
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, priority)
+        return time.perf_counter()
+
+    def release(self, acquired=None):
+        """Free a slot, handing it straight to the best waiting call if there is one"""
+        with self._lock:
+            if acquired is not None:
+                self._hold_seconds += 0.2 * (time.perf_counter() - acquired - self._hold_seconds)
+            if self._waiting:
+                waiter = heapq.heappop(self._waiting)[2]
+                waiter.granted = True
+            else:
+                self.inflight -= 1
+                return
+        waiter.wake()
+
+    def snapshot(self):
+        with self._lock:
+            queued = {name: sum(1 for entry in self._waiting if entry[0] == rank)
+                      for name, rank in PRIORITIES.items()}
+            return {
+                "inflight": self.inflight,
+                "max_inflight": self.max_inflight,
+                "max_queued": self.max_queued,
+                "queued": queued,
+                "average_call_seconds": round(self._hold_seconds, 3),
+                "classes": {name: dict(counts) for name, counts in self.stats.items()},
+            }
+
+
+def _wake(granted):
+    if not granted.done():
+        granted.set_result(None)
+
+
+def carry_priority(coro):
+    """Wrap a coroutine so it runs at the caller's priority on another thread's loop"""
+    priority = request_priority.get()
+
+    async def run():
+        request_priority.set(priority)
+        return await coro
+
+    return run()
+
+
+admission = AdmissionController()
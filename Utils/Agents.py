@@ -1,5 +1,65 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_community.llms import Ollama
+import re
+import time
+from contextlib import contextmanager
+
+from .LLMClient import get_llm
+from .Prompts import prompt_registry, count_tokens
+from .Metrics import AGENT_SECONDS, AGENT_ERRORS, AGENT_FALLBACKS, AGENT_GENERATED_TOKENS, AGENT_KEPT_TOKENS
+from .Cache import cached_invoke, acached_invoke, acached_stream
+
+def trim_words(response, limit, role=None):
+    """Cut a response to a word limit, recording generated vs kept tokens for role"""
+    words = response.split()
+    kept = " ".join(words[:limit]) + "..." if len(words) > limit else response
+    if role is not None:
+        record_generation(role, response, kept)
+    return kept
+
+def record_generation(role, generated, kept):
+    AGENT_GENERATED_TOKENS.inc(role, amount=count_tokens(generated))
+    AGENT_KEPT_TOKENS.inc(role, amount=count_tokens(kept))
+
+def generation_report():
+    """Estimated tokens generated vs kept after trimming, by role"""
+    generated = AGENT_GENERATED_TOKENS.values()
+    kept = AGENT_KEPT_TOKENS.values()
+    report = {}
+    for (role,), total in sorted(generated.items()):
+        kept_total = kept.get((role,), 0)
+        report[role] = {
+            "generated_tokens": total,
+            "kept_tokens": kept_total,
+            "discarded_tokens": max(total - kept_total, 0),
+            "kept_ratio": round(kept_total / total, 3) if total else None,
+        }
+    return report
+
+async def alimit_words(chunks, limit, role=None):
+    """Pass streamed text through until it exceeds a word limit, then stop showing it"""
+    text = ""
+    emitted = 0
+    kept = None
+    async for chunk in chunks:
+        text += chunk
+        # Keep draining past the limit so the full response still gets cached
+        if emitted < 0:
+            continue
+        words = list(re.finditer(r"\S+", text))
+        if len(words) > limit:
+            yield text[emitted:words[limit - 1].end()] + "..."
+            kept = text[:words[limit - 1].end()] + "..."
+            emitted = -1
+        else:
+            # Hold back trailing whitespace, so a cut at the next word puts
+            # the "..." right after the last kept word, as trim_words does
+            end = words[-1].end() if words else 0
+            if end > emitted:
+                yield text[emitted:end]
+                emitted = end
+    if 0 <= emitted < len(text):
+        yield text[emitted:]
+    if role is not None:
+        record_generation(role, text, text if kept is None else kept)
 
 class Agent:
     def __init__(self, medical_report=None, role=None, extra_info=None):
@@ -8,108 +68,83 @@ class Agent:
         self.extra_info = extra_info
         # Initialize the prompt based on role and other info
         self.prompt_template = self.create_prompt_template()
-        # Initialize the model using Ollama with MedLLaMA2
-        self.model = Ollama(model="medllama2")
+        # Use the shared MedLLaMA2 client so agents reuse pooled connections
+        self.model = get_llm()
 
     def create_prompt_template(self):
-        if self.role == "MultidisciplinaryTeam":
-            templates = f"""
-                You are a multidisciplinary medical team leader synthesizing specialist reports.
-                
-                Given Reports:
-                Cardiologist Report: {self.extra_info.get('cardiologist_report', '')}
-                Psychologist Report: {self.extra_info.get('psychologist_report', '')}
-                Pulmonologist Report: {self.extra_info.get('pulmonologist_report', '')}
-                
-                IMPORTANT: Create a concise, accurate final diagnosis based ONLY on information explicitly mentioned in the specialist reports. DO NOT assume or invent any conditions not specifically mentioned in the reports.
-                
-                Please provide a brief analysis in this format:
-                
-                [Brief 1-3 sentence summary of the main findings and recommendations]
-                • [Key finding 1]
-                • [Key finding 2 (if present)]
-                • [Key recommendation(s)]
-                
-                Your final diagnosis should be under 100 words total.
-            """
-        else:
-            templates = {
-                "Cardiologist": """
-                    You are a cardiologist examining a patient report.
-                    
-                    Patient Report: {medical_report}
-                    
-                    IMPORTANT INSTRUCTIONS:
-                    1. Analyze ONLY cardiovascular symptoms and concerns EXPLICITLY mentioned in this report
-                    2. DO NOT assume or invent any medical history, conditions, or test results
-                    3. If no cardiac symptoms are mentioned, clearly state this
-                    4. Keep your report under 50 words
-                    5. Be factual and avoid speculation
-                    
-                    Format your brief analysis as:
-                    [1-2 sentences summarizing cardiac findings and recommendations only]
-                """,
-                "Psychologist": """
-                    You are a psychologist examining a patient report.
-                    
-                    Patient Report: {medical_report}
-                    
-                    IMPORTANT INSTRUCTIONS:
-                    1. Analyze ONLY psychological/behavioral symptoms EXPLICITLY mentioned in this report
-                    2. DO NOT assume or invent any medical history, conditions, or test results
-                    3. If no psychological symptoms are mentioned, clearly state this
-                    4. Keep your report under 50 words
-                    5. Be factual and avoid speculation
-                    
-                    Format your brief analysis as:
-                    [1-2 sentences summarizing psychological findings and recommendations only]
-                """,
-                "Pulmonologist": """
-                    You are a pulmonologist examining a patient report.
-                    
-                    Patient Report: {medical_report}
-                    
-                    IMPORTANT INSTRUCTIONS:
-                    1. Analyze ONLY respiratory symptoms and concerns EXPLICITLY mentioned in this report
-                    2. DO NOT assume or invent any medical history, conditions, or test results
-                    3. If no respiratory symptoms are mentioned, clearly state this
-                    4. Keep your report under 50 words
-                    5. Be factual and avoid speculation
-                    
-                    Format your brief analysis as:
-                    [1-2 sentences summarizing respiratory findings and recommendations only]
-                """
-            }
-        templates = templates[self.role] if not isinstance(templates, str) else templates
-        return PromptTemplate.from_template(templates)
+        # Templates are compiled once per role in the registry
+        return prompt_registry.get(self.role)
+
+    def render_prompt(self):
+        """Fill this agent's template with its report (or the specialist reports)"""
+        return self.prompt_template.render(medical_report=self.medical_report, **(self.extra_info or {}))
     
+    def word_limit(self):
+        # Specialist reports are asked for 50 words, the team diagnosis for 100;
+        # the role limits allow a bit of buffer on top of that
+        return self.prompt_template.limits["word_limit"]
+
+    def generation_params(self):
+        # Token cap and stop sequences sent with the request, so the model
+        # stops near the word limit instead of generating text we cut away
+        return self.prompt_template.generation_params()
+
+    def fallback_response(self):
+        return self.prompt_template.fallback
+
+    def trim(self, response):
+        # Post-process the response to ensure it's brief and focused
+        return trim_words(response, self.word_limit(), self.role)
+
+    def generate(self):
+        """Run the model and return the trimmed response, raising on failure"""
+        prompt = self.render_prompt()
+        with self._instrumented():
+            return self.trim(cached_invoke(self.model, prompt, **self.generation_params()))
+
+    async def agenerate(self):
+        """Async version of generate, awaiting the model instead of blocking a thread"""
+        prompt = self.render_prompt()
+        with self._instrumented():
+            return self.trim(await acached_invoke(self.model, prompt, **self.generation_params()))
+
+    async def agenerate_stream(self):
+        """Yield the trimmed response as the model generates it, raising on failure"""
+        prompt = self.render_prompt()
+        with self._instrumented():
+            async for chunk in alimit_words(acached_stream(self.model, prompt, **self.generation_params()),
+                                            self.word_limit(), self.role):
+                yield chunk
+
+    @contextmanager
+    def _instrumented(self):
+        # Duration and error metrics for one generation, labelled by role
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            AGENT_ERRORS.inc(self.role)
+            raise
+        finally:
+            AGENT_SECONDS.observe(time.perf_counter() - started, self.role)
+
     def run(self):
         print(f"{self.role} is running...")
-        prompt = self.prompt_template.format(medical_report=self.medical_report)
         try:
-            response = self.model.invoke(prompt)
-            # Post-process the response to ensure it's brief and focused
-            if self.role != "MultidisciplinaryTeam":
-                # Limit specialist reports to 50 words
-                words = response.split()
-                if len(words) > 60:  # Allow a bit of buffer
-                    response = " ".join(words[:60]) + "..."
-            else:
-                # Limit team diagnosis to 100 words
-                words = response.split()
-                if len(words) > 120:  # Allow a bit of buffer
-                    response = " ".join(words[:120]) + "..."
-            return response
+            return self.generate()
+        except Exception as e:
+            print("Error occurred:", e)
+            AGENT_FALLBACKS.inc(self.role)
+            return self.fallback_response()
+
+    async def arun(self):
+        print(f"{self.role} is running...")
+        try:
+            return await self.agenerate()
         except Exception as e:
             print("Error occurred:", e)
-            if self.role == "Cardiologist":
-                return "No cardiovascular findings or concerns identified in the provided report."
-            elif self.role == "Psychologist":
-                return "No psychological symptoms or concerns identified in the provided report."
-            elif self.role == "Pulmonologist":
-                return "No respiratory findings or concerns identified in the provided report."
-            else:
-                return "Unable to generate a diagnosis due to insufficient information."
+            AGENT_FALLBACKS.inc(self.role)
+            return self.fallback_response()
 
 # Define specialized agent classes
 class Cardiologist(Agent):
@@ -124,11 +159,31 @@ class Pulmonologist(Agent):
     def __init__(self, medical_report):
         super().__init__(medical_report, "Pulmonologist")
 
+class SpecialistSynthesis(Agent):
+    """Reduces one specialist's per-section analyses of a long report to a single report"""
+    def __init__(self, specialist, section_reports):
+        extra_info = {
+            "specialty": specialist.lower(),
+            "section_reports": "\n".join(f"- {report}" for report in section_reports)
+        }
+        super().__init__(role="SpecialistSynthesis", extra_info=extra_info)
+
+    def fallback_response(self):
+        # The section analyses themselves are better than a canned answer
+        return " ".join(self.extra_info["section_reports"].split())
+
 class MultidisciplinaryTeam(Agent):
-    def __init__(self, cardiologist_report, psychologist_report, pulmonologist_report):
+    """Synthesizes the final diagnosis from however many specialist reports there are
+
+    Takes a dict of reports by role; the keyword form used before the
+    specialist registry (cardiologist_report=..., ...) is still accepted.
+    """
+    def __init__(self, reports=None, **role_reports):
+        reports = dict(reports or {})
+        for key, report in role_reports.items():
+            reports[key[:-len("_report")].capitalize()] = report
+        self.reports = reports
         extra_info = {
-            "cardiologist_report": cardiologist_report,
-            "psychologist_report": psychologist_report,
-            "pulmonologist_report": pulmonologist_report
+            "specialist_reports": "\n".join(f"{role} Report: {report}" for role, report in reports.items())
         }
         super().__init__(role="MultidisciplinaryTeam", extra_info=extra_info)
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import threading
+import time
+
+from .LLMClient import OLLAMA_BASE_URL, MAX_CONNECTIONS
+from .Metrics import BACKEND_REQUESTS
+
+# Ollama servers to spread model calls over, comma separated, each with an
+# optional weight: "http://gpu1:11434=2,http://gpu2:11434". Defaults to the
+# single OLLAMA_BASE_URL server.
+OLLAMA_BACKENDS = os.environ.get("OLLAMA_BACKENDS", "")
+# Model calls in flight per backend before new calls wait for a free slot
+BACKEND_MAX_INFLIGHT = int(os.environ.get("OLLAMA_BACKEND_MAX_INFLIGHT", str(MAX_CONNECTIONS)))
+# Consecutive failures before a backend is taken out of rotation, and how long
+# it stays out before it is tried again
+BACKEND_EJECT_AFTER = int(os.environ.get("OLLAMA_EJECT_AFTER", "3"))
+BACKEND_EJECT_SECONDS = float(os.environ.get("OLLAMA_EJECT_SECONDS", "30"))
+# Seconds between active health checks (GET /api/tags); 0 disables them
+BACKEND_HEALTH_INTERVAL = float(os.environ.get("OLLAMA_HEALTH_INTERVAL", "10"))
+# Seconds a call may wait for a free backend slot
+BACKEND_ACQUIRE_TIMEOUT = float(os.environ.get("OLLAMA_ACQUIRE_TIMEOUT", "300"))
+
+
+class NoBackendAvailable(Exception):
+    """Raised when no backend slot frees up within the acquire timeout"""
+
+
+def parse_backends(spec):
+    """[(url, weight), ...] from an OLLAMA_BACKENDS string"""
+    backends = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, weight = item.rpartition("=") if "=" in item else (item, "", "1")
+        backends.append((url.rstrip("/"), float(weight)))
+    return backends
+
+
+class Backend:
+    def __init__(self, url, weight=1.0, max_inflight=BACKEND_MAX_INFLIGHT):
+        self.url = url
+        self.weight = weight
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.stats = {"requests": 0, "failures": 0, "ejections": 0}
+
+    def available(self, now):
+        return self.ejected_until <= now
+
+    def snapshot(self, now):
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "healthy": self.available(now),
+            "consecutive_failures": self.failures,
+            **self.stats,
+        }
+
+
+class BackendPool:
+    """Spreads model calls over several Ollama servers
+
+    Each call goes to the healthy backend with the fewest requests in flight
+    relative to its weight, and waits when every backend is at its in-flight
+    limit. Backends that fail repeatedly (passive checks) or fail a health
+    probe (active checks) are ejected for a while, then re-admitted. If every
+    backend is ejected, calls go to all of them rather than failing outright.
+    """
+
+    def __init__(self, backends, max_inflight=BACKEND_MAX_INFLIGHT, eject_after=BACKEND_EJECT_AFTER,
+                 eject_seconds=BACKEND_EJECT_SECONDS, health_interval=BACKEND_HEALTH_INTERVAL):
+        self.backends = [Backend(url, weight, max_inflight) for url, weight in backends]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+        # (loop, future) for async callers waiting on a free slot
+        self._async_waiters = []
+        self._health_thread = None
+        self._probe_session = None
+
+    def _pick(self, exclude=()):
+        # Called with the lock held; claims a slot on the chosen backend
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b.url not in exclude]
+        healthy = [b for b in candidates if b.available(now)]
+        free = [b for b in (healthy or candidates) if b.inflight < b.max_inflight]
+        if not free:
+            return None
+        backend = min(free, key=lambda b: (b.inflight + 1) / b.weight)
+        backend.inflight += 1
+        backend.stats["requests"] += 1
+        return backend
+
+    def acquire(self, exclude=(), timeout=BACKEND_ACQUIRE_TIMEOUT):
+        """Claim a slot on the best backend, blocking until one is free"""
+        deadline = time.monotonic() + timeout
+        with self._freed:
+            while True:
+                backend = self._pick(exclude)
+                if backend is not None:
+                    return backend
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._freed.wait(remaining):
+                    raise NoBackendAvailable(f"No model backend slot free after {timeout:.0f}s")
+
+    async def aacquire(self, exclude=(), timeout=BACKEND_ACQUIRE_TIMEOUT):
+        """Async version of acquire, waiting without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                backend = self._pick(exclude)
+                if backend is not None:
+                    return backend
+                freed = loop.create_future()
+                self._async_waiters.append((loop, freed))
+            try:
+                await asyncio.wait_for(freed, max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise NoBackendAvailable(f"No model backend slot free after {timeout:.0f}s")
+
+    def release(self, backend, ok=True):
+        """Return a slot, recording whether the call succeeded"""
+        with self._lock:
+            backend.inflight -= 1
+            BACKEND_REQUESTS.inc(backend.url, "ok" if ok else "error")
+            if ok:
+                backend.failures = 0
+            else:
+                self._record_failure(backend)
+            # Every sync waiter rechecks: one woken with this backend excluded
+            # would go back to sleep and the wake-up would be lost
+            self._freed.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, freed in waiters:
+            loop.call_soon_threadsafe(_wake, freed)
+
+    def _record_failure(self, backend):
+        backend.failures += 1
+        backend.stats["failures"] += 1
+        if backend.failures >= self.eject_after and backend.available(time.monotonic()):
+            backend.ejected_until = time.monotonic() + self.eject_seconds
+            backend.stats["ejections"] += 1
+            print(f"Model backend {backend.url} ejected after {backend.failures} failures")
+
+    def _readmit(self, backend):
+        if not backend.available(time.monotonic()):
+            print(f"Model backend {backend.url} re-admitted")
+        backend.failures = 0
+        backend.ejected_until = 0.0
+
+    def _probe(self, backend):
+        # Not the model traffic's session: its pool blocks while streaming
+        # generations hold every socket, which would stall the probe
+        if self._probe_session is None:
+            import requests
+            self._probe_session = requests.Session()
+        return self._probe_session.get(f"{backend.url}/api/tags", timeout=5)
+
+    def check_health(self):
+        """Probe every backend once, ejecting or re-admitting it"""
+        for backend in self.backends:
+            try:
+                response = self._probe(backend)
+                ok = response.status_code == 200
+                response.close()
+            except Exception:
+                ok = False
+            with self._lock:
+                if ok:
+                    self._readmit(backend)
+                elif backend.available(time.monotonic()):
+                    # A failed probe ejects at once; passive failures take several
+                    backend.failures = max(backend.failures, self.eject_after - 1)
+                    self._record_failure(backend)
+
+    def start_health_checks(self):
+        """Probe backends in the background; only useful with more than one"""
+        if self._health_thread is not None or len(self.backends) < 2 or self.health_interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.health_interval)
+                try:
+                    self.check_health()
+                except Exception as e:
+                    print("Error checking model backends:", e)
+
+        self._health_thread = threading.Thread(target=run, name="backend-health", daemon=True)
+        self._health_thread.start()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return [backend.snapshot(now) for backend in self.backends]
+
+
+def _wake(freed):
+    if not freed.done():
+        freed.set_result(None)
+
+
+def load_backends(default_url=OLLAMA_BASE_URL):
+    return parse_backends(OLLAMA_BACKENDS) or [(default_url.rstrip("/"), 1.0)]
+
+
+backend_pool = BackendPool(load_backends())
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from .Extraction import read_file_content
+from .Pipeline import arun_diagnosis, run_sync
+
+# Reports analyzed at once. Model calls across all of them are additionally
+# capped by the admission controller's ADMISSION_MAX_INFLIGHT.
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+
+
+def file_sha256(path):
+    """Hash a report file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_sha256(source):
+    """Content hash of a report given as a file path or an upload (which hashed it on arrival)"""
+    return file_sha256(source) if isinstance(source, str) else source.sha256
+
+
+def read_source(source):
+    """Text of a report given as a file path or an upload"""
+    return read_file_content(source) if isinstance(source, str) else source.read_text()
+
+
+def list_reports(directory):
+    """List the PDF/TXT reports in a directory, sorted by name"""
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+    ]
+
+
+def completed_reports(output_path):
+    """(report_id, sha256) pairs already written successfully to a results file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a partial last line; that report is redone
+                continue
+            if record.get("status") == "completed":
+                done.add((record["report_id"], record["sha256"]))
+    return done
+
+
+def ends_mid_line(path):
+    """Whether a results file's last line was cut off, e.g. by a crash"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except FileNotFoundError:
+        return False
+
+
+async def arun_batch(reports, output_path, concurrency=BATCH_CONCURRENCY, on_progress=None):
+    """Analyze many report files, appending one JSON line per report as each finishes
+
+    reports is a list of (report_id, source) pairs, each source a file path
+    or an upload from Utils/Uploads.py. Reports already completed in
+    output_path with the same content are skipped, so an interrupted batch can
+    be rerun with the same output file to resume it.
+    """
+    loop = asyncio.get_running_loop()
+    already_done = await loop.run_in_executor(None, completed_reports, output_path)
+    partial_line = await loop.run_in_executor(None, ends_mid_line, output_path)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    slots = asyncio.Semaphore(concurrency)
+    counts = {"total": len(reports), "completed": 0, "failed": 0, "skipped": 0}
+    started = time.monotonic()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        if partial_line:
+            # Start the first new record on a line of its own, not after the fragment
+            output.write("\n")
+
+        async def analyze(report_id, source):
+            async with slots:
+                sha256 = await loop.run_in_executor(None, source_sha256, source)
+                if (report_id, sha256) in already_done:
+                    counts["skipped"] += 1
+                    return
+
+                report_started = time.monotonic()
+                record = {"report_id": report_id, "sha256": sha256}
+                try:
+                    medical_report = await loop.run_in_executor(None, read_source, source)
+                    record.update(await arun_diagnosis(medical_report, report_id, sha256))
+                    record["status"] = "completed"
+                    counts["completed"] += 1
+                except Exception as e:
+                    print(f"Batch report {report_id} failed:", e)
+                    record.update({"status": "failed", "error": str(e)})
+                    counts["failed"] += 1
+                record["elapsed_seconds"] = round(time.monotonic() - report_started, 3)
+
+                # Flush every line so a crash loses at most the reports in flight
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                if on_progress is not None:
+                    on_progress(dict(counts))
+
+        await asyncio.gather(*(analyze(report_id, source) for report_id, source in reports))
+
+    elapsed = time.monotonic() - started
+    processed = counts["completed"] + counts["failed"]
+    return {
+        **counts,
+        "output": output_path,
+        "elapsed_seconds": round(elapsed, 3),
+        "reports_per_minute": round(processed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def run_batch(reports, output_path, concurrency=BATCH_CONCURRENCY, on_progress=None):
+    """Synchronous wrapper around arun_batch"""
+    return run_sync(arun_batch(reports, output_path, concurrency, on_progress))
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Bump when prompt templates or response post-processing change so that
+# previously cached generations are no longer served
+PROMPT_VERSION = os.environ.get("LLM_PROMPT_VERSION", "1")
+
+# In-memory tier size (entries), entry lifetime in seconds (0 = never expire)
+# and the optional on-disk tier location (empty = memory only)
+CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "86400"))
+CACHE_DIR = os.environ.get("LLM_CACHE_DIR", "")
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional disk) cache for model responses"""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, cache_dir=CACHE_DIR,
+                 version=PROMPT_VERSION):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, model, prompt, params=None):
+        """Content-address a generation by model, prompt, parameters and version"""
+        material = json.dumps({
+            "version": self.version,
+            "model": model,
+            "prompt": prompt,
+            "params": params or {},
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _disk_path(self, key):
+        # Shard by prefix so a single directory doesn't grow unbounded
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key):
+        """Return the cached response for a key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                record = None
+            if record is not None and record.get("version") == self.version \
+                    and not self._expired(record["created"]):
+                with self._lock:
+                    self._remember(key, record["created"], record["response"])
+                    self.stats["disk_hits"] += 1
+                return record["response"]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def _remember(self, key, created, response):
+        self._entries[key] = (created, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, key, response):
+        """Store a response in memory and, if enabled, on disk"""
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, response)
+            self.stats["stores"] += 1
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write to a temp file first so readers never see partial JSON
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"version": self.version, "created": created,
+                               "response": response}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print("Error writing response cache:", e)
+
+    def clear(self):
+        """Drop every in-memory entry (the disk tier is left untouched)"""
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        """Hit/miss counters plus current size, for diagnostics"""
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries)}
+
+
+response_cache = ResponseCache()
+
+
+def _invoke_key(llm, prompt, params):
+    return response_cache.make_key(
+        getattr(llm, "model", type(llm).__name__),
+        prompt,
+        {**getattr(llm, "_default_params", {}), **params},
+    )
+
+
+def cached_invoke(llm, prompt, **params):
+    """Invoke a model through the shared response cache"""
+    key = _invoke_key(llm, prompt, params)
+    response = response_cache.get(key)
+    if response is None:
+        response = llm.invoke(prompt, **params)
+        response_cache.set(key, response)
+    return response
+
+
+async def acached_invoke(llm, prompt, **params):
+    """Async version of cached_invoke, built on the model's ainvoke"""
+    key = _invoke_key(llm, prompt, params)
+    response = response_cache.get(key)
+    if response is None:
+        response = await llm.ainvoke(prompt, **params)
+        response_cache.set(key, response)
+    return response
+
+
+async def acached_stream(llm, prompt, **params):
+    """Stream a model response, serving cache hits as a single chunk"""
+    key = _invoke_key(llm, prompt, params)
+    response = response_cache.get(key)
+    if response is not None:
+        yield response
+        return
+
+    chunks = []
+    async for chunk in llm.astream(prompt, **params):
+        chunks.append(chunk)
+        yield chunk
+    # Only complete generations are cached
+    response_cache.set(key, "".join(chunks))
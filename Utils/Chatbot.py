@@ -1,7 +1,3 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_community.llms import Ollama
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
 import sys
 import os
 
@@ -9,17 +5,66 @@ import os
 if __name__ == "__main__":
     # Add the project root to the Python path when run directly
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-    from Utils.Agents import Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam
+    from Utils.Agents import alimit_words
+    from Utils.Pipeline import arun_stage, astream_stage, astream_diagnosis, run_sync, iterate_sync
+    from Utils.LLMClient import get_llm
+    from Utils.Cache import cached_invoke, acached_invoke, acached_stream
+    from Utils.Prompts import count_tokens
+    from Utils.Metrics import CHAT_SECONDS
+    from Utils.Router import intent_router
+    from Utils.Conditions import condition_answers, condition_prompt, trim_answer, CONDITION_WORD_LIMIT, CONDITION_GENERATION
 else:
     # Use relative import when imported as a module
-    from .Agents import Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam
+    from .Agents import alimit_words
+    from .Pipeline import arun_stage, astream_stage, astream_diagnosis, run_sync, iterate_sync
+    from .LLMClient import get_llm
+    from .Cache import cached_invoke, acached_invoke, acached_stream
+    from .Prompts import count_tokens
+    from .Metrics import CHAT_SECONDS
+    from .Router import intent_router
+    from .Conditions import condition_answers, condition_prompt, trim_answer, CONDITION_WORD_LIMIT, CONDITION_GENERATION
+
+SYMPTOM_REPLY_PREFIX = """Based on your described symptoms:
+
+"""
+
+SYMPTOM_REPLY_SUFFIX = """
+
+How can I help you further?"""
+
+PARTIAL_RESULT_NOTE = """
+
+Note: this assessment is partial because the following reviews could not be completed: {roles}."""
+
+# Replies for follow-up questions that need symptoms before they can be answered
+CANNED_REPLIES = {
+    "treatment_without_symptoms": """I can't provide treatment recommendations without knowing your symptoms. 
+
+What symptoms are you experiencing? Please be specific about what you're feeling.""",
+    "doctor_without_symptoms": """To advise about seeing a doctor, I need to know your symptoms first.
+
+What symptoms are you experiencing, and how long have they been present?""",
+}
 
 class MedicalChatbot:
     def __init__(self):
-        self.memory = ConversationBufferMemory()
-        self.model = Ollama(model="medllama2")
+        # LangChain is imported when the first chatbot is created rather than
+        # when this module loads, to keep app startup fast
+        from langchain_core.prompts import PromptTemplate
+        from .Memory import RollingSummaryMemory
+
+        self.model = get_llm()
+        # Bounded by a token budget; older turns are summarized in the background
+        self.memory = RollingSummaryMemory(llm=self.model)
+        # Prompt size of each follow-up turn, in approximate tokens
+        self.prompt_tokens = []
         self.current_diagnosis = None
         self.specialist_reports = None
+        self.failed_specialists = {}
+        # Which specialists the last diagnosis ran or skipped, and how the
+        # last message was routed
+        self.specialist_routing = None
+        self.last_route = None
         
         # Initialize the conversation prompt with strong anti-hallucination guidance
         self.prompt = PromptTemplate(
@@ -48,19 +93,42 @@ Your responses should be factual, brief, and avoid creating anxiety.
 
 Response:"""
         )
-        
-        # Create the conversation chain
-        self.conversation = ConversationChain(
-            llm=self.model,
-            memory=self.memory,
-            prompt=self.prompt,
-            verbose=True
-        )
 
-    def process_symptoms(self, symptoms):
-        """Process symptoms through medical agents and get diagnosis"""
-        # First, validate and structure the symptoms with anti-hallucination prompting
-        symptom_prompt = f"""
+    def to_state(self):
+        """Serializable snapshot of the conversation, used to evict idle sessions"""
+        from langchain_core.messages import messages_to_dict
+        return {
+            "history": messages_to_dict(self.memory.chat_memory.messages),
+            "summary": self.memory.summary,
+            "prompt_tokens": self.prompt_tokens,
+            "current_diagnosis": self.current_diagnosis,
+            "specialist_reports": self.specialist_reports,
+            "failed_specialists": self.failed_specialists,
+            "specialist_routing": self.specialist_routing,
+        }
+
+    def estimated_size(self):
+        """Approximate size of the conversation state, without serializing it"""
+        reports = self.specialist_reports or {}
+        return (self.memory.size() + len(self.current_diagnosis or "")
+                + sum(len(report) for report in reports.values()) + 8 * len(self.prompt_tokens))
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a chatbot from a to_state() snapshot"""
+        from langchain_core.messages import messages_from_dict
+        chatbot = cls()
+        chatbot.memory.restore(messages_from_dict(state.get("history", [])), state.get("summary", ""))
+        chatbot.prompt_tokens = state.get("prompt_tokens", [])
+        chatbot.current_diagnosis = state.get("current_diagnosis")
+        chatbot.specialist_reports = state.get("specialist_reports")
+        chatbot.failed_specialists = state.get("failed_specialists", {})
+        chatbot.specialist_routing = state.get("specialist_routing")
+        return chatbot
+
+    def _symptom_prompt(self, symptoms):
+        # Validate and structure the symptoms with anti-hallucination prompting
+        return f"""
         Analyze the following patient report and extract ONLY symptoms that are EXPLICITLY mentioned:
         {symptoms}
         
@@ -77,33 +145,10 @@ Response:"""
         Severity (if mentioned):
         Associated factors (if mentioned):
         """
-        
-        structured_symptoms = self.model.invoke(symptom_prompt)
-        
-        # Initialize agents with the structured symptoms
-        agents = {
-            "Cardiologist": Cardiologist(structured_symptoms),
-            "Psychologist": Psychologist(structured_symptoms),
-            "Pulmonologist": Pulmonologist(structured_symptoms)
-        }
-        
-        # Get responses from all agents
-        responses = {}
-        for name, agent in agents.items():
-            response = agent.run()
-            responses[name] = response
-        
-        # Get team analysis
-        team_agent = MultidisciplinaryTeam(
-            cardiologist_report=responses["Cardiologist"],
-            psychologist_report=responses["Psychologist"],
-            pulmonologist_report=responses["Pulmonologist"]
-        )
-        
-        final_diagnosis = team_agent.run()
-        
+
+    def _validation_prompt(self, final_diagnosis):
         # Validate the diagnosis for consistency and prevent hallucination
-        validation_prompt = f"""
+        return f"""
         Review this medical analysis for accuracy and hallucination:
         {final_diagnosis}
         
@@ -116,169 +161,174 @@ Response:"""
         
         Corrected analysis:
         """
+
+    async def astream_symptoms(self, symptoms):
+        """Process symptoms through medical agents, yielding progress events and the diagnosis as it streams"""
+        yield {"type": "status", "stage": "structuring"}
+        structured_symptoms = await arun_stage(
+            "structuring", acached_invoke(self.model, self._symptom_prompt(symptoms))
+        )
         
-        validated_diagnosis = self.model.invoke(validation_prompt)
+        # Run the specialists and the team through the shared diagnosis pipeline,
+        # routed on what the user actually said rather than the model's restatement
+        result = None
+        async for event in astream_diagnosis(structured_symptoms, stream_team=False, route_text=symptoms):
+            if event["type"] == "result":
+                result = event
+            else:
+                yield event
+        
+        # The validated diagnosis is what the user sees, so stream it
+        yield {"type": "status", "stage": "validation"}
+        chunks = []
+        validation_prompt = self._validation_prompt(result["final_diagnosis"])
+        async for chunk in astream_stage("validation", acached_stream(self.model, validation_prompt)):
+            chunks.append(chunk)
+            yield {"type": "token", "text": chunk}
+        
+        # Let the user know when the assessment is missing a specialist's input
+        if result["failed_specialists"]:
+            note = PARTIAL_RESULT_NOTE.format(roles=", ".join(result["failed_specialists"]))
+            chunks.append(note)
+            yield {"type": "token", "text": note}
         
         # Store the validated diagnosis and reports
-        self.current_diagnosis = validated_diagnosis
-        self.specialist_reports = responses
-        
-        return validated_diagnosis
+        self.current_diagnosis = "".join(chunks)
+        self.specialist_reports = result["specialist_reports"]
+        self.failed_specialists = result["failed_specialists"]
+        self.specialist_routing = result["routing"]
+
+    async def aprocess_symptoms(self, symptoms):
+        """Process symptoms through medical agents and get diagnosis"""
+        async for _ in self.astream_symptoms(symptoms):
+            pass
+        return self.current_diagnosis
+
+    def process_symptoms(self, symptoms):
+        """Process symptoms through medical agents and get diagnosis"""
+        return run_sync(self.aprocess_symptoms(symptoms))
+
+    def _route(self, user_input):
+        """Decide how a message should be answered; returns (route, condition)"""
+        # One pass over the message finds condition questions and keyword intents
+        condition, intents = intent_router.classify(user_input)
 
-    def get_response(self, user_input):
-        """Get response from the chatbot"""
         # Check for specific condition queries like flu
-        specific_condition_match = self._check_for_specific_condition(user_input)
-        if specific_condition_match:
-            condition = specific_condition_match
-            return self._get_condition_info(condition)
+        if condition:
+            return "condition", condition
             
         # Check if the input is describing new symptoms
-        if self._is_symptom_description(user_input):
-            # Process new symptoms
-            diagnosis = self.process_symptoms(user_input)
-            return f"""Based on your described symptoms:
-
-{diagnosis}
-
-How can I help you further?"""
+        if "symptom" in intents:
+            return "symptoms", None
         
         # Handle follow-up questions about treatment or doctor visits
-        if self._is_treatment_query(user_input) and not self.current_diagnosis:
-            return """I can't provide treatment recommendations without knowing your symptoms. 
-
-What symptoms are you experiencing? Please be specific about what you're feeling."""
+        if "treatment" in intents and not self.current_diagnosis:
+            return "treatment_without_symptoms", None
         
-        if self._is_doctor_query(user_input) and not self.current_diagnosis:
-            return """To advise about seeing a doctor, I need to know your symptoms first.
-
-What symptoms are you experiencing, and how long have they been present?"""
+        if "doctor" in intents and not self.current_diagnosis:
+            return "doctor_without_symptoms", None
         
-        # Use the conversation chain for follow-up questions
-        response = self.conversation.predict(input=user_input)
-        return response
+        return "conversation", None
+
+    def _follow_up_prompt(self, user_input):
+        """Render the conversation prompt and record its size"""
+        history = self.memory.load_memory_variables({})["history"]
+        prompt = self.prompt.format(history=history, input=user_input)
+        self.prompt_tokens.append(count_tokens(prompt))
+        return prompt
 
-    def _check_for_specific_condition(self, text):
-        """Check if the user is asking about a specific condition"""
-        # Common conditions that might be directly asked about
-        conditions = {
-            "flu": ["flu", "influenza"],
-            "cold": ["cold", "common cold"],
-            "covid": ["covid", "coronavirus", "covid-19", "covid19"],
-            "headache": ["headache", "migraine"],
-            "stomach": ["stomach ache", "stomach pain", "stomachache", "indigestion"],
-            "allergy": ["allergy", "allergic", "allergies"],
-            "fever": ["fever", "high temperature"]
+    def token_usage(self):
+        """Per-turn prompt sizes and the current state of the conversation memory"""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "token_budget": self.memory.max_token_limit,
+            "summary_tokens": count_tokens(self.memory.summary),
+            "buffered_messages": len(self.memory.chat_memory.messages),
         }
-        
-        text_lower = text.lower()
-        
-        # Check for direct questions about symptoms
-        for condition, terms in conditions.items():
-            for term in terms:
-                if any(pattern in text_lower for pattern in [
-                    f"symptoms of {term}",
-                    f"signs of {term}",
-                    f"what is {term}",
-                    f"what are {term} symptoms",
-                    f"how do i know if i have {term}",
-                    f"do i have {term}"
-                ]):
-                    return condition
-        
-        # Check for phrases like "treatment for X" or "what about X"
-        for condition, terms in conditions.items():
-            for term in terms:
-                if any(pattern in text_lower for pattern in [
-                    f"treatment for {term}", 
-                    f"treatment option for {term}",
-                    f"what about {term}",
-                    f"info on {term}",
-                    f"about {term}",
-                    f"if i have {term}",
-                    f"{term} treatment",
-                    f"{term} remedy",
-                    f"{term} medicine"
-                ]):
-                    return condition
-        
-        return None
-        
-    def _get_condition_info(self, condition):
+
+    async def aget_response(self, user_input):
+        """Get response from the chatbot"""
+        route, condition = self._route(user_input)
+        self.last_route = route
+        with CHAT_SECONDS.time(route):
+            if route == "condition":
+                return await self._aget_condition_info(condition)
+        
+            if route == "symptoms":
+                # Process new symptoms
+                diagnosis = await self.aprocess_symptoms(user_input)
+                return SYMPTOM_REPLY_PREFIX + diagnosis + SYMPTOM_REPLY_SUFFIX
+        
+            if route in CANNED_REPLIES:
+                return CANNED_REPLIES[route]
+        
+            # Follow-up questions go to the model with the budgeted history
+            response = await self.model.ainvoke(self._follow_up_prompt(user_input))
+            self.memory.save_context({"input": user_input}, {"response": response})
+            return response
+
+    def get_response(self, user_input):
+        """Get response from the chatbot"""
+        return run_sync(self.aget_response(user_input))
+
+    async def astream_response(self, user_input):
+        """Yield the chatbot's reply as events: status updates, specialist reports and text tokens"""
+        route, condition = self._route(user_input)
+        self.last_route = route
+        with CHAT_SECONDS.time(route):
+            if route == "condition":
+                async for chunk in self._astream_condition_info(condition):
+                    yield {"type": "token", "text": chunk}
+                return
+        
+            if route == "symptoms":
+                yield {"type": "token", "text": SYMPTOM_REPLY_PREFIX}
+                async for event in self.astream_symptoms(user_input):
+                    yield event
+                yield {"type": "token", "text": SYMPTOM_REPLY_SUFFIX}
+                return
+        
+            if route in CANNED_REPLIES:
+                yield {"type": "token", "text": CANNED_REPLIES[route]}
+                return
+        
+            # Follow-up questions: stream the reply, then record the turn in memory
+            prompt = self._follow_up_prompt(user_input)
+            chunks = []
+            async for chunk in self.model.astream(prompt):
+                chunks.append(chunk)
+                yield {"type": "token", "text": chunk}
+            self.memory.save_context({"input": user_input}, {"response": "".join(chunks)})
+
+    def stream_response(self, user_input):
+        """Synchronous wrapper around astream_response"""
+        return iterate_sync(self.astream_response(user_input))
+
+    async def _aget_condition_info(self, condition):
         """Get information about a specific condition without requiring symptoms"""
-        condition_prompt = f"""
-        Provide brief information about {condition}, including:
-        
-        1. Common symptoms (list these first and in detail)
-        2. Basic home care recommendations
-        3. When to see a doctor
-        
-        Keep this concise (under 100 words) and focus ONLY on {condition}.
-        Do NOT mention other conditions or assume the patient has any other conditions.
-        Start with the symptoms since that's what users are most interested in.
-        """
-        
-        response = self.model.invoke(condition_prompt)
-        
-        # Limit response length
-        words = response.split()
-        if len(words) > 120:
-            response = " ".join(words[:120]) + "..."
-            
+        # Catalogue answers are generated ahead of time and served from memory
+        response = condition_answers.get(condition)
+        if response is None:
+            response = trim_answer(await acached_invoke(self.model, condition_prompt(condition), **CONDITION_GENERATION))
+            condition_answers.put(condition, response)
         return response
 
-    def _is_symptom_description(self, text):
-        """Check if the input appears to be describing symptoms"""
-        symptom_keywords = [
-            # Physical symptoms
-            "pain", "ache", "sore", "discomfort", "pressure", "tight",
-            "numb", "tingling", "burning", "sharp", "dull", "throbbing",
-            "fever", "chill", "sweat", "fatigue", "tired", "weak",
-            "dizzy", "faint", "nausea", "vomit", "diarrhea", "constipation",
-            "cough", "breath", "wheeze", "chest", "heart", "palpitation",
-            "stomach", "headache", "migraine", "vision", "hearing",
-            "rash", "itch", "swelling", "bleeding", "bruise",
-            
-            # Psychological symptoms
-            "anxiety", "stress", "worry", "fear", "panic", "depression",
-            "mood", "angry", "irritable", "confused", "memory", "concentration",
-            "sleep", "insomnia", "nightmare", "appetite", "energy",
-            
-            # Descriptive terms
-            "symptom", "feel", "experiencing", "notice", "problem",
-            "condition", "issue", "concern", "worse", "better",
-            "started", "developed", "changed", "constant", "intermittent"
-        ]
-        
-        text = text.lower()
-        # Check for symptom keywords
-        has_keywords = any(keyword in text for keyword in symptom_keywords)
-        
-        # Check for temporal markers that often indicate symptom descriptions
-        temporal_markers = ["since", "for", "days", "weeks", "months", "years", "today", "yesterday"]
-        has_temporal = any(marker in text for marker in temporal_markers)
-        
-        return has_keywords or has_temporal
-    
-    def _is_treatment_query(self, text):
-        """Check if the input is asking about treatments"""
-        treatment_keywords = [
-            "treatment", "cure", "medicine", "medication", "drug", "pill", 
-            "remedy", "heal", "therapy", "therapies", "care"
-        ]
-        
-        text = text.lower()
-        return any(keyword in text for keyword in treatment_keywords)
-    
-    def _is_doctor_query(self, text):
-        """Check if the input is asking about seeing a doctor"""
-        doctor_keywords = [
-            "doctor", "physician", "specialist", "hospital", "clinic", 
-            "appointment", "visit", "consult", "consultation"
-        ]
-        
-        text = text.lower()
-        return any(keyword in text for keyword in doctor_keywords)
+    def _get_condition_info(self, condition):
+        """Get information about a specific condition without requiring symptoms"""
+        return run_sync(self._aget_condition_info(condition))
+
+    async def _astream_condition_info(self, condition):
+        """Stream information about a specific condition, limited to the same length"""
+        response = condition_answers.get(condition)
+        if response is not None:
+            yield response
+            return
+        chunks = []
+        async for chunk in alimit_words(acached_stream(self.model, condition_prompt(condition), **CONDITION_GENERATION),
+                                        CONDITION_WORD_LIMIT, "conditions"):
+            chunks.append(chunk)
+            yield chunk
+        condition_answers.put(condition, "".join(chunks))
 
     def get_treatment_recommendations(self):
         """Get treatment recommendations based on current diagnosis"""
@@ -295,7 +345,7 @@ What symptoms are you experiencing, and how long have they been present?"""
         4. When to seek emergency care
         5. Follow-up recommendations"""
         
-        return self.model.invoke(prompt)
+        return cached_invoke(self.model, prompt)
 
     def get_doctor_recommendation(self):
         """Get recommendation about seeing a doctor"""
@@ -311,4 +361,4 @@ What symptoms are you experiencing, and how long have they been present?"""
         3. Which type of doctor to see
         4. What to bring to the appointment"""
         
-        return self.model.invoke(prompt) 
\ No newline at end of file
+        return cached_invoke(self.model, prompt) 
\ No newline at end of file
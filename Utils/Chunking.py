@@ -0,0 +1,145 @@
+import os
+import re
+from collections import Counter
+
+from .Prompts import count_tokens
+from .Router import KeywordAutomaton
+
+# Reports longer than this (approximate tokens) are analysed section by section
+CHUNK_THRESHOLD_TOKENS = int(os.environ.get("PIPELINE_CHUNK_THRESHOLD", "1500"))
+# Size of each chunk sent to a specialist, and the total of relevant sections
+# one specialist reads; the most relevant sections are kept when over budget
+CHUNK_TOKENS = int(os.environ.get("PIPELINE_CHUNK_TOKENS", "600"))
+SPECIALIST_TOKEN_BUDGET = int(os.environ.get("PIPELINE_SPECIALIST_TOKENS", "2400"))
+
+# A line on its own that names a section, e.g. "ASSESSMENT:" or "Visit 2024-03-01"
+HEADING_PATTERN = re.compile(r"^\s*(?:[A-Z][A-Z /&-]{2,}:?|[^\n]{1,60}:|(?i:visit)\b[^\n]{0,60})\s*$")
+
+# Each term counts at most this many times towards a section's score, so one
+# repeated word doesn't outweigh a section that covers several findings
+MAX_TERM_HITS = 3
+
+
+def needs_chunking(text, threshold=CHUNK_THRESHOLD_TOKENS):
+    return count_tokens(text) > threshold
+
+
+def _split_long(block, max_tokens):
+    # Lines first, then a hard cut for a single line that is still too long
+    pieces = []
+    for line in block.splitlines(keepends=True):
+        while count_tokens(line) > max_tokens:
+            pieces.append(line[:max_tokens * 4])
+            line = line[max_tokens * 4:]
+        pieces.append(line)
+    return pieces
+
+
+def split_sections(text, max_tokens=CHUNK_TOKENS):
+    """Split a report into sections at blank lines and headings, each under about max_tokens"""
+    blocks = []
+    current = []
+    for line in text.splitlines():
+        blank = not line.strip()
+        # A heading stays with the text that follows it, even across a blank line
+        if current and (blank or HEADING_PATTERN.match(line)) \
+                and not (len(current) == 1 and HEADING_PATTERN.match(current[0])):
+            blocks.append("\n".join(current))
+            current = []
+        if not blank:
+            current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+
+    sections = []
+    for block in blocks:
+        if count_tokens(block) <= max_tokens:
+            sections.append(block)
+        else:
+            sections.extend(_split_long(block, max_tokens))
+    return sections
+
+
+def pack_sections(sections, max_tokens=CHUNK_TOKENS):
+    """Join consecutive sections into as few chunks of under about max_tokens as possible"""
+    chunks = []
+    pending = ""
+    for section in sections:
+        joined = f"{pending}\n\n{section}" if pending else section
+        if pending and count_tokens(joined) > max_tokens:
+            chunks.append(pending)
+            pending = section
+        else:
+            pending = joined
+    if pending:
+        chunks.append(pending)
+    return chunks
+
+
+def parse_term(term):
+    """A configured term as (lowercased phrase, whether it also matches longer words)"""
+    term = term.lower()
+    return (term[:-1], True) if term.endswith("*") else (term, False)
+
+
+def _is_word(text, start, end):
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+def _word_match(text, end, phrase, prefix):
+    """Whether a phrase found in text, ending at end, is a word there rather than part of one"""
+    start = end - len(phrase)
+    if prefix:
+        return start == 0 or not text[start - 1].isalnum()
+    # Plurals of a whole-word term count too
+    return any(text.startswith(suffix, end) and _is_word(text, start, end + len(suffix))
+               for suffix in ("", "s", "es"))
+
+
+class RelevanceScorer:
+    """Scores report sections against each specialist's terms in one pass per section
+
+    Terms match whole words (or their plurals), so "heart" doesn't match
+    "heartburn". A term ending in "*" matches any word it starts, so
+    "breath*" covers "breathing" and "breathless".
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+        self._automaton = KeywordAutomaton(
+            (phrase, (specialist, phrase, prefix))
+            for specialist, configured in terms.items() for phrase, prefix in map(parse_term, configured)
+        )
+
+    def score(self, text):
+        """Relevance of text to each specialist: {specialist: score}"""
+        text = text.lower()
+        hits = Counter(value for end, value in self._automaton.find(text) if _word_match(text, end, *value[1:]))
+        scores = dict.fromkeys(self.terms, 0)
+        for (specialist, _, _), count in hits.items():
+            scores[specialist] += min(count, MAX_TERM_HITS)
+        return scores
+
+    def select(self, sections, budget=SPECIALIST_TOKEN_BUDGET):
+        """Indices of the relevant sections for each specialist, in document order
+
+        Sections are taken most relevant first until the token budget is used.
+        """
+        scores = [self.score(section) for section in sections]
+        selected = {}
+        for specialist in self.terms:
+            ranked = sorted(
+                (index for index, section_scores in enumerate(scores) if section_scores[specialist] > 0),
+                key=lambda index: -scores[index][specialist]
+            )
+            chosen = []
+            used = 0
+            for index in ranked:
+                tokens = count_tokens(sections[index])
+                if used + tokens > budget:
+                    continue
+                chosen.append(index)
+                used += tokens
+            selected[specialist] = sorted(chosen)
+        return selected
+
@@ -0,0 +1,99 @@
+import asyncio
+
+from .Metrics import COALESCED_REQUESTS, COALESCED_CALLS_SAVED, model_call_tally
+
+
+class _Flight:
+    """One in-flight computation and the events it has produced so far"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.joined = 0
+        self.task = None
+        self.updated = asyncio.Event()
+
+    def publish(self, event=None):
+        if event is not None:
+            self.events.append(event)
+        # Wake everyone waiting, then give later waiters a fresh event
+        updated, self.updated = self.updated, asyncio.Event()
+        updated.set()
+
+
+class SingleFlight:
+    """Shares one run of an event stream among concurrent identical requests
+
+    The first request for a key starts the work; requests for the same key
+    that arrive while it runs replay the events produced so far and then
+    follow along. The work is cancelled once every request has gone. All
+    calls must come from the same event loop (the pipeline loop).
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._flights = {}
+        self.stats = {"flights": 0, "joined": 0, "model_calls_saved": 0}
+
+    def in_flight(self):
+        return len(self._flights)
+
+    async def _run(self, key, flight, events):
+        # Tally the model calls this flight makes, so joiners know what they saved
+        tally = [0]
+        model_call_tally.set(tally)
+        try:
+            async for event in events:
+                flight.publish(event)
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.publish()
+            if flight.joined:
+                saved = tally[0] * flight.joined
+                self.stats["model_calls_saved"] += saved
+                COALESCED_CALLS_SAVED.inc(self.kind, amount=saved)
+
+    async def stream(self, key, start, prepare=None):
+        """Yield the events of start() for key, joining an identical run already in flight
+
+        Events are shared between requests; prepare(event, joined), if given,
+        maps each one before it is handed out, e.g. to copy it.
+        """
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            flight.joined += 1
+            self.stats["joined"] += 1
+            COALESCED_REQUESTS.inc(self.kind)
+        else:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(self._run(key, flight, start()))
+            self.stats["flights"] += 1
+        flight.subscribers += 1
+
+        index = 0
+        try:
+            while True:
+                updated = flight.updated
+                while index < len(flight.events):
+                    event = flight.events[index]
+                    index += 1
+                    yield prepare(event, joined) if prepare else event
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await updated.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening: stop the work, and let the next request start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
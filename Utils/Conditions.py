@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from .Admission import request_priority
+from .Agents import trim_words
+from .Cache import response_cache
+from .LLMClient import get_llm
+from .Pipeline import arun_stage, run_sync
+from .Router import CONDITION_TERMS
+
+# Where generated condition answers are kept between runs, and how often
+# (seconds) they are regenerated in the background
+CONDITION_ANSWERS_FILE = os.environ.get(
+    "CONDITION_ANSWERS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "condition_answers.json")
+)
+CONDITION_REFRESH_INTERVAL = float(os.environ.get("CONDITION_REFRESH_INTERVAL", "86400"))
+
+CONDITION_WORD_LIMIT = 120
+# Token cap sent with condition prompts, sized for CONDITION_WORD_LIMIT words
+CONDITION_GENERATION = {"num_predict": 192}
+
+
+def condition_prompt(condition):
+    return f"""
+        Provide brief information about {condition}, including:
+        
+        1. Common symptoms (list these first and in detail)
+        2. Basic home care recommendations
+        3. When to see a doctor
+        
+        Keep this concise (under 100 words) and focus ONLY on {condition}.
+        Do NOT mention other conditions or assume the patient has any other conditions.
+        Start with the symptoms since that's what users are most interested in.
+        """
+
+
+def trim_answer(response):
+    """Limit a condition answer to CONDITION_WORD_LIMIT words"""
+    return trim_words(response, CONDITION_WORD_LIMIT, "conditions")
+
+
+class ConditionAnswers:
+    """Answers for the condition catalogue, served from memory
+
+    Each answer records the cache key of the prompt it came from (model,
+    prompt text and LLM_PROMPT_VERSION), so answers from an older prompt are
+    regenerated on the next refresh. Until then they keep being served.
+    """
+
+    def __init__(self, conditions=CONDITION_TERMS, path=CONDITION_ANSWERS_FILE,
+                 refresh_interval=CONDITION_REFRESH_INTERVAL):
+        self.conditions = list(conditions)
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._answers = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats = {"hits": 0, "misses": 0, "generated": 0}
+        self._load()
+
+    def _prompt_key(self, condition):
+        model = get_llm()
+        return response_cache.make_key(getattr(model, "model", type(model).__name__), condition_prompt(condition),
+                                      CONDITION_GENERATION)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._answers = json.load(f)
+        except (OSError, ValueError):
+            self._answers = {}
+
+    def _save(self):
+        with self._lock:
+            answers = dict(self._answers)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Write then rename so a crash never leaves a truncated file behind
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(answers, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, condition):
+        """The stored answer for a condition, or None if it hasn't been generated"""
+        with self._lock:
+            entry = self._answers.get(condition)
+            self.stats["hits" if entry else "misses"] += 1
+            return entry["answer"] if entry else None
+
+    def put(self, condition, answer):
+        with self._lock:
+            self._answers[condition] = {
+                "answer": answer,
+                "key": self._prompt_key(condition),
+                "generated": time.time(),
+            }
+
+    def _stale(self, condition):
+        entry = self._answers.get(condition)
+        return entry is None or entry["key"] != self._prompt_key(condition) \
+            or time.time() - entry["generated"] > self.refresh_interval
+
+    async def _agenerate(self, condition):
+        # Straight to the model: a refresh should not be answered by the response cache
+        response = await arun_stage("conditions", get_llm().ainvoke(condition_prompt(condition), **CONDITION_GENERATION))
+        self.put(condition, trim_answer(response))
+        self.stats["generated"] += 1
+
+    async def arefresh(self, force=False):
+        """Regenerate missing, outdated or expired answers (all of them if force)"""
+        with self._lock:
+            pending = [c for c in self.conditions if force or self._stale(c)]
+        results = await asyncio.gather(*(self._agenerate(c) for c in pending), return_exceptions=True)
+        for condition, result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"Error generating the answer for {condition}:", result)
+        if pending:
+            await asyncio.get_running_loop().run_in_executor(None, self._save)
+        return len(pending)
+
+    def refresh(self, force=False):
+        """Synchronous wrapper around arefresh"""
+        return run_sync(self.arefresh(force))
+
+    def start(self):
+        """Warm the store in the background, then keep refreshing it on schedule"""
+        if self._started:
+            return
+        self._started = True
+
+        def run():
+            # Background refreshes yield to every user request
+            request_priority.set("batch")
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print("Error refreshing condition answers:", e)
+                # Wake at least hourly so failed generations are retried
+                time.sleep(min(self.refresh_interval, 3600))
+
+        threading.Thread(target=run, name="condition-answers", daemon=True).start()
+
+
+condition_answers = ConditionAnswers()
+
+
+if __name__ == "__main__":
+    # Generate every answer offline, e.g. before deploying
+    start = time.monotonic()
+    count = condition_answers.refresh(force=True)
+    print(f"Generated {count} condition answers in {time.monotonic() - start:.1f}s -> {condition_answers.path}")
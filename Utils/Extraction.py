@@ -0,0 +1,196 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from .Metrics import STAGE_SECONDS, STAGE_ERRORS
+
+# Per-document limits so a pathological PDF can't hold up a worker
+PDF_MAX_BYTES = int(os.environ.get("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "500"))
+PDF_EXTRACTION_TIMEOUT = float(os.environ.get("PDF_EXTRACTION_TIMEOUT", "60"))
+
+# Documents with more than this many pages are split across the worker processes
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Total characters of extracted text kept in the content-hash cache
+EXTRACTION_CACHE_CHARS = int(os.environ.get("EXTRACTION_CACHE_CHARS", str(32 * 1024 * 1024)))
+
+
+class TextCache:
+    """LRU of extracted text keyed by content hash, bounded by total characters"""
+
+    def __init__(self, max_chars=EXTRACTION_CACHE_CHARS):
+        self.max_chars = max_chars
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return text
+
+    def set(self, key, text):
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = text
+            self.size += len(text)
+            while self.size > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def snapshot(self):
+        """Hit/miss counters plus current size, for diagnostics"""
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "chars": self.size}
+
+
+text_cache = TextCache()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn keeps the workers clear of the app's threads and sockets
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def _reset_pool(pool):
+    """Kill a pool's workers and let the next extraction start a fresh pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    # cancel() can't stop a chunk that is already running, so a stuck worker
+    # would otherwise hold its slot for every later upload
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def _extract_pages(data, start, stop=None):
+    """Extract the text of pages [start, stop) from PDF bytes, with the page count (runs in a worker process)"""
+    from PyPDF2 import PdfReader
+    pdf_reader = PdfReader(io.BytesIO(data))
+    page_count = len(pdf_reader.pages)
+    if page_count > PDF_MAX_PAGES:
+        raise Exception(f"PDF has too many pages ({page_count}, limit {PDF_MAX_PAGES})")
+    stop = page_count if stop is None else min(stop, page_count)
+    return page_count, [pdf_reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+def _results(pool, futures, deadline):
+    """Wait for every future until the deadline, resetting the pool if any are still running"""
+    done, pending = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    if pending:
+        _reset_pool(pool)
+        raise Exception(f"PDF extraction timed out after {PDF_EXTRACTION_TIMEOUT:.0f}s")
+    return [future.result() for future in futures]
+
+
+def extract_pdf_bytes(data):
+    """Extract text from PDF bytes in the worker pool, in parallel for large documents
+
+    Parsing always happens in a worker process, so a pathological PDF is
+    bounded by one PDF_EXTRACTION_TIMEOUT for the whole document.
+    """
+    if len(data) > PDF_MAX_BYTES:
+        raise Exception(f"PDF is too large ({len(data)} bytes, limit {PDF_MAX_BYTES})")
+
+    deadline = time.monotonic() + PDF_EXTRACTION_TIMEOUT
+    pool = _get_pool()
+    # The first chunk also reports the page count; a short document is done after it
+    first_stop = PDF_PARALLEL_MIN_PAGES if PDF_WORKERS > 1 else None
+    [(page_count, pages)] = _results(pool, [pool.submit(_extract_pages, data, 0, first_stop)], deadline)
+    if page_count > len(pages):
+        # One contiguous page range per worker for the rest
+        start = len(pages)
+        step = -(-(page_count - start) // PDF_WORKERS)
+        futures = [
+            pool.submit(_extract_pages, data, chunk, min(chunk + step, page_count))
+            for chunk in range(start, page_count, step)
+        ]
+        for _, chunk_pages in _results(pool, futures, deadline):
+            pages.extend(chunk_pages)
+
+    return "".join(pages)
+
+
+def extract_text(source, file_extension, key=None):
+    """Extract text from an uploaded report, reusing cached text for known content
+
+    source is the report's bytes, or a binary file at its start that is only
+    read if the text isn't cached. key is the content's SHA-256 when the
+    caller already has it.
+    """
+    if file_extension == '.txt':
+        if isinstance(source, bytes):
+            return source.decode('utf-8')
+        # Decoded as it is read, without holding the raw bytes as well
+        reader = io.TextIOWrapper(source, encoding='utf-8', newline='')
+        try:
+            return reader.read()
+        finally:
+            reader.detach()
+    if file_extension != '.pdf':
+        raise Exception("Unsupported file format. Please upload a PDF or TXT file.")
+
+    if key is None:
+        source = source if isinstance(source, bytes) else source.read()
+        key = hashlib.sha256(source).hexdigest()
+    text = text_cache.get(key)
+    if text is None:
+        try:
+            with STAGE_SECONDS.time("extraction"):
+                text = extract_pdf_bytes(source if isinstance(source, bytes) else source.read())
+        except Exception as e:
+            STAGE_ERRORS.inc("extraction")
+            raise Exception(f"Error reading PDF file: {str(e)}")
+        text_cache.set(key, text)
+    return text
+
+
+def extract_text_from_pdf(pdf_path):
+    """Extract text from PDF file"""
+    if os.path.getsize(pdf_path) > PDF_MAX_BYTES:
+        raise Exception(f"Error reading PDF file: file is larger than {PDF_MAX_BYTES} bytes")
+    with open(pdf_path, 'rb') as file:
+        return extract_text(file.read(), '.pdf')
+
+
+def read_file_content(file_path):
+    """Read content from either PDF or text file"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+
+    if file_extension == '.pdf':
+        return extract_text_from_pdf(file_path)
+    elif file_extension == '.txt':
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    else:
+        raise Exception("Unsupported file format. Please upload a PDF or TXT file.")
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+from .Admission import request_priority
+from .Pipeline import get_loop
+from .Metrics import JOB_SECONDS
+
+# How many jobs run at once, how many may wait, and how long (seconds)
+# finished jobs stay available for polling before they are evicted
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "100"))
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", "3600"))
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    def __init__(self, kind, progress=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        # Model calls run at the priority class of the request that queued the job
+        self.priority = request_priority.get()
+        self.status = "queued"
+        self.stage = None
+        self.progress = dict(progress or {})
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """Runs submitted coroutines on a fixed pool of workers on the pipeline loop"""
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED, retention=JOB_RETENTION):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._jobs = {}
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._queue = None
+
+    def _start(self):
+        # Workers live on the shared pipeline loop, so a waiting job costs a
+        # coroutine, not a thread
+        loop = get_loop()
+
+        async def create_workers():
+            self._queue = asyncio.Queue()
+            for _ in range(self.workers):
+                loop.create_task(self._worker())
+
+        asyncio.run_coroutine_threadsafe(create_workers(), loop).result()
+
+    async def _worker(self):
+        while True:
+            job, work = await self._queue.get()
+            with self._lock:
+                self._queued -= 1
+            job.status = "running"
+            request_priority.set(job.priority)
+            job.started = time.time()
+            try:
+                job.result = await work(job)
+                job.status = "completed"
+            except Exception as e:
+                print(f"Job {job.id} failed:", e)
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished = time.time()
+                JOB_SECONDS.observe(job.finished - job.started, job.kind, job.status)
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, kind, work, progress=None):
+        """Queue an async callable work(job) and return its Job right away"""
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._start()
+
+        job = Job(kind, progress)
+        with self._lock:
+            self._evict_expired()
+            if self._queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({self.max_queued} waiting)")
+            self._queued += 1
+            self._jobs[job.id] = job
+        get_loop().call_soon_threadsafe(self._queue.put_nowait, (job, work))
+        return job
+
+    def get(self, job_id):
+        """Look up a job that is still retained, or None"""
+        with self._lock:
+            self._evict_expired()
+            return self._jobs.get(job_id)
+
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        with self._lock:
+            return self._queued
+
+
+job_queue = JobQueue()
@@ -0,0 +1,102 @@
+import os
+import threading
+import weakref
+
+# requests, aiohttp and langchain are imported on first use rather than here:
+# together they take most of a second, which every worker would pay at startup
+
+# Default model used by every agent and the chatbot
+DEFAULT_MODEL = "medllama2"
+
+# Where the Ollama server lives and how many sockets we keep open to it (per
+# server, when OLLAMA_BACKENDS spreads calls over several; see Utils/Backends.py)
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "16"))
+
+# Per-model generation settings, passed straight through to the Ollama client.
+# Anything not listed here uses the server-side Modelfile defaults.
+MODEL_SETTINGS = {
+    "medllama2": {
+        "keep_alive": "30m",
+    },
+}
+
+_clients = {}
+_sessions = {}
+# aiohttp sessions are bound to an event loop, so async pools are kept per loop
+_async_sessions = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_session(base_url=OLLAMA_BASE_URL):
+    """Get the shared keep-alive HTTP session for an Ollama server"""
+    session = _sessions.get(base_url)
+    if session is None:
+        with _lock:
+            session = _sessions.get(base_url)
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                # pool_block makes callers wait for a free socket instead of
+                # opening connections beyond the configured limit
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=MAX_CONNECTIONS,
+                    pool_block=True
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _sessions[base_url] = session
+    return session
+
+
+def get_async_session(loop):
+    """Get the shared keep-alive aiohttp session for an event loop"""
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        import aiohttp
+        from .Backends import backend_pool
+
+        # One session serves every backend, each with its own socket limit
+        connector = aiohttp.TCPConnector(
+            limit=MAX_CONNECTIONS * len(backend_pool.backends),
+            limit_per_host=MAX_CONNECTIONS,
+            keepalive_timeout=60
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session(loop):
+    """Close the aiohttp session for an event loop before the loop shuts down"""
+    session = _async_sessions.pop(loop, None)
+    if session is not None:
+        await session.close()
+
+
+def configure_model(model, **settings):
+    """Update the settings for a model and drop its cached client"""
+    with _lock:
+        MODEL_SETTINGS.setdefault(model, {}).update(settings)
+        _clients.pop(model, None)
+
+
+def get_llm(model=DEFAULT_MODEL):
+    """Get the process-wide client for a model, creating it on first use"""
+    client = _clients.get(model)
+    if client is None:
+        with _lock:
+            client = _clients.get(model)
+            if client is None:
+                settings = dict(MODEL_SETTINGS.get(model, {}))
+                settings.setdefault("base_url", OLLAMA_BASE_URL)
+                from .Backends import backend_pool
+                from .Ollama import PooledOllama
+
+                client = PooledOllama(model=model, **settings)
+                _clients[model] = client
+                backend_pool.start_health_checks()
+    return client
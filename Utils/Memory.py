@@ -0,0 +1,130 @@
+import asyncio
+import os
+import threading
+from typing import Any
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import get_buffer_string
+from pydantic import PrivateAttr
+
+from .Pipeline import get_loop, arun_stage
+from .Prompts import count_tokens
+
+# Tokens of conversation history (summary plus verbatim turns) sent with each
+# follow-up question, and the length the rolling summary is asked to stay under
+MEMORY_TOKEN_BUDGET = int(os.environ.get("MEMORY_TOKEN_BUDGET", "1000"))
+MEMORY_SUMMARY_WORDS = int(os.environ.get("MEMORY_SUMMARY_WORDS", "150"))
+
+SUMMARY_PROMPT = """Progressively summarize a conversation between a user and a medical AI assistant.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+Write an updated summary in under {words} words. Keep every symptom, condition and
+recommendation that was mentioned, and do not add anything that was not said.
+
+Updated summary:"""
+
+
+class RollingSummaryMemory(ConversationBufferMemory):
+    """Conversation memory that keeps recent turns verbatim within a token budget
+
+    Turns that no longer fit are folded into a running summary by a background
+    task on the pipeline loop, so summarizing never delays a reply. Until a
+    fold finishes, turns awaiting it are simply left out of the prompt.
+    """
+
+    llm: Any = None
+    max_token_limit: int = MEMORY_TOKEN_BUDGET
+    summary: str = ""
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _folding: Any = PrivateAttr(default=None)
+    # Characters in the buffered messages, kept up to date as they change
+    _chars: int = PrivateAttr(default=0)
+
+    def _split(self, messages, budget):
+        # Index of the first message that fits in the budget, walking back from
+        # the newest; the latest exchange is always kept
+        used = 0
+        for index in range(len(messages) - 1, -1, -1):
+            used += count_tokens(get_buffer_string([messages[index]]))
+            if used > budget and index < len(messages) - 2:
+                return index + 1
+        return 0
+
+    def load_memory_variables(self, inputs):
+        with self._lock:
+            messages = list(self.chat_memory.messages)
+            summary = self.summary
+        budget = self.max_token_limit - count_tokens(summary)
+        recent = messages[self._split(messages, budget):]
+        history = get_buffer_string(recent, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        if summary:
+            history = f"Summary of earlier conversation: {summary}\n{history}"
+        return {self.memory_key: history}
+
+    def save_context(self, inputs, outputs):
+        super().save_context(inputs, outputs)
+        with self._lock:
+            # save_context appends the user's turn and the reply
+            self._chars += sum(len(message.content) for message in self.chat_memory.messages[-2:])
+        self._schedule_fold()
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            self._chars = 0
+
+    def restore(self, messages, summary):
+        """Replace the buffer and summary, e.g. with a session snapshot"""
+        with self._lock:
+            self.chat_memory.messages = list(messages)
+            self.summary = summary
+            self._chars = sum(len(message.content) for message in messages)
+
+    def size(self):
+        """Characters held in the buffer and summary"""
+        return self._chars + len(self.summary)
+
+    def _schedule_fold(self):
+        if self.llm is None:
+            return
+        with self._lock:
+            if self._folding is not None:
+                return
+            messages = list(self.chat_memory.messages)
+            budget = self.max_token_limit - count_tokens(self.summary)
+            if not self._split(messages, budget):
+                return
+            # Fold down to half the budget so summaries run every few turns
+            # rather than on every turn once the conversation is long
+            folded = messages[:self._split(messages, budget // 2)]
+            self._folding = asyncio.run_coroutine_threadsafe(self._afold(folded), get_loop())
+
+    async def _afold(self, folded):
+        try:
+            summary = await arun_stage("summary", self.llm.ainvoke(SUMMARY_PROMPT.format(
+                summary=self.summary or "(none)",
+                new_lines=get_buffer_string(folded, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix),
+                words=MEMORY_SUMMARY_WORDS,
+            )))
+        except Exception as e:
+            print("Conversation summary failed:", e)
+            with self._lock:
+                self._folding = None
+            return
+
+        with self._lock:
+            self._folding = None
+            # The buffer may have been cleared or restored while summarizing
+            if self.chat_memory.messages[:len(folded)] != folded:
+                return
+            del self.chat_memory.messages[:len(folded)]
+            self._chars -= sum(len(message.content) for message in folded)
+            self.summary = summary.strip()
+        # Turns saved while this fold ran may already need the next one
+        self._schedule_fold()
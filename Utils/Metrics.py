@@ -0,0 +1,215 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Latency buckets in seconds, from cache hits up to slow model generations
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def values(self):
+        """Current counts by label-value tuple"""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for labelvalues, value in sorted(self.values().items()):
+            yield self.name + _label_text(self.labelnames, labelvalues), value
+
+
+class Histogram:
+    """Bucketed distribution of observed values per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts (last is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """Observe the duration of the with block, whether or not it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()}
+        for labelvalues, (counts, total, count) in sorted(values.items()):
+            # Buckets are stored per interval; Prometheus expects running totals
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket" + _label_text(self.labelnames, labelvalues, f'le="{bound}"'), cumulative
+            yield self.name + "_sum" + _label_text(self.labelnames, labelvalues), total
+            yield self.name + "_count" + _label_text(self.labelnames, labelvalues), count
+
+
+class Gauge:
+    """Value read from a callback at scrape time, so the hot path pays nothing
+
+    The callback returns a number, or a dict of label-value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.callback()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for labelvalues, sample in sorted(value.items()):
+            yield self.name + _label_text(self.labelnames, labelvalues), sample
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback, labelnames=()):
+        return self.register(Gauge(name, documentation, callback, labelnames))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for sample, value in metric.samples():
+                    lines.append(f"{sample} {value}")
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}:", e)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Model requests made by the current task and the tasks it starts, for work
+# that needs to know its own cost (a one-item list, so child tasks share it)
+model_call_tally = ContextVar("model_call_tally", default=None)
+
+
+def tally_model_call():
+    tally = model_call_tally.get()
+    if tally is not None:
+        tally[0] += 1
+
+
+STAGE_SECONDS = registry.histogram(
+    "medintel_stage_duration_seconds",
+    "Duration of each pipeline stage (extraction, structuring, specialists, team, validation, ...)",
+    ["stage"])
+STAGE_ERRORS = registry.counter(
+    "medintel_stage_errors_total", "Pipeline stages that failed or timed out", ["stage"])
+
+AGENT_SECONDS = registry.histogram(
+    "medintel_agent_duration_seconds", "Time for an agent to produce its report", ["role"])
+AGENT_ERRORS = registry.counter(
+    "medintel_agent_errors_total", "Agent generations that raised", ["role"])
+AGENT_FALLBACKS = registry.counter(
+    "medintel_agent_fallbacks_total", "Agent runs answered with the canned fallback response", ["role"])
+AGENT_GENERATED_TOKENS = registry.counter(
+    "medintel_agent_generated_tokens_total", "Estimated tokens of model output received, before trimming", ["role"])
+AGENT_KEPT_TOKENS = registry.counter(
+    "medintel_agent_kept_tokens_total", "Estimated tokens of model output kept after trimming to the word limit", ["role"])
+SPECIALIST_ROUTING = registry.counter(
+    "medintel_specialist_routing_total",
+    "Specialists run or skipped by relevance routing; each skip is a model call saved", ["role", "decision"])
+COALESCED_REQUESTS = registry.counter(
+    "medintel_coalesced_requests_total", "Requests that joined an identical computation already in flight", ["kind"])
+COALESCED_CALLS_SAVED = registry.counter(
+    "medintel_coalesced_model_calls_saved_total", "Model calls avoided by joining in-flight work", ["kind"])
+
+RESULT_LOOKUPS = registry.counter(
+    "medintel_result_lookups_total", "Stored diagnosis lookups before running the pipeline, by outcome", ["outcome"])
+SESSION_EVICTIONS = registry.counter(
+    "medintel_session_evictions_total",
+    "Chatbot sessions spilled to disk, by reason: lru (too many sessions), ttl (idle) or memory", ["reason"])
+JOB_SECONDS = registry.histogram(
+    "medintel_job_duration_seconds", "Run time of background jobs, from start to finish", ["kind", "status"])
+
+CHAT_SECONDS = registry.histogram(
+    "medintel_chat_response_duration_seconds", "Time to answer a chat message, by route", ["route"])
+
+MODEL_REQUESTS = registry.counter(
+    "medintel_model_requests_total", "Requests sent to the model server", ["model"])
+MODEL_SECONDS = registry.histogram(
+    "medintel_model_request_duration_seconds", "Time from sending a model request to its last token", ["model"])
+PROMPT_TOKENS = registry.counter(
+    "medintel_prompt_tokens_total", "Prompt tokens evaluated by the model server", ["model"])
+COMPLETION_TOKENS = registry.counter(
+    "medintel_completion_tokens_total", "Tokens generated by the model server", ["model"])
+BACKEND_REQUESTS = registry.counter(
+    "medintel_backend_requests_total", "Model requests per backend server, by outcome", ["backend", "outcome"])
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "medintel_admission_wait_seconds", "Time model calls wait for an admission slot, by priority class", ["priority"])
+ADMISSION_REJECTED = registry.counter(
+    "medintel_admission_rejected_total", "Requests turned away with 429 because their queue was full", ["priority"])
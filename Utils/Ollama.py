@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+from langchain_community.llms import Ollama
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+
+from .Admission import admission
+from .Backends import backend_pool
+from .LLMClient import get_session, get_async_session
+from .Metrics import MODEL_REQUESTS, MODEL_SECONDS, PROMPT_TOKENS, COMPLETION_TOKENS, tally_model_call
+
+
+class PooledOllama(Ollama):
+    """Ollama client that sends requests through a shared connection pool"""
+
+    def _record_usage(self, line, started):
+        # Only the final line of a generation carries the server's token counts;
+        # a substring check keeps the per-token cost negligible
+        if '"done":true' not in line and '"done": true' not in line:
+            return
+        MODEL_SECONDS.observe(time.perf_counter() - started, self.model)
+        try:
+            usage = json.loads(line)
+        except ValueError:
+            return
+        PROMPT_TOKENS.inc(self.model, amount=usage.get("prompt_eval_count", 0))
+        COMPLETION_TOKENS.inc(self.model, amount=usage.get("eval_count", 0))
+
+    def _tracked_lines(self, lines, started):
+        for line in lines:
+            self._record_usage(line, started)
+            yield line
+
+    def _request_payload(self, payload, stop=None, **kwargs):
+        # Mirrors Ollama._create_stream so generation options behave the same
+        if self.stop is not None and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        elif self.stop is not None:
+            stop = self.stop
+
+        params = self._default_params
+        for key in self._default_params:
+            if key in kwargs:
+                params[key] = kwargs[key]
+
+        if "options" in kwargs:
+            params["options"] = kwargs["options"]
+        else:
+            params["options"] = {
+                **params["options"],
+                "stop": stop,
+                **{k: v for k, v in kwargs.items() if k not in self._default_params},
+            }
+
+        if payload.get("messages"):
+            return {"messages": payload.get("messages", []), **params}
+        return {
+            "prompt": payload.get("prompt"),
+            "images": payload.get("images", []),
+            **params,
+        }
+
+    def _backend_url(self, api_url, backend):
+        # langchain builds api_url from base_url; send it to the chosen backend instead
+        return backend.url + api_url[len(self.base_url):]
+
+    def _create_stream(self, api_url, payload, stop=None, **kwargs):
+        # Every model call takes a process-wide admission slot, in priority order
+        acquired = admission.acquire()
+        try:
+            yield from self._backend_stream(api_url, payload, stop, **kwargs)
+        finally:
+            admission.release(acquired)
+
+    async def _acreate_stream(self, api_url, payload, stop=None, **kwargs):
+        acquired = await admission.aacquire()
+        lines = self._abackend_stream(api_url, payload, stop, **kwargs)
+        try:
+            async for line in lines:
+                yield line
+        finally:
+            await lines.aclose()
+            admission.release(acquired)
+
+    def _backend_stream(self, api_url, payload, stop=None, **kwargs):
+        import requests
+
+        request_payload = self._request_payload(payload, stop, **kwargs)
+        tried = set()
+        while True:
+            backend = backend_pool.acquire(exclude=tried)
+            MODEL_REQUESTS.inc(self.model)
+            tally_model_call()
+            started = time.perf_counter()
+            try:
+                response = get_session(backend.url).post(
+                    url=self._backend_url(api_url, backend),
+                    headers={
+                        "Content-Type": "application/json",
+                        **(self.headers if isinstance(self.headers, dict) else {}),
+                    },
+                    auth=self.auth,
+                    json=request_payload,
+                    stream=True,
+                    timeout=self.timeout,
+                )
+            except requests.ConnectionError:
+                # Nothing was generated yet, so another backend can take the call
+                backend_pool.release(backend, ok=False)
+                tried.add(backend.url)
+                if len(tried) >= len(backend_pool.backends):
+                    raise
+                continue
+            except BaseException:
+                backend_pool.release(backend, ok=False)
+                raise
+            response.encoding = "utf-8"
+            if response.status_code != 200:
+                # Release the socket back to the pool before raising
+                detail = response.text
+                response.close()
+                backend_pool.release(backend, ok=response.status_code < 500)
+                if response.status_code >= 500 and len(tried) + 1 < len(backend_pool.backends):
+                    tried.add(backend.url)
+                    continue
+                if response.status_code == 404:
+                    raise OllamaEndpointNotFoundError(
+                        "Ollama call failed with status code 404. "
+                        "Maybe your model is not found "
+                        f"and you should pull the model with `ollama pull {self.model}`."
+                    )
+                raise ValueError(
+                    f"Ollama call failed with status code {response.status_code}."
+                    f" Details: {detail}"
+                )
+            ok = False
+            try:
+                yield from self._tracked_lines(response.iter_lines(decode_unicode=True), started)
+                ok = True
+            except GeneratorExit:
+                # The caller stopped reading; the backend did nothing wrong
+                ok = True
+                raise
+            finally:
+                backend_pool.release(backend, ok)
+            return
+
+    async def _abackend_stream(self, api_url, payload, stop=None, **kwargs):
+        request_payload = self._request_payload(payload, stop, **kwargs)
+        session = get_async_session(asyncio.get_running_loop())
+        tried = set()
+        while True:
+            backend = await backend_pool.aacquire(exclude=tried)
+            MODEL_REQUESTS.inc(self.model)
+            tally_model_call()
+            started = time.perf_counter()
+            ok = False
+            try:
+                async with session.post(
+                    url=self._backend_url(api_url, backend),
+                    headers={
+                        "Content-Type": "application/json",
+                        **(self.headers if isinstance(self.headers, dict) else {}),
+                    },
+                    auth=self.auth,
+                    json=request_payload,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                ) as response:
+                    if response.status != 200:
+                        ok = response.status < 500
+                        if not ok and len(tried) + 1 < len(backend_pool.backends):
+                            tried.add(backend.url)
+                            continue
+                        if response.status == 404:
+                            raise OllamaEndpointNotFoundError(
+                                "Ollama call failed with status code 404."
+                            )
+                        detail = await response.text()
+                        raise ValueError(
+                            f"Ollama call failed with status code {response.status}."
+                            f" Details: {detail}"
+                        )
+                    async for line in response.content:
+                        line = line.decode("utf-8")
+                        self._record_usage(line, started)
+                        yield line
+                    ok = True
+            except aiohttp.ClientConnectorError:
+                # Nothing was generated yet, so another backend can take the call
+                tried.add(backend.url)
+                if len(tried) >= len(backend_pool.backends):
+                    raise
+                continue
+            except (GeneratorExit, asyncio.CancelledError):
+                # The caller stopped reading; the backend did nothing wrong
+                ok = True
+                raise
+            finally:
+                backend_pool.release(backend, ok)
+            return
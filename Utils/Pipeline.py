@@ -0,0 +1,389 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .Admission import MAX_INFLIGHT, carry_priority
+from .Agents import MultidisciplinaryTeam, SpecialistSynthesis
+from .Cache import response_cache
+from .Chunking import needs_chunking, split_sections, pack_sections
+from .Chunking import CHUNK_THRESHOLD_TOKENS, CHUNK_TOKENS, SPECIALIST_TOKEN_BUDGET
+from .Coalesce import SingleFlight
+from .LLMClient import get_llm
+from .Metrics import STAGE_SECONDS, STAGE_ERRORS, SPECIALIST_ROUTING
+from .Prompts import prompt_registry
+from .Results import result_store, RESULTS_REUSE
+from .Specialists import specialist_registry
+
+# Model calls in flight across the process, now enforced per call by the
+# admission controller (Utils/Admission.py). All pipeline work runs as
+# coroutines on one background event loop, so waiting on the model costs a
+# coroutine rather than an OS thread.
+MAX_CONCURRENCY = MAX_INFLIGHT
+
+# Seconds each stage may take before it is reported as failed
+STAGE_TIMEOUTS = {
+    "structuring": float(os.environ.get("PIPELINE_STRUCTURING_TIMEOUT", "60")),
+    "specialists": float(os.environ.get("PIPELINE_SPECIALIST_TIMEOUT", "120")),
+    "team": float(os.environ.get("PIPELINE_TEAM_TIMEOUT", "120")),
+    "validation": float(os.environ.get("PIPELINE_VALIDATION_TIMEOUT", "120")),
+    "summary": float(os.environ.get("PIPELINE_SUMMARY_TIMEOUT", "120")),
+    "conditions": float(os.environ.get("PIPELINE_CONDITION_TIMEOUT", "120")),
+}
+
+# Only run the specialists whose terms appear in the report; the others get
+# NOT_APPLICABLE_REPORT without a model call
+SPECIALIST_ROUTING_ENABLED = os.environ.get("PIPELINE_SPECIALIST_ROUTING", "1") != "0"
+NOT_APPLICABLE_REPORT = "Not applicable: the report does not mention anything in this specialty."
+
+# Identical diagnoses requested while one is running share its result
+diagnosis_flights = SingleFlight("diagnosis")
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """Get the shared pipeline event loop, starting its thread on first use"""
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+
+                def serve():
+                    asyncio.set_event_loop(loop)
+                    started.set()
+                    loop.run_forever()
+
+                _loop_thread = threading.Thread(target=serve, name="diagnosis-loop", daemon=True)
+                _loop_thread.start()
+                started.wait()
+                _loop = loop
+    return _loop
+
+
+def _check_not_on_loop():
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("Synchronous pipeline calls can't be made from the pipeline loop; await the async API instead")
+
+
+def run_sync(coro):
+    """Run a pipeline coroutine from synchronous code and wait for its result"""
+    _check_not_on_loop()
+    return asyncio.run_coroutine_threadsafe(carry_priority(coro), get_loop()).result()
+
+
+def iterate_sync(agen):
+    """Drive a pipeline async generator from synchronous code, one item at a time"""
+    _check_not_on_loop()
+    loop = get_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(carry_priority(agen.__anext__()), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+
+async def run_on_loop(coro):
+    """Await a pipeline coroutine from another event loop (e.g. an async Flask view)"""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(carry_priority(coro), loop))
+
+
+async def arun_stage(stage, coro):
+    """Await one stage, bounded by its timeout; its model calls wait for admission"""
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(coro, STAGE_TIMEOUTS[stage])
+    except asyncio.TimeoutError:
+        STAGE_ERRORS.inc(stage)
+        raise TimeoutError(f"{stage} stage timed out after {STAGE_TIMEOUTS[stage]:.0f}s")
+    except Exception:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+async def astream_stage(stage, chunks):
+    """Relay a streamed stage, bounded by its timeout; its model calls wait for admission"""
+    timeout = STAGE_TIMEOUTS[stage]
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - time.monotonic(), 0))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{stage} stage timed out after {timeout:.0f}s")
+            yield chunk
+    except Exception:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+        await chunks.aclose()
+
+
+async def _analyse_sections(name, sections):
+    """Map a specialist over report sections in parallel, then reduce to one report"""
+    reports = await asyncio.gather(*(
+        specialist_registry.create(name, section).agenerate() for section in sections
+    ))
+    if len(reports) == 1:
+        return reports[0]
+    # If the reduce fails, arun falls back to the section analyses themselves
+    return await SpecialistSynthesis(name, reports).arun()
+
+
+async def _run_specialist(name, medical_report, sections=None):
+    # Each model call takes its own admission slot, so a map-reduce never
+    # waits on slots held by its own caller
+    try:
+        if sections is None:
+            report = await specialist_registry.create(name, medical_report).agenerate()
+        else:
+            report = await _analyse_sections(name, sections)
+        return name, report, None
+    except Exception as e:
+        print(f"{name} failed:", e)
+        return name, None, str(e)
+
+
+def route_specialists(text, specialists):
+    """Decide which specialists a report needs: {role: {"run": bool, "score": int}}
+
+    Uses the same local term matching as report sections, so routing costs
+    one scan of the text. If no specialist matches, all of them run, since
+    the text gives nothing to route on.
+    """
+    scores = specialist_registry.scorer().score(text)
+    relevant = [name for name in specialists if scores.get(name, 0) > 0]
+    if not SPECIALIST_ROUTING_ENABLED or not relevant:
+        relevant = specialists
+    decisions = {}
+    for name in specialists:
+        decisions[name] = {"run": name in relevant, "score": scores.get(name, 0)}
+        SPECIALIST_ROUTING.inc(name, "run" if name in relevant else "skipped")
+    return decisions
+
+
+def plan_sections(medical_report, specialists):
+    """The chunks of the report each specialist should read, or None to send the whole report
+
+    Long reports are split into sections and each specialist gets only the
+    ones that mention its area, packed into as few chunks as fit. A
+    specialist with no matching section reads the first one, which usually
+    holds the presenting complaint.
+    """
+    if not needs_chunking(medical_report):
+        return None
+    sections = split_sections(medical_report)
+    selected = specialist_registry.scorer().select(sections)
+    return {
+        name: pack_sections([sections[index] for index in selected.get(name) or [0]])
+        for name in specialists
+    }
+
+
+def report_hash(medical_report):
+    return hashlib.sha256(medical_report.encode("utf-8")).hexdigest()
+
+
+def model_name():
+    model = get_llm()
+    return getattr(model, "model", type(model).__name__)
+
+
+def result_key(medical_report, routing, report_sha256=None):
+    """Identify a diagnosis result by report content and everything that shapes it
+
+    report_sha256 is the uploaded file's hash when the caller already has it.
+    """
+    running = sorted(name for name, decision in routing.items() if decision["run"])
+    roles = [*routing, "SpecialistSynthesis", "MultidisciplinaryTeam"]
+    material = json.dumps({
+        "report": report_sha256 or report_hash(medical_report),
+        "specialists": list(routing),
+        "running": running,
+        "prompts": {role: [prompt_registry.get(role).text, prompt_registry.get(role).limits] for role in roles},
+        "chunking": [CHUNK_THRESHOLD_TOKENS, CHUNK_TOKENS, SPECIALIST_TOKEN_BUDGET],
+        "model": model_name(),
+        "version": response_cache.version,
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _prepare_event(event, joined):
+    # Each request gets its own copy of the result, marked if it joined another's run
+    if event["type"] != "result":
+        return event
+    return {**event, "coalesced": True} if joined else dict(event)
+
+
+def _replay_diagnosis(stored, stream_team):
+    # The events of a stored diagnosis, as if it had just run
+    yield {"type": "routing", "specialists": stored["routing"]}
+    for name, report in stored["specialist_reports"].items():
+        skipped = not stored["routing"].get(name, {}).get("run", True)
+        yield {"type": "specialist", "role": name, "report": report, **({"skipped": True} if skipped else {})}
+    yield {"type": "status", "stage": "MultidisciplinaryTeam"}
+    if stream_team:
+        yield {"type": "token", "text": stored["final_diagnosis"]}
+    yield {
+        "type": "result",
+        "specialist_reports": stored["specialist_reports"],
+        "final_diagnosis": stored["final_diagnosis"],
+        "failed_specialists": stored["failed_specialists"],
+        "routing": stored["routing"],
+        "result_id": stored["id"],
+        "stored": True
+    }
+
+
+async def astream_diagnosis(medical_report, stream_team=True, route_text=None, report_name=None,
+                            report_sha256=None):
+    """Yield specialist reports as they finish, then the team synthesis, then a result event
+
+    Specialists that fail or time out are reported with an error instead of a
+    canned answer, and the team works from the reports that did come back.
+    Specialists are routed on route_text (the report itself by default), and
+    long reports are analysed section by section (see plan_sections). A
+    diagnosis already in the results store is replayed from it, and a request
+    identical to one already running joins it instead of starting a second
+    run, whether or not either streams the team synthesis. Every diagnosis
+    run is saved to the store, and its result event carries the stored
+    result_id. For an uploaded report, pass the file's report_sha256 so the
+    text isn't hashed again.
+    """
+    yield {"type": "status", "stage": "specialists"}
+    routing = route_specialists(route_text or medical_report, specialist_registry.names())
+    report_sha256 = report_sha256 or report_hash(medical_report)
+    key = result_key(medical_report, routing, report_sha256)
+    # An indexed lookup, quick enough to make on the loop
+    stored = result_store.lookup(key) if RESULTS_REUSE else None
+    if stored is not None:
+        for event in _replay_diagnosis(stored, stream_team):
+            yield event
+        return
+    # The shared run always streams the team synthesis; callers that don't
+    # want its tokens skip them, so both kinds of request can join one run
+    async for event in diagnosis_flights.stream(
+        key,
+        lambda: _astream_diagnosis(medical_report, routing, key, report_name, report_sha256),
+        _prepare_event
+    ):
+        if stream_team or event["type"] != "token":
+            yield event
+
+
+async def _astream_diagnosis(medical_report, routing, key, report_name, report_sha256):
+    specialists = list(routing)
+    diagnosis_started = time.perf_counter()
+    yield {"type": "routing", "specialists": routing}
+
+    reports = {}
+    failures = {}
+    for name in specialists:
+        if not routing[name]["run"]:
+            reports[name] = NOT_APPLICABLE_REPORT
+            yield {"type": "specialist", "role": name, "report": NOT_APPLICABLE_REPORT, "skipped": True}
+
+    # One task per routed specialist; the shared concurrency limit, not the
+    # number of specialists, bounds how many model calls run at once
+    running = [name for name in specialists if routing[name]["run"]]
+    sections = plan_sections(medical_report, running)
+    tasks = [
+        asyncio.ensure_future(_run_specialist(name, medical_report, sections[name] if sections else None))
+        for name in running
+    ]
+    started = time.perf_counter()
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=STAGE_TIMEOUTS["specialists"]):
+            name, report, error = await next_done
+            if error is None:
+                reports[name] = report
+                yield {"type": "specialist", "role": name, "report": report}
+            else:
+                failures[name] = error
+                yield {"type": "specialist", "role": name, "report": None, "error": error}
+    except asyncio.TimeoutError:
+        for name in running:
+            if name not in reports and name not in failures:
+                failures[name] = f"timed out after {STAGE_TIMEOUTS['specialists']:.0f}s"
+                yield {"type": "specialist", "role": name, "report": None, "error": failures[name]}
+    finally:
+        for task in tasks:
+            task.cancel()
+        specialist_seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(specialist_seconds, "specialists")
+    if failures:
+        STAGE_ERRORS.inc("specialists", amount=len(failures))
+
+    # Tell the team which reports are missing rather than inventing findings
+    team_agent = MultidisciplinaryTeam({
+        name: reports.get(name, f"Not available ({name} analysis failed).")
+        for name in specialists
+    })
+
+    yield {"type": "status", "stage": "MultidisciplinaryTeam"}
+    team_started = time.perf_counter()
+    try:
+        chunks = []
+        async for chunk in astream_stage("team", team_agent.agenerate_stream()):
+            chunks.append(chunk)
+            yield {"type": "token", "text": chunk}
+        final_diagnosis = "".join(chunks)
+    except Exception as e:
+        print("MultidisciplinaryTeam failed:", e)
+        failures["MultidisciplinaryTeam"] = str(e)
+        final_diagnosis = team_agent.fallback_response()
+        yield {"type": "token", "text": final_diagnosis}
+
+    result = {
+        "specialist_reports": reports,
+        "final_diagnosis": final_diagnosis,
+        "failed_specialists": failures,
+        "routing": routing
+    }
+    finished = time.perf_counter()
+    timings = {
+        "specialists": round(specialist_seconds, 3),
+        "team": round(finished - team_started, 3),
+        "total": round(finished - diagnosis_started, 3),
+    }
+    # Queued for the results store's writer thread; nothing waits on the disk here
+    result_id = result_store.save(key, report_sha256, result, timings,
+                                  model_name(), response_cache.version, report_name)
+    yield {"type": "result", **result, "result_id": result_id}
+
+
+async def arun_diagnosis(medical_report, report_name=None, report_sha256=None):
+    """Run the full specialist and team pipeline and return its result"""
+    async for event in astream_diagnosis(medical_report, stream_team=False, report_name=report_name,
+                                         report_sha256=report_sha256):
+        if event["type"] == "result":
+            return {key: value for key, value in event.items() if key != "type"}
+
+
+def stream_diagnosis(medical_report, stream_team=True, report_name=None, report_sha256=None):
+    """Synchronous wrapper around astream_diagnosis"""
+    return iterate_sync(astream_diagnosis(medical_report, stream_team, report_name=report_name,
+                                          report_sha256=report_sha256))
+
+
+def run_diagnosis(medical_report, report_name=None, report_sha256=None):
+    """Synchronous wrapper around arun_diagnosis"""
+    return run_sync(arun_diagnosis(medical_report, report_name, report_sha256))
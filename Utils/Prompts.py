@@ -0,0 +1,201 @@
+import json
+import os
+from string import Formatter
+
+# Directory of extra role templates, one JSON file per role:
+# {"role": "Dermatologist", "template": "... {medical_report} ...", "word_limit": 60}
+# Generation limits (word_limit, num_predict, stop) are optional and default
+# to DEFAULT_LIMITS; "fallback" sets the answer used when the model fails.
+AGENT_PROMPTS_DIR = os.environ.get(
+    "AGENT_PROMPTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prompts")
+)
+
+# Built-in role templates. Report text is substituted as data, so braces in it
+# are harmless. The team template receives however many specialist reports
+# came back as one block, one line per report.
+ROLE_TEMPLATES = {
+    "Cardiologist": """
+                    You are a cardiologist examining a patient report.
+                    
+                    Patient Report: {medical_report}
+                    
+                    IMPORTANT INSTRUCTIONS:
+                    1. Analyze ONLY cardiovascular symptoms and concerns EXPLICITLY mentioned in this report
+                    2. DO NOT assume or invent any medical history, conditions, or test results
+                    3. If no cardiac symptoms are mentioned, clearly state this
+                    4. Keep your report under 50 words
+                    5. Be factual and avoid speculation
+                    
+                    Format your brief analysis as:
+                    [1-2 sentences summarizing cardiac findings and recommendations only]
+                """,
+    "Psychologist": """
+                    You are a psychologist examining a patient report.
+                    
+                    Patient Report: {medical_report}
+                    
+                    IMPORTANT INSTRUCTIONS:
+                    1. Analyze ONLY psychological/behavioral symptoms EXPLICITLY mentioned in this report
+                    2. DO NOT assume or invent any medical history, conditions, or test results
+                    3. If no psychological symptoms are mentioned, clearly state this
+                    4. Keep your report under 50 words
+                    5. Be factual and avoid speculation
+                    
+                    Format your brief analysis as:
+                    [1-2 sentences summarizing psychological findings and recommendations only]
+                """,
+    "Pulmonologist": """
+                    You are a pulmonologist examining a patient report.
+                    
+                    Patient Report: {medical_report}
+                    
+                    IMPORTANT INSTRUCTIONS:
+                    1. Analyze ONLY respiratory symptoms and concerns EXPLICITLY mentioned in this report
+                    2. DO NOT assume or invent any medical history, conditions, or test results
+                    3. If no respiratory symptoms are mentioned, clearly state this
+                    4. Keep your report under 50 words
+                    5. Be factual and avoid speculation
+                    
+                    Format your brief analysis as:
+                    [1-2 sentences summarizing respiratory findings and recommendations only]
+                """,
+    "MultidisciplinaryTeam": """
+                You are a multidisciplinary medical team leader synthesizing specialist reports.
+                
+                Given Reports:
+                {specialist_reports}
+                
+                IMPORTANT: Create a concise, accurate final diagnosis based ONLY on information explicitly mentioned in the specialist reports. DO NOT assume or invent any conditions not specifically mentioned in the reports.
+                
+                Please provide a brief analysis in this format:
+                
+                [Brief 1-3 sentence summary of the main findings and recommendations]
+                • [Key finding 1]
+                • [Key finding 2 (if present)]
+                • [Key recommendation(s)]
+                
+                Your final diagnosis should be under 100 words total.
+            """,
+    # Combines one specialist's analyses of separate sections of a long report
+    "SpecialistSynthesis": """
+                    You are a {specialty} combining your analyses of separate sections of one patient's records.
+                    
+                    Section Analyses:
+                    {section_reports}
+                    
+                    IMPORTANT INSTRUCTIONS:
+                    1. Merge these into a single report on the whole record
+                    2. Use ONLY findings stated in the section analyses; DO NOT add new ones
+                    3. If a finding appears in several sections, mention it once
+                    4. Keep your report under 50 words
+                    
+                    Format your brief analysis as:
+                    [1-2 sentences summarizing the findings and recommendations only]
+                """,
+}
+
+
+# Generation limits per role. num_predict caps the tokens the model generates
+# (about 1.6 tokens per word of medical text), so the word limit applied
+# afterwards only trims the last few words rather than discarding most of a
+# long answer. Stop sequences end a generation that starts a new section.
+DEFAULT_LIMITS = {
+    "word_limit": 60,
+    "num_predict": 96,
+    "stop": ["\n\n\n", "Patient Report:"],
+}
+
+ROLE_LIMITS = {
+    "Cardiologist": DEFAULT_LIMITS,
+    "Psychologist": DEFAULT_LIMITS,
+    "Pulmonologist": DEFAULT_LIMITS,
+    "SpecialistSynthesis": DEFAULT_LIMITS,
+    # Asked for under 100 words, with a little buffer on top
+    "MultidisciplinaryTeam": {
+        "word_limit": 120,
+        "num_predict": 192,
+        "stop": ["\n\n\n", "Given Reports:"],
+    },
+}
+
+
+# Answers given when a role's model call fails
+DEFAULT_FALLBACK = "Unable to generate a diagnosis due to insufficient information."
+
+ROLE_FALLBACKS = {
+    "Cardiologist": "No cardiovascular findings or concerns identified in the provided report.",
+    "Psychologist": "No psychological symptoms or concerns identified in the provided report.",
+    "Pulmonologist": "No respiratory findings or concerns identified in the provided report.",
+}
+
+
+def count_tokens(text):
+    """Approximate token count, at about four characters per token"""
+    return (len(text) + 3) // 4
+
+
+class CompiledPrompt:
+    """A role template parsed once into literal text and variable slots"""
+
+    def __init__(self, role, template, limits=None, fallback=None):
+        self.role = role
+        self.text = template
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.fallback = fallback or DEFAULT_FALLBACK
+        self._parts = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"Prompt template for {role} uses a format spec on {{{field}}}; only plain variables are supported")
+            self._parts.append((literal, field))
+        self.input_variables = [field for _, field in self._parts if field is not None]
+
+    def render(self, **values):
+        """Fill the template's variables; values are inserted as-is, never re-parsed"""
+        try:
+            return "".join(
+                literal if field is None else literal + str(values[field])
+                for literal, field in self._parts
+            )
+        except KeyError as e:
+            raise ValueError(f"Missing prompt variable {e} for {self.role}")
+
+    def generation_params(self):
+        """Options passed to the model with every call for this role"""
+        return {"num_predict": self.limits["num_predict"], "stop": list(self.limits["stop"])}
+
+
+class PromptRegistry:
+    """Compiled prompt templates by agent role"""
+
+    def __init__(self, templates=ROLE_TEMPLATES, limits=ROLE_LIMITS, fallbacks=ROLE_FALLBACKS):
+        self._prompts = {}
+        for role, template in templates.items():
+            self.register(role, template, limits.get(role), fallbacks.get(role))
+
+    def register(self, role, template, limits=None, fallback=None):
+        self._prompts[role] = CompiledPrompt(role, template, limits, fallback)
+
+    def load_dir(self, directory):
+        """Register every role defined by a JSON file in directory"""
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                config = json.load(f)
+            limits = {key: config[key] for key in DEFAULT_LIMITS if key in config}
+            self.register(config["role"], config["template"], limits, config.get("fallback"))
+
+    def get(self, role):
+        try:
+            return self._prompts[role]
+        except KeyError:
+            raise ValueError(f"No prompt template registered for role {role!r}")
+
+    def roles(self):
+        return list(self._prompts)
+
+
+prompt_registry = PromptRegistry()
+if os.path.isdir(AGENT_PROMPTS_DIR):
+    prompt_registry.load_dir(AGENT_PROMPTS_DIR)
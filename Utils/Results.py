@@ -0,0 +1,218 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from .Metrics import RESULT_LOOKUPS
+
+# SQLite database holding every diagnosis, indexed by report content hash
+RESULTS_DB = os.environ.get("RESULTS_DB", os.path.join("results", "results.db"))
+# Writes are queued and committed together, at most this many per
+# transaction and at most this many seconds after they were saved
+RESULTS_BATCH_SIZE = int(os.environ.get("RESULTS_BATCH_SIZE", "64"))
+RESULTS_FLUSH_SECONDS = float(os.environ.get("RESULTS_FLUSH_SECONDS", "0.5"))
+# Serve a stored diagnosis instead of recomputing an identical one
+RESULTS_REUSE = os.environ.get("RESULTS_REUSE", "1") != "0"
+RESULTS_MAX_PAGE_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagnoses (
+    id TEXT PRIMARY KEY,
+    result_key TEXT NOT NULL,
+    report_hash TEXT NOT NULL,
+    report_name TEXT,
+    specialist_reports TEXT NOT NULL,
+    final_diagnosis TEXT NOT NULL,
+    failed_specialists TEXT NOT NULL,
+    routing TEXT NOT NULL,
+    timings TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    complete INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS diagnoses_result_key ON diagnoses (result_key, complete, created);
+CREATE INDEX IF NOT EXISTS diagnoses_report_hash ON diagnoses (report_hash, created);
+CREATE INDEX IF NOT EXISTS diagnoses_created ON diagnoses (created);
+"""
+
+COLUMNS = ("id", "result_key", "report_hash", "report_name", "specialist_reports", "final_diagnosis",
+           "failed_specialists", "routing", "timings", "model", "prompt_version", "complete", "created")
+JSON_COLUMNS = ("specialist_reports", "failed_specialists", "routing", "timings")
+SUMMARY_COLUMNS = ("id", "report_hash", "report_name", "model", "prompt_version", "complete", "created")
+
+
+class ResultStore:
+    """Diagnoses in an embedded SQLite database (WAL mode)
+
+    save() queues a record and returns its ID at once; a writer thread
+    commits queued records in batches, so requests never wait on the disk.
+    Records still waiting to be written are visible to lookups, so an
+    identical report submitted straight after is not recomputed.
+    """
+
+    def __init__(self, path=RESULTS_DB, batch_size=RESULTS_BATCH_SIZE, flush_seconds=RESULTS_FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = None
+        self.stats = {"saved": 0, "written": 0, "batches": 0, "hits": 0, "misses": 0}
+
+    def _connect(self):
+        # One connection per thread; WAL lets readers run while the writer commits
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="results-writer", daemon=True)
+                self._writer.start()
+                # Don't lose queued diagnoses when the process exits normally
+                atexit.register(self.flush)
+
+    def save(self, result_key, report_hash, result, timings, model, prompt_version, report_name=None):
+        """Queue a diagnosis for writing and return its ID"""
+        record = {
+            "id": uuid.uuid4().hex,
+            "result_key": result_key,
+            "report_hash": report_hash,
+            "report_name": report_name,
+            "specialist_reports": result["specialist_reports"],
+            "final_diagnosis": result["final_diagnosis"],
+            "failed_specialists": result["failed_specialists"],
+            "routing": result.get("routing", {}),
+            "timings": timings,
+            "model": model,
+            "prompt_version": prompt_version,
+            "complete": int(not result["failed_specialists"]),
+            "created": time.time(),
+        }
+        if self._writer is None:
+            self._start()
+        with self._lock:
+            self._pending[record["id"]] = record
+            self.stats["saved"] += 1
+        self._queue.put(record)
+        return record["id"]
+
+    def _write_loop(self):
+        while True:
+            # None is a flush request: write what has been collected right away
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while items[-1] is not None and len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            batch = [record for record in items if record is not None]
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} diagnoses to {self.path}:", e)
+            finally:
+                with self._lock:
+                    for record in batch:
+                        self._pending.pop(record["id"], None)
+                for _ in items:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        connection = self._connect()
+        rows = [
+            tuple(json.dumps(record[column]) if column in JSON_COLUMNS else record[column] for column in COLUMNS)
+            for record in batch
+        ]
+        with connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO diagnoses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows
+            )
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    def flush(self):
+        """Block until every queued diagnosis has been written"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._queue.join()
+
+    def _decode(self, row):
+        record = dict(row)
+        for column in JSON_COLUMNS:
+            if column in record:
+                record[column] = json.loads(record[column])
+        record["complete"] = bool(record["complete"])
+        return record
+
+    def lookup(self, result_key):
+        """The latest complete diagnosis stored under a result key, or None"""
+        with self._lock:
+            pending = [record for record in self._pending.values()
+                       if record["result_key"] == result_key and record["complete"]]
+        if pending:
+            record = dict(max(pending, key=lambda r: r["created"]), complete=True)
+        else:
+            row = self._connect().execute(
+                "SELECT * FROM diagnoses WHERE result_key = ? AND complete = 1 ORDER BY created DESC LIMIT 1",
+                (result_key,)
+            ).fetchone()
+            record = self._decode(row) if row is not None else None
+        self.stats["hits" if record is not None else "misses"] += 1
+        RESULT_LOOKUPS.inc("hit" if record is not None else "miss")
+        return record
+
+    def get(self, result_id):
+        """A stored diagnosis by ID, or None"""
+        with self._lock:
+            record = self._pending.get(result_id)
+        if record is not None:
+            return dict(record, complete=bool(record["complete"]))
+        row = self._connect().execute("SELECT * FROM diagnoses WHERE id = ?", (result_id,)).fetchone()
+        return self._decode(row) if row is not None else None
+
+    def query(self, page=1, per_page=20, report_hash=None):
+        """One page of stored diagnoses, newest first, optionally for one report
+
+        Lists what has been written so far; a diagnosis saved within the last
+        RESULTS_FLUSH_SECONDS may not be listed yet.
+        """
+        per_page = max(1, min(per_page, RESULTS_MAX_PAGE_SIZE))
+        page = max(1, page)
+        where, params = ("WHERE report_hash = ?", (report_hash,)) if report_hash else ("", ())
+        connection = self._connect()
+        total = connection.execute(f"SELECT COUNT(*) FROM diagnoses {where}", params).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)}, failed_specialists, timings FROM diagnoses {where} "
+            "ORDER BY created DESC, rowid DESC LIMIT ? OFFSET ?",
+            (*params, per_page, (page - 1) * per_page)
+        ).fetchall()
+        return {
+            "results": [self._decode(row) for row in rows],
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+
+result_store = ResultStore()
@@ -0,0 +1,194 @@
+import json
+import os
+from collections import deque
+
+# Conditions the chatbot answers directly when asked about by name, mapped to
+# the terms users refer to them by. Order matters: earlier conditions win ties.
+CONDITIONS_FILE = os.environ.get(
+    "CONDITIONS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "conditions.json")
+)
+
+
+def load_conditions(path=CONDITIONS_FILE):
+    """Read the condition catalogue: {condition: [terms, ...]}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+CONDITION_TERMS = load_conditions()
+
+# Direct questions about a condition, checked for every condition before the
+# looser references below
+QUESTION_PATTERNS = [
+    "symptoms of {term}",
+    "signs of {term}",
+    "what is {term}",
+    "what are {term} symptoms",
+    "how do i know if i have {term}",
+    "do i have {term}"
+]
+
+# Phrases like "treatment for X" or "what about X"
+REFERENCE_PATTERNS = [
+    "treatment for {term}",
+    "treatment option for {term}",
+    "what about {term}",
+    "info on {term}",
+    "about {term}",
+    "if i have {term}",
+    "{term} treatment",
+    "{term} remedy",
+    "{term} medicine"
+]
+
+INTENT_KEYWORDS = {
+    "symptom": [
+        # Physical symptoms
+        "pain", "ache", "sore", "discomfort", "pressure", "tight",
+        "numb", "tingling", "burning", "sharp", "dull", "throbbing",
+        "fever", "chill", "sweat", "fatigue", "tired", "weak",
+        "dizzy", "faint", "nausea", "vomit", "diarrhea", "constipation",
+        "cough", "breath", "wheeze", "chest", "heart", "palpitation",
+        "stomach", "headache", "migraine", "vision", "hearing",
+        "rash", "itch", "swelling", "bleeding", "bruise",
+
+        # Psychological symptoms
+        "anxiety", "stress", "worry", "fear", "panic", "depression",
+        "mood", "angry", "irritable", "confused", "memory", "concentration",
+        "sleep", "insomnia", "nightmare", "appetite", "energy",
+
+        # Descriptive terms
+        "symptom", "feel", "experiencing", "notice", "problem",
+        "condition", "issue", "concern", "worse", "better",
+        "started", "developed", "changed", "constant", "intermittent",
+
+        # Temporal markers that often indicate symptom descriptions
+        "since", "for", "days", "weeks", "months", "years", "today", "yesterday"
+    ],
+    "treatment": [
+        "treatment", "cure", "medicine", "medication", "drug", "pill",
+        "remedy", "heal", "therapy", "therapies", "care"
+    ],
+    "doctor": [
+        "doctor", "physician", "specialist", "hospital", "clinic",
+        "appointment", "visit", "consult", "consultation"
+    ],
+}
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every occurrence of many phrases in one scan
+
+    Matching walks the text once, so its cost depends on the length of the
+    message, not on how many phrases have been added.
+    """
+
+    def __init__(self, phrases=()):
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        for phrase, value in phrases:
+            self._add(phrase, value)
+        self._link()
+
+    def _add(self, phrase, value):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append(value)
+
+    def _link(self):
+        # Breadth-first, so each state's failure link is set before its children's
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+
+    def matches(self, text):
+        """Values of every phrase occurring in text, overlaps included"""
+        return [value for _, value in self.find(text)]
+
+    def find(self, text):
+        """(end index, value) of every phrase occurring in text, overlaps included"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.extend((index + 1, value) for value in outputs[state])
+        return found
+
+
+class IntentRouter:
+    """Classifies a chat message into condition and keyword intents in a single pass
+
+    The automaton is built when the router is created and rebuilt as soon as
+    a table is extended, so classifying a message never pays for a build.
+    """
+
+    def __init__(self, conditions=CONDITION_TERMS, question_patterns=QUESTION_PATTERNS,
+                 reference_patterns=REFERENCE_PATTERNS, keywords=INTENT_KEYWORDS):
+        self.question_patterns = list(question_patterns)
+        self.reference_patterns = list(reference_patterns)
+        self._conditions = [(condition, list(terms)) for condition, terms in conditions.items()]
+        self._keywords = [(term, intent) for intent, terms in keywords.items() for term in terms]
+        self._rebuild()
+
+    def add_condition(self, condition, terms):
+        """Recognize questions about a condition under any of its terms"""
+        self._conditions.append((condition, list(terms)))
+        self._rebuild()
+
+    def add_keywords(self, intent, terms):
+        """Flag messages containing any of terms with intent"""
+        self._keywords.extend((term, intent) for term in terms)
+        self._rebuild()
+
+    def _rebuild(self):
+        # Messages classified meanwhile keep using the previous automaton
+        self._automaton = KeywordAutomaton(self._phrases())
+
+    def _phrases(self):
+        yield from self._keywords
+        # Condition phrases carry a rank: question phrasings outrank references,
+        # then conditions and terms keep their table order. The lowest-ranked
+        # match wins, as in a scan of the tables in that order.
+        rank = 0
+        for patterns in (self.question_patterns, self.reference_patterns):
+            for condition, terms in self._conditions:
+                for term in terms:
+                    for pattern in patterns:
+                        yield pattern.format(term=term), (rank, condition)
+                        rank += 1
+
+    def classify(self, text):
+        """Return (condition or None, set of keyword intents) for a message"""
+        best = None
+        intents = set()
+        for value in self._automaton.matches(text.lower()):
+            if isinstance(value, tuple):
+                if best is None or value < best:
+                    best = value
+            else:
+                intents.add(value)
+        return (best[1] if best else None), intents
+
+
+intent_router = IntentRouter()
@@ -0,0 +1,289 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .Metrics import SESSION_EVICTIONS
+
+# Live chatbot sessions kept in memory: how many, how long they may sit idle
+# (seconds) and roughly how much conversation state they may hold in total
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "1000"))
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", "1800"))
+SESSION_MAX_MEMORY_BYTES = int(os.environ.get("SESSION_MAX_MEMORY_BYTES", str(64 * 1024 * 1024)))
+
+# Evicted sessions are serialized here and rehydrated on their next request;
+# snapshots untouched for SESSION_SPILL_TTL seconds are deleted. The files hold
+# patients' conversations in plain text, so the directory is private to the
+# app's user and should sit on storage cleared to hold patient data.
+SESSION_SPILL_DIR = os.environ.get(
+    "SESSION_SPILL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sessions")
+)
+SESSION_SPILL_TTL = float(os.environ.get("SESSION_SPILL_TTL", "86400"))
+SESSION_SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", "300"))
+
+# Eviction reasons as labelled on medintel_session_evictions_total
+_EVICTION_LABELS = {"capacity": "lru", "idle": "ttl", "memory": "memory"}
+
+
+class _Entry:
+    """A live session with its eviction bookkeeping"""
+
+    __slots__ = ("session", "last_used", "size", "pins", "spilling", "loaded")
+
+    def __init__(self):
+        self.session = None
+        self.last_used = time.time()
+        self.size = 0
+        # Requests using the session; a pinned session is never evicted
+        self.pins = 1
+        self.spilling = False
+        # Set once the session has been created or read back from disk
+        self.loaded = threading.Event()
+
+
+class SessionStore:
+    """LRU of live chatbot sessions with idle, count and memory-based eviction
+
+    Sessions must provide to_state() returning a JSON-serializable dict and
+    estimated_size() returning their approximate size without serializing,
+    and the factory must accept the state back via factory.from_state(state).
+
+    acquire() pins a session until the matching release(), so a session is
+    never evicted while a request is updating it. Creating, spilling and
+    rehydrating sessions happen outside the store lock.
+    """
+
+    def __init__(self, factory, max_entries=SESSION_MAX_ENTRIES, idle_ttl=SESSION_IDLE_TTL,
+                 max_memory_bytes=SESSION_MAX_MEMORY_BYTES, spill_dir=SESSION_SPILL_DIR,
+                 spill_ttl=SESSION_SPILL_TTL):
+        self.factory = factory
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self.spill_ttl = spill_ttl
+        self._sessions = OrderedDict()
+        self._memory_bytes = 0
+        # Sessions chosen for eviction whose snapshot is still being written
+        self._spilling_count = 0
+        self._spilling_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "created": 0,
+            "rehydrated": 0,
+            "evicted_capacity": 0,
+            "evicted_idle": 0,
+            "evicted_memory": 0,
+        }
+        os.makedirs(self.spill_dir, mode=0o700, exist_ok=True)
+
+    def _spill_path(self, user_id):
+        # Session IDs are generated server-side, but keep them out of path tricks
+        safe_id = "".join(c for c in user_id if c.isalnum() or c in "-_")
+        return os.path.join(self.spill_dir, f"{safe_id}.json")
+
+    def _write_spill(self, user_id, session):
+        path = self._spill_path(user_id)
+        try:
+            # Readable by the app's user only, and replaced in one step so a
+            # rehydrate never reads a half-written snapshot
+            descriptor = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(descriptor, "w", encoding="utf-8") as f:
+                json.dump(session.to_state(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Error saving session {user_id}:", e)
+
+    def _read_spill(self, user_id):
+        path = self._spill_path(user_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.remove(path)
+        return self.factory.from_state(state)
+
+    def _remove_spill(self, user_id):
+        try:
+            os.remove(self._spill_path(user_id))
+        except FileNotFoundError:
+            pass
+
+    def _victims(self):
+        """Mark the sessions over the limits for eviction; returns [(user_id, entry, reason)]"""
+        now = time.time()
+        victims = []
+
+        def mark(user_id, entry, reason):
+            entry.spilling = True
+            self._spilling_count += 1
+            self._spilling_bytes += entry.size
+            victims.append((user_id, entry, reason))
+
+        # Oldest first, so idle sessions are always at the front
+        candidates = [(user_id, entry) for user_id, entry in self._sessions.items()
+                      if not entry.pins and not entry.spilling]
+        for user_id, entry in candidates:
+            if now - entry.last_used <= self.idle_ttl:
+                break
+            mark(user_id, entry, "idle")
+        candidates = [(user_id, entry) for user_id, entry in candidates if not entry.spilling]
+        for user_id, entry in candidates:
+            if len(self._sessions) - self._spilling_count > self.max_entries:
+                mark(user_id, entry, "capacity")
+            elif self._memory_bytes - self._spilling_bytes > self.max_memory_bytes:
+                mark(user_id, entry, "memory")
+            else:
+                break
+        return victims
+
+    def _evict(self, victims):
+        """Write out marked sessions, then drop the ones nobody picked up in the meantime"""
+        for user_id, entry, reason in victims:
+            touched = entry.last_used
+            self._write_spill(user_id, entry.session)
+            with self._lock:
+                evicted = (self._sessions.get(user_id) is entry and not entry.pins
+                           and entry.last_used == touched)
+                if evicted:
+                    del self._sessions[user_id]
+                    self._memory_bytes -= entry.size
+                    self.stats[f"evicted_{reason}"] += 1
+                    SESSION_EVICTIONS.inc(_EVICTION_LABELS[reason])
+                    self._unmark(entry)
+            if not evicted:
+                # Back in use (or removed) while it was being written; the
+                # live session is the current one, so drop the snapshot
+                # before it can be chosen for eviction again
+                self._remove_spill(user_id)
+                with self._lock:
+                    self._unmark(entry)
+
+    def _unmark(self, entry):
+        entry.spilling = False
+        self._spilling_count -= 1
+        self._spilling_bytes -= entry.size
+
+    def acquire(self, user_id, create=True):
+        """Get a user's session and pin it until release(), rehydrating or creating it as needed
+
+        Returns None when the user has no session and create is False.
+        """
+        while True:
+            with self._lock:
+                entry = self._sessions.get(user_id)
+                loading = entry is None
+                if loading:
+                    entry = self._sessions[user_id] = _Entry()
+                else:
+                    entry.pins += 1
+                    entry.last_used = time.time()
+                    self._sessions.move_to_end(user_id)
+            if not loading:
+                entry.loaded.wait()
+                if entry.session is not None:
+                    return entry.session
+                # Another request found nothing to load; try again ourselves
+                continue
+
+            session = None
+            try:
+                session = self._read_spill(user_id)
+                if session is None and create:
+                    session = self.factory()
+                    created = True
+                else:
+                    created = False
+            finally:
+                with self._lock:
+                    current = self._sessions.get(user_id) is entry
+                    if session is None and current:
+                        del self._sessions[user_id]
+                    elif session is not None:
+                        self.stats["created" if created else "rehydrated"] += 1
+                        entry.session = session
+                        entry.size = session.estimated_size()
+                        if current:
+                            self._memory_bytes += entry.size
+                entry.loaded.set()
+            if session is not None:
+                with self._lock:
+                    victims = self._victims()
+                self._evict(victims)
+            return session
+
+    def release(self, user_id):
+        """Unpin a session after a request, re-measure it and enforce the limits"""
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None or entry.session is None:
+                return
+            entry.pins -= 1
+            # Its request may have grown it
+            size = entry.session.estimated_size()
+            self._memory_bytes += size - entry.size
+            if entry.spilling:
+                self._spilling_bytes += size - entry.size
+            entry.size = size
+            entry.last_used = time.time()
+            self._sessions.move_to_end(user_id)
+            victims = self._victims()
+        self._evict(victims)
+
+    @contextmanager
+    def use(self, user_id, create=True):
+        """acquire() a session for the duration of a with block; yields None if there is none"""
+        session = self.acquire(user_id, create)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                self.release(user_id)
+
+    def remove(self, user_id):
+        """Drop a user's session, live or spilled"""
+        with self._lock:
+            entry = self._sessions.pop(user_id, None)
+            if entry is not None:
+                self._memory_bytes -= entry.size
+        self._remove_spill(user_id)
+
+    def sweep(self):
+        """Evict idle sessions and delete spilled snapshots past their TTL"""
+        with self._lock:
+            victims = self._victims()
+        self._evict(victims)
+        cutoff = time.time() - self.spill_ttl
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def start_sweeper(self, interval=SESSION_SWEEP_INTERVAL):
+        """Run sweep() periodically on a daemon thread"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print("Error sweeping sessions:", e)
+
+        threading.Thread(target=run, name="session-sweeper", daemon=True).start()
+
+    def metrics(self):
+        """Live session count, estimated memory and eviction counters"""
+        with self._lock:
+            return {
+                "live_sessions": len(self._sessions),
+                "pinned_sessions": sum(1 for entry in self._sessions.values() if entry.pins),
+                "estimated_memory_bytes": self._memory_bytes,
+                **self.stats,
+            }
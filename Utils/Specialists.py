@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+
+from .Agents import Agent
+from .Chunking import RelevanceScorer
+from .Prompts import prompt_registry, DEFAULT_LIMITS
+
+# The specialists every diagnosis fans out to, in the order their reports are
+# shown: {role: {"terms": [...], "template": ..., "fallback": ..., ...}}
+SPECIALISTS_FILE = os.environ.get(
+    "SPECIALISTS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "specialists.json")
+)
+
+
+def load_specialists(path=SPECIALISTS_FILE):
+    """Read the specialist configuration: {role: config}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class SpecialistRegistry:
+    """Specialist roles the diagnosis pipeline runs, configured rather than coded
+
+    A role's config may set its prompt "template", generation limits
+    (word_limit, num_predict, stop) and "fallback" answer; anything not set
+    comes from the built-in role in Utils/Prompts.py. "terms" are the words
+    that make a report section relevant to the role, and "enabled": false
+    keeps a role configured but out of the pipeline.
+    """
+
+    def __init__(self, specialists=None):
+        self._terms = {}
+        self._scorer = None
+        self._lock = threading.Lock()
+        for role, config in (specialists or {}).items():
+            if config.get("enabled", True):
+                self.register(role, config)
+
+    def register(self, role, config):
+        """Add or replace a specialist; raises ValueError if the role has no template"""
+        overrides = {key: config[key] for key in DEFAULT_LIMITS if key in config}
+        if "template" in config:
+            prompt_registry.register(role, config["template"], overrides, config.get("fallback"))
+        elif overrides or "fallback" in config:
+            current = prompt_registry.get(role)
+            prompt_registry.register(role, current.text, {**current.limits, **overrides},
+                                     config.get("fallback", current.fallback))
+        else:
+            prompt_registry.get(role)
+        with self._lock:
+            self._terms[role] = list(config.get("terms", []))
+            self._scorer = None
+
+    def remove(self, role):
+        with self._lock:
+            self._terms.pop(role, None)
+            self._scorer = None
+
+    def names(self):
+        return list(self._terms)
+
+    def create(self, role, medical_report):
+        """A new agent for one specialist and report"""
+        if role not in self._terms:
+            raise ValueError(f"No specialist registered as {role!r}")
+        return Agent(medical_report, role)
+
+    def scorer(self):
+        """Relevance scorer over every registered specialist's terms, rebuilt after changes"""
+        with self._lock:
+            if self._scorer is None:
+                self._scorer = RelevanceScorer(dict(self._terms))
+            return self._scorer
+
+
+specialist_registry = SpecialistRegistry(load_specialists())
@@ -0,0 +1,86 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from .Extraction import extract_text, PDF_MAX_BYTES
+
+# Largest accepted upload, enforced while the request body is read
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(PDF_MAX_BYTES)))
+# Uploads stay in memory up to this size, then move to a private temp file
+UPLOAD_SPOOL_BYTES = int(os.environ.get("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+
+
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    """Where the request parser writes an uploaded file
+
+    Hashes and counts bytes as they arrive, so the content key costs no
+    extra pass, and rejects the upload with 413 as soon as it passes
+    max_bytes instead of after it has been received in full.
+    """
+
+    def __init__(self, max_bytes=UPLOAD_MAX_BYTES, spool_bytes=UPLOAD_SPOOL_BYTES):
+        super().__init__(max_size=spool_bytes)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Upload is larger than {self.max_bytes} bytes")
+        self._digest.update(data)
+        return super().write(data)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    @property
+    def in_memory(self):
+        return not self._rolled
+
+
+class UploadRequest(Request):
+    """Flask request whose uploaded files go straight into an UploadSpool as they are parsed"""
+
+    upload_max_bytes = UPLOAD_MAX_BYTES
+    upload_spool_bytes = UPLOAD_SPOOL_BYTES
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(self.upload_max_bytes, self.upload_spool_bytes)
+
+
+class Upload:
+    """An uploaded report: its name, content hash and spooled bytes"""
+
+    def __init__(self, file):
+        self.filename = file.filename
+        self.extension = os.path.splitext(file.filename)[1].lower()
+        stream = file.stream
+        if not isinstance(stream, UploadSpool):
+            # Parsed without the upload stream factory; spool it now
+            stream = UploadSpool()
+            for block in iter(lambda: file.stream.read(1 << 16), b""):
+                stream.write(block)
+        # Take the stream from the request, which would close it once the
+        # response is sent, so a queued job can still read it
+        file.stream = io.BytesIO()
+        self._stream = stream
+        self.sha256 = stream.sha256
+        self.size = stream.size
+        self.in_memory = stream.in_memory
+
+    def read_text(self):
+        """Extract the report text, reusing the content hash as the extraction cache key
+
+        Extraction reads the spool itself, so a cached PDF is never read at all.
+        """
+        self._stream.seek(0)
+        return extract_text(self._stream, self.extension, key=self.sha256)
+
+    def close(self):
+        self._stream.close()
@@ -1,103 +1,207 @@
-from flask import Flask, render_template, request, jsonify, session
-from Utils.Agents import Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 from Utils.Chatbot import MedicalChatbot
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from PyPDF2 import PdfReader
+from Utils.Sessions import SessionStore
+from Utils.Pipeline import stream_diagnosis, astream_diagnosis, run_on_loop, diagnosis_flights
+from Utils.Specialists import specialist_registry
+from Utils.Jobs import job_queue, QueueFullError
+from Utils.Uploads import Upload, UploadRequest
+from Utils.Batch import arun_batch
+from Utils.Conditions import condition_answers
+from Utils.Metrics import registry as metrics_registry
+from Utils.Agents import generation_report
+from Utils.Backends import backend_pool
+from Utils.Admission import admission, Overloaded
+from Utils.Results import result_store
+from Utils.Cache import response_cache
+from Utils.Extraction import text_cache
+from contextlib import nullcontext
+import asyncio
+import json
 import os
+import re
+import threading
 import uuid
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = os.urandom(24)  # Secret key for session management
 
-# Dictionary to store chatbot instances
-chatbot_instances = {}
+# Bounded store of chatbot instances; idle sessions are serialized to disk
+# and rehydrated on their next request
+chatbot_instances = SessionStore(MedicalChatbot)
 
-# Ensure the upload and results directories exist
-UPLOAD_FOLDER = 'Medical Reports'
+# Gauges are read when /metrics is scraped, so they cost nothing per request
+metrics_registry.gauge('medintel_job_queue_depth', 'Analysis jobs waiting for a worker', job_queue.depth)
+metrics_registry.gauge('medintel_live_sessions', 'Chatbot sessions held in memory',
+                       lambda: chatbot_instances.metrics()['live_sessions'])
+metrics_registry.gauge('medintel_session_memory_bytes', 'Estimated size of the live chatbot sessions',
+                       lambda: chatbot_instances.metrics()['estimated_memory_bytes'])
+metrics_registry.gauge('medintel_backend_inflight', 'Model requests in flight per backend server',
+                       lambda: {(b['url'],): b['inflight'] for b in backend_pool.snapshot()}, ['backend'])
+metrics_registry.gauge('medintel_backend_healthy', 'Whether each backend server is in rotation (1) or ejected (0)',
+                       lambda: {(b['url'],): int(b['healthy']) for b in backend_pool.snapshot()}, ['backend'])
+metrics_registry.gauge('medintel_admission_inflight', 'Model calls holding an admission slot',
+                       lambda: admission.snapshot()['inflight'])
+metrics_registry.gauge('medintel_admission_queued', 'Model calls waiting for an admission slot, by priority class',
+                       lambda: {(name,): count for name, count in admission.snapshot()['queued'].items()}, ['priority'])
+metrics_registry.gauge('medintel_response_cache_lookups', 'Model response cache lookups by outcome',
+                       lambda: {(outcome,): count for outcome, count in response_cache.snapshot().items()
+                                if outcome in ('memory_hits', 'disk_hits', 'misses')}, ['outcome'])
+metrics_registry.gauge('medintel_response_cache_entries', 'Model responses held in the in-memory cache',
+                       lambda: response_cache.snapshot()['entries'])
+metrics_registry.gauge('medintel_extraction_cache_lookups', 'Extracted text cache lookups by outcome',
+                       lambda: {(outcome,): count for outcome, count in text_cache.snapshot().items()
+                                if outcome in ('hits', 'misses')}, ['outcome'])
+metrics_registry.gauge('medintel_extraction_cache_chars', 'Characters of extracted text held in the cache',
+                       lambda: text_cache.snapshot()['chars'])
+
+# LangChain and the HTTP clients are imported on first use to keep startup
+# fast; load them in the background so the first request doesn't wait.
+# /readyz reports when this has finished. APP_WARM_UP=0 skips this and the
+# condition answer warm-up, e.g. to measure import time on its own.
+WARM_UP = os.environ.get("APP_WARM_UP", "1") != "0"
+ready = threading.Event()
+
+def warm_up():
+    """Load the model client and chat dependencies ahead of the first request"""
+    try:
+        MedicalChatbot()
+        ready.set()
+    except Exception as e:
+        print("Error warming up:", e)
+
+if not WARM_UP:
+    ready.set()
+
+started = False
+
+def start_background_tasks():
+    """Start the work the running server needs in the background
+
+    Never called on import: the PDF extraction workers are spawned processes
+    that re-import the main module, and must not start any of this.
+    """
+    global started
+    if started:
+        return
+    started = True
+    chatbot_instances.start_sweeper()
+    if WARM_UP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+        # Generate the condition catalogue answers in the background so chat
+        # can serve them without a model call
+        condition_answers.start()
+
+def create_app():
+    """WSGI entry point, e.g. gunicorn 'app:create_app()'"""
+    start_background_tasks()
+    return app
+
+# Ensure the results directory exists; uploads are never written there
 RESULTS_FOLDER = 'results'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
-def get_chatbot_instance():
-    """Get or create a chatbot instance for the current session"""
-    # Check if session has an ID
+def current_user_id(create=True):
+    """The current session's chatbot ID, assigning one if needed (None if there is none and create is False)"""
     if 'user_id' not in session:
+        if not create:
+            return None
         session['user_id'] = str(uuid.uuid4())
-    
-    user_id = session['user_id']
-    
-    # Create a new chatbot instance if one doesn't exist
-    if user_id not in chatbot_instances:
-        chatbot_instances[user_id] = MedicalChatbot()
-    
-    return chatbot_instances[user_id]
+    return session['user_id']
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from PDF file"""
-    text = ""
-    try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        return text
-    except Exception as e:
-        raise Exception(f"Error reading PDF file: {str(e)}")
-
-def read_file_content(file_path):
-    """Read content from either PDF or text file"""
-    file_extension = os.path.splitext(file_path)[1].lower()
-    
-    if file_extension == '.pdf':
-        return extract_text_from_pdf(file_path)
-    elif file_extension == '.txt':
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    else:
-        raise Exception("Unsupported file format. Please upload a PDF or TXT file.")
-
-def process_medical_report(medical_report):
-    """Process the medical report through all agents and return the diagnosis"""
-    agents = {
-        "Cardiologist": Cardiologist(medical_report),
-        "Psychologist": Psychologist(medical_report),
-        "Pulmonologist": Pulmonologist(medical_report)
-    }
-    
-    # Function to run each agent and get their response
-    def get_response(agent_name, agent):
-        response = agent.run()
-        return agent_name, response
-
-    # Run the agents concurrently and collect responses
-    responses = {}
-    with ThreadPoolExecutor() as executor:
-        futures = {executor.submit(get_response, name, agent): name for name, agent in agents.items()}
+def chatbot_session(create=True):
+    """The current session's chatbot, kept in memory for the duration of a with block"""
+    user_id = current_user_id(create)
+    if user_id is None:
+        return nullcontext()
+    # Creates the chatbot if it doesn't exist yet, unless create is False
+    return chatbot_instances.use(user_id, create)
+
+def remember_diagnosis(user_id, results):
+    """Also update the chatbot's diagnosis if the user has a session"""
+    if user_id is None:
+        return
+    with chatbot_instances.use(user_id, create=False) as chatbot:
+        if chatbot is not None:
+            chatbot.current_diagnosis = results['final_diagnosis']
+            chatbot.specialist_reports = results['specialist_reports']
+
+def stream_medical_report(medical_report, report_name=None, report_sha256=None):
+    """Yield each specialist report as it completes, then stream the team synthesis"""
+    user_id = current_user_id(create=False)
+    for event in stream_diagnosis(medical_report, report_name=report_name, report_sha256=report_sha256):
+        if event["type"] == "result":
+            remember_diagnosis(user_id, event)
+        yield event
+
+def report_analysis_job(upload, user_id=None):
+    """Build the job that parses an uploaded report and runs it through the diagnosis pipeline"""
+    async def work(job):
+        loop = asyncio.get_running_loop()
+        job.stage = "extracting"
+        try:
+            # File parsing is blocking, so keep it off the pipeline loop
+            medical_report = await loop.run_in_executor(None, upload.read_text)
+        finally:
+            upload.close()
         
-        for future in as_completed(futures):
-            agent_name, response = future.result()
-            responses[agent_name] = response
-
-    # Create team analysis
-    team_agent = MultidisciplinaryTeam(
-        cardiologist_report=responses["Cardiologist"],
-        psychologist_report=responses["Psychologist"],
-        pulmonologist_report=responses["Pulmonologist"]
-    )
-    
-    # Get final diagnosis
-    final_diagnosis = team_agent.run()
-    
-    # Also update the chatbot's diagnosis if a session exists
-    if 'user_id' in session and session['user_id'] in chatbot_instances:
-        chatbot = chatbot_instances[session['user_id']]
-        chatbot.current_diagnosis = final_diagnosis
-        chatbot.specialist_reports = responses
+        results = None
+        async for event in astream_diagnosis(medical_report, stream_team=False, report_name=upload.filename,
+                                             report_sha256=upload.sha256):
+            if event["type"] == "status":
+                job.stage = event["stage"]
+            elif event["type"] == "specialist":
+                job.progress[event["role"]] = (
+                    "failed" if event.get("error") else "skipped" if event.get("skipped") else "completed"
+                )
+            elif event["type"] == "result":
+                results = {key: value for key, value in event.items() if key != "type"}
+        
+        # Looking up the uploader's session may read it back from disk
+        await loop.run_in_executor(None, remember_diagnosis, user_id, results)
+        
+        return {
+            'results': results,
+            'result_id': results['result_id']
+        }
     
-    return {
-        'specialist_reports': responses,
-        'final_diagnosis': final_diagnosis
-    }
+    return work
+
+def sse_event(event):
+    """Format a pipeline event as a Server-Sent Event"""
+    payload = {key: value for key, value in event.items() if key != "type"}
+    return f"event: {event['type']}\ndata: {json.dumps(payload)}\n\n"
+
+def sse_response(events):
+    """Stream pipeline events to the client, reporting failures as an error event"""
+    def generate():
+        try:
+            for event in events:
+                yield sse_event(event)
+        except Exception as e:
+            yield sse_event({"type": "error", "error": str(e)})
+        yield sse_event({"type": "done"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Stop proxies from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    """Reject an upload over UPLOAD_MAX_BYTES, detected while it was being received"""
+    return jsonify({'error': e.description}), 413
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """Turn a request away quickly while its priority class's model queue is full"""
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
 @app.route('/')
 def index():
@@ -106,33 +210,64 @@ def index():
 @app.route('/chat')
 def chat():
     # Create a new chatbot instance for this session if it doesn't exist
-    get_chatbot_instance()
-    return render_template('chat.html')
+    with chatbot_session():
+        return render_template('chat.html')
 
 @app.route('/api/chat', methods=['POST'])
-def chat_message():
+async def chat_message():
     data = request.json
     user_message = data.get('message', '')
     
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
     
+    admission.admit('chat')
     try:
         # Get the chatbot instance for this session
-        chatbot = get_chatbot_instance()
-        response = chatbot.get_response(user_message)
-        return jsonify({
-            'success': True,
-            'response': response
-        })
+        with chatbot_session() as chatbot:
+            response = await run_on_loop(chatbot.aget_response(user_message))
+            payload = {
+                'success': True,
+                'response': response
+            }
+            if chatbot.last_route == 'symptoms':
+                # Which specialists were consulted for this message, and which were skipped
+                payload['routing'] = chatbot.specialist_routing
+        return jsonify(payload)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/usage', methods=['GET'])
+def chat_usage():
+    """Prompt size of each follow-up turn in this session"""
+    with chatbot_session(create=False) as chatbot:
+        if chatbot is None:
+            return jsonify({'error': 'No active chat session'}), 404
+        return jsonify(chatbot.token_usage())
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_message_stream():
+    data = request.json
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    admission.admit('chat')
+    # Get the chatbot instance for this session, kept in memory until the
+    # reply has finished streaming
+    user_id = current_user_id()
+    chatbot = chatbot_instances.acquire(user_id)
+    response = sse_response(chatbot.stream_response(user_message))
+    response.call_on_close(lambda: chatbot_instances.release(user_id))
+    return response
+
 @app.route('/api/treatment', methods=['GET'])
 def get_treatment():
+    admission.admit('chat')
     try:
-        chatbot = get_chatbot_instance()
-        response = chatbot.get_treatment_recommendations()
+        with chatbot_session() as chatbot:
+            response = chatbot.get_treatment_recommendations()
         return jsonify({
             'success': True,
             'response': response
@@ -142,9 +277,10 @@ def get_treatment():
 
 @app.route('/api/doctor', methods=['GET'])
 def get_doctor_recommendation():
+    admission.admit('chat')
     try:
-        chatbot = get_chatbot_instance()
-        response = chatbot.get_doctor_recommendation()
+        with chatbot_session() as chatbot:
+            response = chatbot.get_doctor_recommendation()
         return jsonify({
             'success': True,
             'response': response
@@ -166,42 +302,170 @@ def analyze():
     if file_extension not in ['.pdf', '.txt']:
         return jsonify({'error': 'Invalid file format. Please upload a PDF or TXT file'}), 400
     
-    # Save the uploaded file
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+    admission.admit('analysis')
+    # The upload stays spooled (in memory, or a private temp file if large)
+    # until the job has parsed it
+    upload = Upload(file)
     
     try:
-        # Read the medical report
-        medical_report = read_file_content(file_path)
-        
-        # Process the report
-        results = process_medical_report(medical_report)
-        
-        # Save the final diagnosis to a file
-        diagnosis_filename = f"diagnosis_{os.path.splitext(file.filename)[0]}.txt"
-        diagnosis_path = os.path.join(RESULTS_FOLDER, diagnosis_filename)
-        with open(diagnosis_path, 'w', encoding='utf-8') as f:
-            f.write("### Final Diagnosis:\n\n" + results['final_diagnosis'])
-        
-        return jsonify({
-            'success': True,
-            'results': results,
-            'diagnosis_file': diagnosis_filename
-        })
+        job = job_queue.submit(
+            "analyze",
+            report_analysis_job(upload, current_user_id(create=False)),
+            progress={name: "pending" for name in specialist_registry.names()}
+        )
+    except QueueFullError as e:
+        upload.close()
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': url_for('get_job', job_id=job.id)
+    }), 202
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    files = [file for file in request.files.getlist('reports') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+    
+    for file in files:
+        if os.path.splitext(file.filename)[1].lower() not in ['.pdf', '.txt']:
+            return jsonify({'error': f'Invalid file format for {file.filename}. Please upload PDF or TXT files'}), 400
+    
+    admission.admit('batch')
+    # Reusing a batch_id appends to the same results file and skips the
+    # reports it already holds, which resumes an interrupted batch
+    batch_id = request.form.get('batch_id') or uuid.uuid4().hex
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', batch_id):
+        return jsonify({'error': 'Invalid batch_id'}), 400
+    output_path = os.path.join(RESULTS_FOLDER, f"batch_{batch_id}.jsonl")
+    
+    reports = [(file.filename, Upload(file)) for file in files]
+    
+    def close_uploads():
+        for _, upload in reports:
+            upload.close()
+    
+    async def work(job):
+        def on_progress(counts):
+            job.progress = counts
+        try:
+            return await arun_batch(reports, output_path, on_progress=on_progress)
+        finally:
+            close_uploads()
+    
+    try:
+        job = job_queue.submit("batch", work, progress={"total": len(reports)})
+    except QueueFullError as e:
+        close_uploads()
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'batch_id': batch_id,
+        'status_url': url_for('get_job', job_id=job.id)
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify({'success': True, **job.to_dict()})
+
+@app.route('/results', methods=['GET'])
+def list_results():
+    """Stored diagnoses, newest first: ?page=1&per_page=20, optionally &report_hash=<sha256>"""
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+    return jsonify(result_store.query(page, per_page, request.args.get('report_hash')))
+
+@app.route('/results/<result_id>', methods=['GET'])
+def get_result(result_id):
+    result = result_store.get(result_id)
+    if result is None:
+        return jsonify({'error': 'Result not found'}), 404
+    return jsonify({'success': True, **result})
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    if 'report' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    file = request.files['report']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    # Check file extension
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    if file_extension not in ['.pdf', '.txt']:
+        return jsonify({'error': 'Invalid file format. Please upload a PDF or TXT file'}), 400
     
+    admission.admit('analysis')
+    # Parse the report up front so the upload is released before streaming
+    upload = Upload(file)
+    try:
+        medical_report = upload.read_text()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        # Clean up uploaded file
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        upload.close()
+    
+    return sse_response(stream_medical_report(medical_report, file.filename, upload.sha256))
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: dependencies are loaded and requests won't pay for cold start"""
+    if not ready.is_set():
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: stage latencies, token counts, errors, queue depth and sessions"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/generation', methods=['GET'])
+def generation_metrics():
+    """Estimated tokens generated vs kept after trimming, per agent role"""
+    return jsonify(generation_report())
+
+@app.route('/metrics/coalescing', methods=['GET'])
+def coalescing_metrics():
+    """Identical diagnoses that joined one already running, and the model calls that saved"""
+    return jsonify({**diagnosis_flights.stats, 'in_flight': diagnosis_flights.in_flight()})
+
+@app.route('/metrics/backends', methods=['GET'])
+def backend_metrics():
+    """Model backend servers: load, health and ejections"""
+    return jsonify(backend_pool.snapshot())
+
+@app.route('/metrics/admission', methods=['GET'])
+def admission_metrics():
+    """Model call slots in use, queued calls per priority class, and requests rejected"""
+    return jsonify(admission.snapshot())
+
+@app.route('/metrics/sessions', methods=['GET'])
+def session_metrics():
+    """Live chatbot sessions and eviction counters"""
+    return jsonify(chatbot_instances.metrics())
 
 @app.route('/clear_session', methods=['GET'])
 def clear_session():
     """Clear the current session data and associated chatbot"""
-    if 'user_id' in session and session['user_id'] in chatbot_instances:
+    if 'user_id' in session:
         # Remove the chatbot instance
-        del chatbot_instances[session['user_id']]
+        chatbot_instances.remove(session['user_id'])
     
     # Clear the session
     session.clear()
@@ -209,4 +473,7 @@ def clear_session():
     return jsonify({'success': True, 'message': 'Session cleared'})
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    # The debug reloader runs this file twice; only the serving process starts them
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+    app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+Offline pipeline benchmark
+
+Starts the stand-in Ollama server from fake_ollama.py, points the app's model
+client at it, and measures the main entry points under increasing
+concurrency:
+
+  agent_run         Cardiologist(report).run()
+  diagnosis         run_diagnosis(report), the analysis behind /analyze
+  long_diagnosis    run_diagnosis on a multi-visit record long enough to be
+                    analysed section by section
+  process_symptoms  MedicalChatbot.process_symptoms(symptoms)
+  get_response      MedicalChatbot.get_response(follow-up question)
+
+Each scenario reports p50/p95/p99 latency, throughput and the prompt tokens
+the model server evaluated per request. Results are written
+as JSON, and --compare prints the change against an earlier run.
+
+Usage: python benchmarks/bench_pipeline.py [--concurrency 1 4 16] [--requests 32]
+                                           [--tokens 50] [--token-latency-ms 20]
+                                           [--compare results/benchmarks/<earlier>.json]
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_ollama import start_server
+
+SCENARIOS = ["agent_run", "diagnosis", "long_diagnosis", "process_symptoms", "get_response"]
+
+REPORT = """Patient: 45-year-old with episodes of chest tightness, shortness of breath and a
+racing heart, often at night. Reports worry about work and poor sleep for three weeks. (case {n})"""
+
+# One visit of a long record; most visits concern only one specialty
+VISIT_SECTIONS = [
+    "Follow-up for hypertension. Blood pressure 150/95, pulse 88. ECG shows sinus rhythm. "
+    "Reports intermittent chest tightness on exertion; started on a statin for raised cholesterol.",
+    "Routine dermatology review of eczema on both forearms. Emollients continued, no infection. "
+    "Skin otherwise clear; topical steroid reduced to twice weekly.",
+    "Presents with cough and wheezing for two weeks, worse at night. Oxygen saturation 95%. "
+    "Spirometry suggests mild asthma; inhaler prescribed.",
+    "Orthopaedic review of right knee after a fall. Swelling reduced, full range of movement. "
+    "Physiotherapy exercises reviewed; x-ray showed no fracture.",
+    "Reports low mood, poor sleep and worry about work for a month. Appetite reduced. "
+    "Referred for counselling; no thoughts of self-harm.",
+    "Annual eye examination. Visual acuity 6/6 both eyes, intraocular pressure normal. "
+    "New reading glasses prescribed; review in two years.",
+]
+
+
+def long_report(n, visits=36):
+    """A multi-visit record of several thousand tokens"""
+    return "\n\n".join(
+        f"VISIT {index + 1} (case {n})\n{VISIT_SECTIONS[index % len(VISIT_SECTIONS)]}\n"
+        "Medications reviewed and unchanged. Next appointment booked in three months."
+        for index in range(visits)
+    )
+
+
+SYMPTOMS = "I have had chest pain and trouble breathing for {n} days"
+
+FOLLOW_UP = "Can you tell me more about that? (question {n})"
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def build_scenario(name):
+    """Return (setup(n), call(state)) for a scenario; inputs differ per request to avoid cache hits"""
+    from Utils.Agents import Cardiologist
+    from Utils.Chatbot import MedicalChatbot
+    from Utils.Pipeline import run_diagnosis
+
+    if name == "agent_run":
+        return (lambda n: REPORT.format(n=n)), (lambda report: Cardiologist(report).run())
+    if name == "diagnosis":
+        def diagnose(report):
+            result = run_diagnosis(report)
+            if result["failed_specialists"]:
+                raise RuntimeError(f"failed: {result['failed_specialists']}")
+            return result
+        return (lambda n: REPORT.format(n=n)), diagnose
+    if name == "long_diagnosis":
+        return long_report, (lambda report: run_diagnosis(report))
+    if name == "process_symptoms":
+        return (lambda n: (MedicalChatbot(), SYMPTOMS.format(n=n))), \
+            (lambda state: state[0].process_symptoms(state[1]))
+    if name == "get_response":
+        return (lambda n: (MedicalChatbot(), FOLLOW_UP.format(n=n))), \
+            (lambda state: state[0].get_response(state[1]))
+    raise ValueError(f"Unknown scenario {name!r}")
+
+
+def run_scenario(name, concurrency, requests, offset):
+    """Time requests calls of a scenario with concurrency in flight at once"""
+    from Utils.Metrics import PROMPT_TOKENS
+
+    setup, call = build_scenario(name)
+    states = [setup(offset + n) for n in range(requests)]
+    prompt_tokens_before = sum(PROMPT_TOKENS.values().values())
+    latencies = []
+    errors = 0
+
+    def timed(state):
+        started = time.perf_counter()
+        try:
+            call(state)
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, e
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, error in pool.map(timed, states):
+            if error is None:
+                latencies.append(latency)
+            else:
+                errors += 1
+    elapsed = time.perf_counter() - started
+    prompt_tokens = sum(PROMPT_TOKENS.values().values()) - prompt_tokens_before
+
+    latencies.sort()
+
+    def to_ms(seconds):
+        return round(seconds * 1000, 2) if seconds is not None else None
+
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": to_ms(percentile(latencies, 0.50)),
+        "p95_ms": to_ms(percentile(latencies, 0.95)),
+        "p99_ms": to_ms(percentile(latencies, 0.99)),
+        "mean_ms": to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else None,
+        "elapsed_s": round(elapsed, 3),
+        "prompt_tokens_per_request": round(prompt_tokens / requests, 1) if requests else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print p50/p95 and throughput changes against an earlier results file"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    def change(new, old):
+        if new is None or not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        print(f"  {result['scenario']:<17} c={result['concurrency']:<3} "
+              f"p50 {change(result['p50_ms'], old['p50_ms']):>8}  "
+              f"p95 {change(result['p95_ms'], old['p95_ms']):>8}  "
+              f"throughput {change(result['throughput_rps'], old['throughput_rps']):>8}  "
+              f"prompt tokens {change(result.get('prompt_tokens_per_request'), old.get('prompt_tokens_per_request')):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario and concurrency level")
+    parser.add_argument("--tokens", type=int, default=50, help="tokens in each fake model response")
+    parser.add_argument("--token-latency-ms", type=float, default=20)
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    parser.add_argument("--with-cache", action="store_true",
+                        help="keep the response cache and stored-diagnosis reuse on; by default every request reaches the model")
+    parser.add_argument("--output", help="results file (default: results/benchmarks/pipeline_<time>.json)")
+    parser.add_argument("--compare", metavar="RESULTS", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    server = start_server(tokens=args.tokens, token_latency=args.token_latency_ms / 1000,
+                          first_token_latency=args.first_token_ms / 1000)
+    # Must be set before Utils is imported: the client reads it at import time
+    os.environ["OLLAMA_BASE_URL"] = server.base_url
+    if not args.with_cache:
+        # The fake server answers every prompt alike, so later stages would
+        # otherwise be served from the cache
+        os.environ["LLM_CACHE_SIZE"] = "0"
+        os.environ["LLM_CACHE_DIR"] = ""
+        # Likewise, earlier runs' stored diagnoses must not be replayed
+        os.environ["RESULTS_REUSE"] = "0"
+    os.environ["RESULTS_DB"] = os.path.join(tempfile.mkdtemp(prefix="bench-results-"), "results.db")
+
+    from Utils.Pipeline import MAX_CONCURRENCY
+    from Utils.LLMClient import MAX_CONNECTIONS
+    from Utils.Agents import generation_report
+    from Utils.Chunking import CHUNK_THRESHOLD_TOKENS
+
+    results = []
+    offset = 0
+    for name in args.scenarios:
+        # One untimed call loads dependencies and opens connections
+        run_scenario(name, 1, 1, offset=-1)
+        for concurrency in args.concurrency:
+            result = run_scenario(name, concurrency, args.requests, offset)
+            offset += args.requests
+            results.append(result)
+            print(f"{name:<17} c={concurrency:<3} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                  f"p99={result['p99_ms']}ms throughput={result['throughput_rps']}/s "
+                  f"prompt_tokens={result['prompt_tokens_per_request']}/req errors={result['errors']}")
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "fake_server": {
+            "tokens": args.tokens,
+            "token_latency_ms": args.token_latency_ms,
+            "first_token_ms": args.first_token_ms,
+            "requests_served": server.requests_served,
+        },
+        "settings": {
+            "PIPELINE_MAX_CONCURRENCY": MAX_CONCURRENCY,
+            "LLM_MAX_CONNECTIONS": MAX_CONNECTIONS,
+            "PIPELINE_CHUNK_THRESHOLD": CHUNK_THRESHOLD_TOKENS,
+            "response_cache": args.with_cache,
+        },
+        "results": results,
+        "generation": generation_report(),
+    }
+
+    output = args.output or os.path.join(
+        "results", "benchmarks", f"pipeline_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("\nTokens generated vs kept after trimming:")
+    for role, usage in report["generation"].items():
+        print(f"  {role:<22} generated={usage['generated_tokens']:<8} kept={usage['kept_tokens']:<8} "
+              f"ratio={usage['kept_ratio']}")
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
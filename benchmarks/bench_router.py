@@ -0,0 +1,104 @@
+"""
+Microbenchmark for the chatbot's intent router
+
+Times classification of a fixed set of chat messages as the condition and
+keyword tables grow, next to the per-term substring scan the router replaced.
+
+Usage: python benchmarks/bench_router.py [--sizes 0 100 1000 5000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Utils.Router import (IntentRouter, CONDITION_TERMS, QUESTION_PATTERNS,
+                          REFERENCE_PATTERNS, INTENT_KEYWORDS)
+
+MESSAGES = [
+    "What are the symptoms of flu?",
+    "I have had a sharp pain in my chest for three days",
+    "Should I see a doctor about this?",
+    "What treatment options are there?",
+    "Thanks, that was helpful",
+    "Tell me about migraine treatment and whether I need a specialist appointment",
+]
+
+
+def synthetic_tables(size):
+    """The stock tables plus size made-up conditions and size keywords per intent"""
+    conditions = dict(CONDITION_TERMS)
+    for n in range(size):
+        conditions[f"condition{n}"] = [f"syndrome{n}", f"disorder {n}x"]
+    keywords = {intent: terms + [f"{intent}word{n}" for n in range(size)]
+                for intent, terms in INTENT_KEYWORDS.items()}
+    return conditions, keywords
+
+
+def legacy_classify(text, conditions, keywords):
+    """The old per-message scan: build every phrase and substring-search for it"""
+    text_lower = text.lower()
+    condition = None
+    for patterns in (QUESTION_PATTERNS, REFERENCE_PATTERNS):
+        for name, terms in conditions.items():
+            for term in terms:
+                if any(pattern.format(term=term) in text_lower for pattern in patterns):
+                    condition = name
+                    break
+            if condition:
+                break
+        if condition:
+            break
+    intents = {intent for intent, terms in keywords.items()
+               if any(term in text.lower() for term in terms)}
+    return condition, intents
+
+
+def time_per_message(classify, min_seconds=0.2):
+    """Mean seconds per message, repeating the message set for at least min_seconds"""
+    rounds = 0
+    started = time.perf_counter()
+    while True:
+        for message in MESSAGES:
+            classify(message)
+        rounds += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / (rounds * len(MESSAGES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 100, 1000, 5000],
+                        help="extra conditions and keywords per intent to add")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        conditions, keywords = synthetic_tables(size)
+        # The automaton is built when the router is created
+        started = time.perf_counter()
+        router = IntentRouter(conditions=conditions, keywords=keywords)
+        build_seconds = time.perf_counter() - started
+
+        for message in MESSAGES:
+            assert router.classify(message) == legacy_classify(message, conditions, keywords)
+
+        results.append({
+            "extra_terms": size,
+            "phrases": sum(len(terms) for terms in conditions.values())
+                       * (len(QUESTION_PATTERNS) + len(REFERENCE_PATTERNS))
+                       + sum(len(terms) for terms in keywords.values()),
+            "build_ms": round(build_seconds * 1000, 2),
+            "router_us_per_message": round(time_per_message(router.classify) * 1e6, 2),
+            "legacy_us_per_message": round(time_per_message(
+                lambda message: legacy_classify(message, conditions, keywords)) * 1e6, 2),
+        })
+        print(json.dumps(results[-1]))
+
+
+if __name__ == "__main__":
+    main()
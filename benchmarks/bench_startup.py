@@ -0,0 +1,88 @@
+"""
+Startup-time benchmark
+
+Imports a module in fresh interpreters under `python -X importtime` and
+reports the median total import time, the time spent in each project module,
+and which heavy dependencies were loaded eagerly. With --budget-ms, exits
+non-zero when the median exceeds the budget, so cold-start regressions can
+fail a CI job.
+
+Usage: python benchmarks/bench_startup.py [--module app] [--runs 5] [--budget-ms 500]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Dependencies that should only load on first use, never at import
+DEFERRED = ["langchain", "langchain_core", "langchain_community", "PyPDF2", "aiohttp", "requests"]
+
+
+def import_profile(module):
+    """Import module in a fresh interpreter: ({module: (self_us, cumulative_us)}, eager deps)"""
+    probe = f"import sys, {module}; print(','.join(m for m in {DEFERRED!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        # Background warm-up threads would import dependencies mid-measurement
+        env={**os.environ, "APP_WARM_UP": "0"}
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    eager = [name for name in result.stdout.strip().split(",") if name]
+    return timings, eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app", help="module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to sample")
+    parser.add_argument("--top", type=int, default=10, help="slowest third-party imports to list")
+    parser.add_argument("--budget-ms", type=float, help="fail if the median import time exceeds this")
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    totals = [timings[args.module][1] / 1000 for timings, _ in profiles]
+    timings, eager = profiles[-1]
+
+    def median_ms(name, field):
+        return round(statistics.median(p[0][name][field] for p in profiles if name in p[0]) / 1000, 2)
+
+    # Self time for our own modules; cumulative time for top-level packages
+    project = {name: median_ms(name, 0) for name in timings
+               if name == args.module or name.split(".")[0] in ("Utils", "Main")}
+    packages = sorted(
+        ((name, median_ms(name, 1)) for name in timings if "." not in name and name not in project),
+        key=lambda item: item[1], reverse=True
+    )[:args.top]
+
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "median_ms": round(statistics.median(totals), 2),
+        "min_ms": round(min(totals), 2),
+        "max_ms": round(max(totals), 2),
+        "project_modules_self_ms": project,
+        "slowest_packages_ms": dict(packages),
+        "eagerly_loaded_deferred_deps": eager,
+    }
+    if args.budget_ms is not None:
+        report["budget_ms"] = args.budget_ms
+        report["within_budget"] = report["median_ms"] <= args.budget_ms
+    print(json.dumps(report, indent=2))
+
+    if args.budget_ms is not None and not report["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
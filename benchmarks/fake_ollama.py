@@ -0,0 +1,132 @@
+"""
+Stand-in Ollama server for offline benchmarks
+
+Answers /api/generate (streamed or not) with a fixed number of tokens, or
+fewer if the request's num_predict option asks for fewer, waiting a
+configurable time before the first token and between tokens, so the
+pipeline can be measured without a GPU or a real model. Setting a server's
+failing attribute makes it answer 500 to everything, health checks included.
+
+Usage: python benchmarks/fake_ollama.py [--port 11435] [--tokens 50] [--token-latency-ms 20]
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tokens=50, token_latency=0.02, first_token_latency=0.0):
+        super().__init__(address, FakeOllamaHandler)
+        self.tokens = tokens
+        self.token_latency = token_latency
+        self.first_token_latency = first_token_latency
+        self.requests_served = 0
+        # Generation options (num_predict, stop, ...) of the latest request
+        self.last_options = None
+        self.failing = False
+        self._count_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real server, so connection pooling is exercised
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path != "/api/tags":
+            self.send_error(404)
+            return
+        if self.server.failing:
+            self.send_error(500)
+            return
+        body = json.dumps({"models": [{"name": "medllama2:latest"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        with server._count_lock:
+            server.requests_served += 1
+            server.last_options = payload.get("options")
+
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        if server.failing:
+            self.send_error(500)
+            return
+
+        limit = (payload.get("options") or {}).get("num_predict") or server.tokens
+        words = [f"word{n}" for n in range(min(server.tokens, limit))]
+        time.sleep(server.first_token_latency)
+
+        if payload.get("stream", True) is False:
+            time.sleep(server.token_latency * len(words))
+            body = json.dumps({"model": payload.get("model"), "response": " ".join(words), "done": True}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(server.token_latency)
+            line = {"model": payload.get("model"), "response": word + " ", "done": False}
+            self._send_chunk(json.dumps(line).encode() + b"\n")
+        final = {"model": payload.get("model"), "response": "", "done": True,
+                 "prompt_eval_count": len(payload.get("prompt", "")) // 4, "eval_count": len(words)}
+        self._send_chunk(json.dumps(final).encode() + b"\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_server(port=0, tokens=50, token_latency=0.02, first_token_latency=0.0, host="127.0.0.1"):
+    """Start a fake server on a background thread; port 0 picks a free port"""
+    server = FakeOllamaServer((host, port), tokens, token_latency, first_token_latency)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens", type=int, default=50, help="tokens in every response")
+    parser.add_argument("--token-latency-ms", type=float, default=20, help="delay between tokens")
+    parser.add_argument("--first-token-ms", type=float, default=0, help="delay before the first token")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer((args.host, args.port), args.tokens,
+                              args.token_latency_ms / 1000, args.first_token_ms / 1000)
+    print(f"Fake Ollama listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Test script for admission control of model calls (no model server needed)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Admission import AdmissionController, Overloaded, request_priority
+
+
+def test_priority_order():
+    """Freed slots go to chat calls before analyses, and analyses before batches"""
+    controller = AdmissionController(max_inflight=1, max_queued=10)
+    held = controller.acquire()
+    order = []
+
+    def call(priority):
+        request_priority.set(priority)
+        acquired = controller.acquire()
+        order.append(priority)
+        controller.release(acquired)
+
+    threads = []
+    for priority in ("batch", "analysis", "batch", "chat"):
+        thread = threading.Thread(target=call, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+    print("Queued:", controller.snapshot()["queued"])
+    controller.release(held)
+    for thread in threads:
+        thread.join()
+
+    print("Served in order:", order)
+    assert order == ["chat", "analysis", "batch", "batch"]
+    assert controller.snapshot()["inflight"] == 0
+
+
+def test_rejection_and_cancellation():
+    """A full queue rejects new requests with a retry hint; a cancelled wait frees its place"""
+    controller = AdmissionController(max_inflight=1, max_queued=1)
+
+    async def run():
+        held = await controller.aacquire()
+        request_priority.set("batch")
+        waiting = asyncio.ensure_future(controller.aacquire())
+        await asyncio.sleep(0.01)
+
+        try:
+            controller.admit("batch")
+            raise AssertionError("admit should reject while the queue ahead is full")
+        except Overloaded as e:
+            print("Rejected:", e)
+            assert e.retry_after >= 1
+
+        # Higher classes only queue behind calls of their own rank or better
+        controller.admit("chat")
+        controller.admit("analysis")
+
+        waiting.cancel()
+        await asyncio.sleep(0.01)
+        assert controller.snapshot()["queued"]["batch"] == 0
+        controller.admit("batch")
+        controller.release(held)
+
+    asyncio.run(run())
+    snapshot = controller.snapshot()
+    print("Admission stats:", snapshot["classes"])
+    assert snapshot["inflight"] == 0
+    assert snapshot["classes"]["batch"] == {"admitted": 1, "rejected": 1, "queued": 1}
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_rejection_and_cancellation()
+    print("All admission tests passed")
@@ -0,0 +1,184 @@
+"""
+Test script for the Flask app (no model server needed)
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Chatbot import MedicalChatbot
+
+
+def test_import_starts_nothing():
+    """Importing app, as each spawned PDF extraction worker does, starts no background work"""
+    script = ("import threading, app; "
+              "print(sorted(t.name for t in threading.enumerate()), app.condition_answers._started)")
+    output = subprocess.run([sys.executable, "-c", script], cwd=project_root, capture_output=True,
+                            text=True, check=True, timeout=120).stdout.strip()
+    print("After import:", output)
+    assert output == "['MainThread'] False"
+
+
+def test_cache_counters_exported():
+    """Response and extraction cache hits and misses are on /metrics"""
+    import app
+    from Utils.Extraction import text_cache
+
+    text_cache.get("not cached")
+    exposition = app.app.test_client().get('/metrics').get_data(as_text=True)
+    for sample in ('medintel_response_cache_lookups{outcome="memory_hits"}',
+                   'medintel_response_cache_lookups{outcome="misses"}',
+                   'medintel_response_cache_entries',
+                   'medintel_extraction_cache_lookups{outcome="hits"}',
+                   'medintel_extraction_cache_chars'):
+        assert f"\n{sample} " in exposition, sample
+    misses = text_cache.snapshot()["misses"]
+    assert f'\nmedintel_extraction_cache_lookups{{outcome="misses"}} {misses}\n' in exposition
+
+
+def parse_events(body):
+    """Split an event stream into (event, data) pairs, checking each is framed as one SSE message"""
+    assert body.endswith("\n\n"), body
+    events = []
+    for message in body[:-2].split("\n\n"):
+        event_line, data_line = message.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: "), message
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+def stub_chat_stream(*chunks, error=None, closed=None):
+    """Replace the chatbot's streamed reply; returns the original to restore"""
+    async def astream_response(self, user_input):
+        try:
+            for chunk in chunks:
+                yield {"type": "token", "text": chunk}
+                await asyncio.sleep(0)
+            if error is not None:
+                raise error
+        finally:
+            if closed is not None:
+                closed.append(user_input)
+
+    original = MedicalChatbot.astream_response
+    MedicalChatbot.astream_response = astream_response
+    return original
+
+
+def test_chat_stream_events():
+    """Each reply chunk is a token event, and the stream always ends with done"""
+    import app
+
+    original = stub_chat_stream("Rest ", "and fluids.")
+    try:
+        response = app.app.test_client().post('/api/chat/stream', json={'message': 'I have a cold'})
+        body = response.get_data(as_text=True)
+        # As the server does once the body is sent
+        response.close()
+    finally:
+        MedicalChatbot.astream_response = original
+
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache' and response.headers['X-Accel-Buffering'] == 'no'
+    assert parse_events(body) == [("token", {"text": "Rest "}), ("token", {"text": "and fluids."}), ("done", {})]
+    assert app.chatbot_instances.metrics()["pinned_sessions"] == 0
+
+    response = app.app.test_client().post('/api/chat/stream', json={})
+    assert response.status_code == 400
+
+
+def test_chat_stream_error_event():
+    """A reply that fails midway ends with an error event, then done"""
+    import app
+
+    original = stub_chat_stream("Rest ", error=ConnectionError("model server unavailable"))
+    try:
+        response = app.app.test_client().post('/api/chat/stream', json={'message': 'I have a cold'})
+        body = response.get_data(as_text=True)
+        response.close()
+    finally:
+        MedicalChatbot.astream_response = original
+
+    print("Failed stream:", body)
+    assert parse_events(body) == [
+        ("token", {"text": "Rest "}), ("error", {"error": "model server unavailable"}), ("done", {})
+    ]
+    assert app.chatbot_instances.metrics()["pinned_sessions"] == 0
+
+
+def test_chat_stream_client_disconnect():
+    """A client that goes away stops the reply's generation and unpins its session"""
+    import app
+
+    closed = []
+    original = stub_chat_stream(*(f"word{i} " for i in range(1000)), closed=closed)
+    try:
+        response = app.app.test_client().post(
+            '/api/chat/stream', json={'message': 'I have a cold'}, buffered=False
+        )
+        first = next(response.response)
+        assert app.chatbot_instances.metrics()["pinned_sessions"] == 1
+        response.close()
+    finally:
+        MedicalChatbot.astream_response = original
+
+    assert parse_events(first.decode() if isinstance(first, bytes) else first) == [("token", {"text": "word0 "})]
+    assert closed == ['I have a cold']
+    assert app.chatbot_instances.metrics()["pinned_sessions"] == 0
+
+
+def test_analyze_stream_events():
+    """Pipeline events are streamed in order; a pipeline failure ends with an error event"""
+    import app
+
+    reports = []
+
+    def fake_diagnosis(medical_report, report_name=None, report_sha256=None):
+        reports.append((medical_report, report_name, report_sha256))
+        yield {"type": "specialist", "role": "Cardiologist", "report": "Heart looks fine."}
+        yield {"type": "token", "text": "Likely a cold."}
+        raise TimeoutError("team stage timed out after 120s")
+
+    original = app.stream_diagnosis
+    app.stream_diagnosis = fake_diagnosis
+    try:
+        response = app.app.test_client().post(
+            '/analyze/stream', data={'report': (io.BytesIO(b"Cough since Monday."), 'report.txt')}
+        )
+        body = response.get_data(as_text=True)
+        response.close()
+    finally:
+        app.stream_diagnosis = original
+
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    # The upload's hash, taken as it arrived, keys the diagnosis
+    assert reports == [("Cough since Monday.", "report.txt", hashlib.sha256(b"Cough since Monday.").hexdigest())]
+    assert parse_events(body) == [
+        ("specialist", {"role": "Cardiologist", "report": "Heart looks fine."}),
+        ("token", {"text": "Likely a cold."}),
+        ("error", {"error": "team stage timed out after 120s"}),
+        ("done", {}),
+    ]
+
+    response = app.app.test_client().post(
+        '/analyze/stream', data={'report': (io.BytesIO(b"notes"), 'report.docx')}
+    )
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    test_import_starts_nothing()
+    test_cache_counters_exported()
+    test_chat_stream_events()
+    test_chat_stream_error_event()
+    test_chat_stream_client_disconnect()
+    test_analyze_stream_events()
+    print("All app tests passed")
@@ -0,0 +1,171 @@
+"""
+Test script for the model backend pool, against local fake Ollama servers
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from benchmarks.fake_ollama import start_server
+from Utils import Ollama
+from Utils.Backends import BackendPool, NoBackendAvailable
+from Utils.LLMClient import MAX_CONNECTIONS, close_async_session, get_session
+from Utils.Ollama import PooledOllama
+
+
+def make_client(pool, servers):
+    """A client whose calls go through the given pool"""
+    Ollama.backend_pool = pool
+    return PooledOllama(model="medllama2", base_url=servers[0].base_url)
+
+
+def run_async(calls):
+    """Await the calls on a fresh loop, closing its HTTP session afterwards"""
+    async def run():
+        try:
+            return await asyncio.gather(*calls())
+        finally:
+            await close_async_session(asyncio.get_running_loop())
+
+    return asyncio.run(run())
+
+
+def test_weighted_routing_and_inflight_limit():
+    """Slots are handed out in proportion to weight and capped per backend"""
+    pool = BackendPool([("http://a", 3), ("http://b", 1)], max_inflight=6, health_interval=0)
+    claimed = [pool.acquire().url for _ in range(8)]
+    print("Weighted picks:", {url: claimed.count(url) for url in ("http://a", "http://b")})
+    assert claimed.count("http://a") == 6 and claimed.count("http://b") == 2
+
+    full = BackendPool([("http://a", 1)], max_inflight=1, health_interval=0)
+    backend = full.acquire()
+    try:
+        full.acquire(timeout=0.1)
+        raise AssertionError("acquire should time out when every slot is taken")
+    except NoBackendAvailable:
+        pass
+    full.release(backend)
+    assert full.acquire(timeout=0.1) is backend
+
+
+def test_release_wakes_every_waiter():
+    """A freed slot reaches a waiter that can use it, even when another waiter excluded it"""
+    pool = BackendPool([("http://a", 1), ("http://b", 1)], max_inflight=1, health_interval=0)
+    a, b = pool.acquire(), pool.acquire()
+    claimed = {}
+
+    def wait_for_slot(name, exclude):
+        try:
+            claimed[name] = pool.acquire(exclude=exclude, timeout=1).url
+        except NoBackendAvailable:
+            claimed[name] = None
+
+    # The first waiter (woken first) won't take a, the second will
+    waiters = [threading.Thread(target=wait_for_slot, args=("retry", ("http://a",))),
+               threading.Thread(target=wait_for_slot, args=("fresh", ()))]
+    for waiter in waiters:
+        waiter.start()
+        time.sleep(0.05)
+    pool.release(a)
+    waiters[1].join()
+    print("After releasing a:", claimed)
+    assert claimed["fresh"] == "http://a"
+    pool.release(b)
+    waiters[0].join()
+    assert claimed["retry"] == "http://b"
+
+
+def test_least_outstanding_spread():
+    """The fastest server frees its slots soonest and so serves the most calls"""
+    servers = [start_server(tokens=10, token_latency=latency) for latency in (0.002, 0.01, 0.04)]
+    pool = BackendPool([(server.base_url, 1) for server in servers], max_inflight=2, health_interval=0)
+    original = Ollama.backend_pool
+    try:
+        client = make_client(pool, servers)
+        run_async(lambda: [client.ainvoke(f"prompt {i}") for i in range(30)])
+        assert client.invoke("sync prompt").strip()
+    finally:
+        Ollama.backend_pool = original
+        for server in servers:
+            server.shutdown()
+
+    served = [server.requests_served for server in servers]
+    print("Requests per server (fast to slow):", served)
+    assert sum(served) == 31
+    assert served[0] > served[2]
+    assert all(backend["inflight"] == 0 for backend in pool.snapshot())
+
+
+def test_ejection_and_readmission():
+    """A failing server is ejected, its calls retried elsewhere, and it returns once healthy"""
+    servers = [start_server(tokens=5, token_latency=0.001) for _ in range(2)]
+    pool = BackendPool([(server.base_url, 1) for server in servers], eject_after=2,
+                       eject_seconds=60, health_interval=0)
+    original = Ollama.backend_pool
+    try:
+        client = make_client(pool, servers)
+        servers[0].failing = True
+        for i in range(6):
+            assert client.invoke(f"prompt {i}").strip()
+
+        broken = pool.snapshot()[0]
+        print("Failing server:", broken)
+        assert not broken["healthy"] and broken["ejections"] == 1
+        pool.check_health()
+        assert not pool.snapshot()[0]["healthy"]
+
+        servers[0].failing = False
+        pool.check_health()
+        assert pool.snapshot()[0]["healthy"]
+
+        # Active checks eject a server before any call to it fails
+        servers[1].failing = True
+        pool.check_health()
+        assert not pool.snapshot()[1]["healthy"]
+        assert run_async(lambda: [client.ainvoke("after failover")])[0].strip()
+        assert pool.snapshot()[1]["failures"] == 1
+
+        # A server that refuses connections is skipped for the call in hand
+        dead = BackendPool([("http://127.0.0.1:9", 1), (servers[0].base_url, 1)], health_interval=0)
+        client = make_client(dead, servers)
+        assert client.invoke("dead server first").strip()
+        assert run_async(lambda: [client.ainvoke("dead server first")])[0].strip()
+        print("Dead server:", dead.snapshot()[0])
+        assert dead.snapshot()[0]["failures"] == 2
+    finally:
+        Ollama.backend_pool = original
+        for server in servers:
+            server.shutdown()
+
+
+def test_health_probe_while_busy():
+    """Probes still run while streaming generations hold every pooled connection to a server"""
+    server = start_server(tokens=100, token_latency=0.1)
+    pool = BackendPool([(server.base_url, 1)], health_interval=0)
+    session = get_session(server.base_url)
+    streams = [session.post(f"{server.base_url}/api/generate", json={"prompt": "long answer"}, stream=True)
+               for _ in range(MAX_CONNECTIONS)]
+    try:
+        probe = threading.Thread(target=pool.check_health, daemon=True)
+        probe.start()
+        probe.join(5)
+        assert not probe.is_alive(), "health probe blocked on the model traffic's connections"
+        assert pool.snapshot()[0]["healthy"]
+    finally:
+        for stream in streams:
+            stream.close()
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_weighted_routing_and_inflight_limit()
+    test_release_wakes_every_waiter()
+    test_least_outstanding_spread()
+    test_ejection_and_readmission()
+    test_health_probe_while_busy()
+    print("All backend tests passed")
@@ -0,0 +1,88 @@
+"""
+Test script for resuming a batch analysis from its results file (no model server needed)
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils import Batch
+
+
+def write_report(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def read_records(path):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # The line a crash cut off
+                continue
+    return records
+
+
+def test_resume_skips_completed_reports():
+    """Reports completed with the same content are skipped; failed, edited and unfinished ones rerun"""
+    analysed = []
+
+    async def fake_diagnosis(medical_report, report_name=None, report_sha256=None):
+        analysed.append(report_name)
+        return {"final_diagnosis": f"Diagnosis of {report_name}", "failed_specialists": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {name: write_report(directory, name, f"{name}: chest pain and cough")
+                 for name in ("a.txt", "b.txt", "c.txt", "d.txt")}
+        output_path = os.path.join(directory, "results", "batch.jsonl")
+        os.makedirs(os.path.dirname(output_path))
+        with open(output_path, "w", encoding="utf-8") as f:
+            # a finished, b failed, c finished before it was edited, d was cut off mid-write
+            f.write(json.dumps({"report_id": "a.txt", "sha256": Batch.file_sha256(paths["a.txt"]),
+                                "status": "completed"}) + "\n")
+            f.write(json.dumps({"report_id": "b.txt", "sha256": Batch.file_sha256(paths["b.txt"]),
+                                "status": "failed", "error": "timed out"}) + "\n")
+            f.write(json.dumps({"report_id": "c.txt", "sha256": "0" * 64, "status": "completed"}) + "\n")
+            f.write('{"report_id": "d.txt", "sha256": "')
+
+        original = Batch.arun_diagnosis
+        Batch.arun_diagnosis = fake_diagnosis
+        try:
+            summary = Batch.run_batch([(os.path.basename(path), path) for path in paths.values()], output_path)
+        finally:
+            Batch.arun_diagnosis = original
+
+        print("Resumed batch:", summary)
+        assert sorted(analysed) == ["b.txt", "c.txt", "d.txt"]
+        assert summary["skipped"] == 1 and summary["completed"] == 3 and summary["failed"] == 0
+
+        # The new records are appended, so the file now marks every report completed
+        assert Batch.completed_reports(output_path) == {
+            (name, Batch.file_sha256(path)) for name, path in paths.items()
+        } | {("c.txt", "0" * 64)}
+        appended = [record for record in read_records(output_path) if "final_diagnosis" in record]
+        assert [record["report_id"] for record in sorted(appended, key=lambda r: r["report_id"])] == \
+            ["b.txt", "c.txt", "d.txt"]
+
+        # Running it again finds nothing left to do
+        Batch.arun_diagnosis = fake_diagnosis
+        try:
+            summary = Batch.run_batch([(os.path.basename(path), path) for path in paths.values()], output_path)
+        finally:
+            Batch.arun_diagnosis = original
+        assert summary["skipped"] == 4 and len(analysed) == 3
+
+
+if __name__ == "__main__":
+    test_resume_skips_completed_reports()
+    print("All batch tests passed")
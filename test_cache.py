@@ -0,0 +1,57 @@
+"""
+Test script for the LLM response cache (no model server needed)
+"""
+
+import os
+import sys
+import tempfile
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Cache import ResponseCache
+
+
+def test_memory_tier():
+    """Hits, misses and LRU eviction in the memory tier"""
+    cache = ResponseCache(max_entries=2, ttl=0, cache_dir="")
+    keys = [cache.make_key("medllama2", f"prompt {i}") for i in range(3)]
+
+    assert cache.get(keys[0]) is None
+    cache.set(keys[0], "response 0")
+    cache.set(keys[1], "response 1")
+    assert cache.get(keys[0]) == "response 0"
+
+    # keys[1] is now least recently used and gets evicted
+    cache.set(keys[2], "response 2")
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == "response 2"
+
+    stats = cache.snapshot()
+    print("Memory tier stats:", stats)
+    assert stats["memory_hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_disk_tier_and_versioning():
+    """Entries survive a restart and are invalidated by a version bump"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        first = ResponseCache(ttl=0, cache_dir=cache_dir, version="1")
+        key = first.make_key("medllama2", "prompt", {"temperature": 0})
+        first.set(key, "cached response")
+
+        restarted = ResponseCache(ttl=0, cache_dir=cache_dir, version="1")
+        assert restarted.get(key) == "cached response"
+        assert restarted.snapshot()["disk_hits"] == 1
+
+        bumped = ResponseCache(ttl=0, cache_dir=cache_dir, version="2")
+        assert bumped.make_key("medllama2", "prompt", {"temperature": 0}) != key
+        assert bumped.get(key) is None
+        print("Disk tier stats:", restarted.snapshot(), bumped.snapshot())
+
+
+if __name__ == "__main__":
+    test_memory_tier()
+    test_disk_tier_and_versioning()
+    print("All cache tests passed")
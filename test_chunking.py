@@ -0,0 +1,42 @@
+"""
+Test script for map-reduce analysis of long reports (no model server needed)
+"""
+
+import os
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils import Pipeline
+from Utils.Agents import Agent, SpecialistSynthesis
+
+
+async def analyse_section(agent):
+    return f"{agent.role} finding in {agent.medical_report}"
+
+
+async def synthesis_times_out(agent):
+    raise TimeoutError("model request timed out")
+
+
+def test_failed_reduce_keeps_section_analyses():
+    """When the synthesis call fails, the specialist reports its section analyses instead of failing"""
+    original = Agent.agenerate, SpecialistSynthesis.agenerate
+    Agent.agenerate, SpecialistSynthesis.agenerate = analyse_section, synthesis_times_out
+    try:
+        name, report, error = Pipeline.run_sync(
+            Pipeline._run_specialist("Cardiologist", "whole report", ["Visit 1", "Visit 2"])
+        )
+    finally:
+        Agent.agenerate, SpecialistSynthesis.agenerate = original
+
+    print("Fallback report:", report)
+    assert name == "Cardiologist" and error is None
+    assert "Cardiologist finding in Visit 1" in report and "Cardiologist finding in Visit 2" in report
+
+
+if __name__ == "__main__":
+    test_failed_reduce_keeps_section_analyses()
+    print("All chunking tests passed")
@@ -0,0 +1,129 @@
+"""
+Test script for coalescing identical concurrent diagnoses (no model server needed)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils import Pipeline
+from Utils.Agents import Agent
+from Utils.Coalesce import SingleFlight
+from Utils.Metrics import COALESCED_REQUESTS, COALESCED_CALLS_SAVED, tally_model_call
+from Utils.Results import ResultStore
+
+REPORT = "Patient reports chest pain, a persistent cough and trouble sleeping."
+
+
+def run_together(*coros):
+    """Run coroutines concurrently on the pipeline loop and return their results"""
+    async def gather():
+        return await asyncio.gather(*coros, return_exceptions=True)
+
+    return Pipeline.run_sync(gather())
+
+
+class FakeModel:
+    """Stands in for the agents' model calls, recording each role it answers"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate(self, agent):
+        self.calls.append(agent.role)
+        tally_model_call()
+        await asyncio.sleep(0.05)
+        return f"{agent.role} report"
+
+    async def generate_stream(self, agent):
+        yield await self.generate(agent)
+
+    @contextmanager
+    def installed(self):
+        """Patch the agents, with a fresh results store so nothing is answered from an earlier result"""
+        original = Agent.agenerate, Agent.agenerate_stream, Pipeline.result_store
+        model = self
+        Agent.agenerate = lambda agent: model.generate(agent)
+        Agent.agenerate_stream = lambda agent: model.generate_stream(agent)
+        with tempfile.TemporaryDirectory() as directory:
+            store = Pipeline.result_store = ResultStore(os.path.join(directory, "results.db"))
+            try:
+                yield
+            finally:
+                Agent.agenerate, Agent.agenerate_stream, Pipeline.result_store = original
+                store.flush()
+
+
+async def collect_events(stream_team):
+    return [event async for event in Pipeline.astream_diagnosis(REPORT, stream_team=stream_team)]
+
+
+def test_identical_diagnoses_share_one_run():
+    """Two identical diagnoses at once make one set of model calls, and both get the result"""
+    model = FakeModel()
+    requests_before = COALESCED_REQUESTS.values().get(("diagnosis",), 0)
+    saved_before = COALESCED_CALLS_SAVED.values().get(("diagnosis",), 0)
+    with model.installed():
+        first, second = run_together(Pipeline.arun_diagnosis(REPORT), Pipeline.arun_diagnosis(REPORT))
+
+    calls = model.calls
+    print("Model calls:", calls)
+    assert calls.count("MultidisciplinaryTeam") == 1 and len(calls) == len(set(calls))
+    assert first["final_diagnosis"] == second["final_diagnosis"] == "MultidisciplinaryTeam report"
+    assert first["result_id"] == second["result_id"]
+    assert [result.get("coalesced", False) for result in (first, second)].count(True) == 1
+    assert COALESCED_REQUESTS.values()[("diagnosis",)] == requests_before + 1
+    assert COALESCED_CALLS_SAVED.values()[("diagnosis",)] == saved_before + len(calls)
+
+
+def test_streaming_and_job_share_one_run():
+    """A streamed analysis and a queued job for the same report share one run; only the stream gets tokens"""
+    model = FakeModel()
+    with model.installed():
+        streamed, queued = run_together(collect_events(True), collect_events(False))
+
+    print("Model calls:", model.calls)
+    assert model.calls.count("MultidisciplinaryTeam") == 1
+    assert any(event["type"] == "token" for event in streamed)
+    assert not any(event["type"] == "token" for event in queued)
+    results = [events[-1] for events in (streamed, queued)]
+    assert all(result["type"] == "result" for result in results)
+    assert results[0]["final_diagnosis"] == results[1]["final_diagnosis"] == "MultidisciplinaryTeam report"
+    assert results[0]["result_id"] == results[1]["result_id"]
+
+
+def test_failure_reaches_every_caller():
+    """A failed run raises in every request that joined it, and the next request starts afresh"""
+    flights = SingleFlight("test")
+    runs = []
+
+    async def failing_run():
+        runs.append(len(runs))
+        yield {"type": "status", "stage": "specialists"}
+        await asyncio.sleep(0.05)
+        raise ConnectionError("model server unavailable")
+
+    async def collect():
+        return [event async for event in flights.stream("key", failing_run)]
+
+    results = run_together(collect(), collect())
+    print("Failed run results:", results)
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert len(runs) == 1 and flights.stats["joined"] == 1 and flights.in_flight() == 0
+
+    # Failures are not kept: the same key runs again
+    run_together(collect())
+    assert len(runs) == 2
+
+
+if __name__ == "__main__":
+    test_identical_diagnoses_share_one_run()
+    test_streaming_and_job_share_one_run()
+    test_failure_reaches_every_caller()
+    print("All coalescing tests passed")
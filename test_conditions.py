@@ -0,0 +1,120 @@
+"""
+Test script for the precomputed condition catalogue answers (no model server needed)
+"""
+
+import os
+import sys
+import tempfile
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils import Chatbot, Conditions
+from Utils.Conditions import ConditionAnswers
+
+CATALOGUE = {"flu": ["flu", "influenza"], "headache": ["headache", "migraine"]}
+
+
+class StubModel:
+    """Stands in for the model client, answering condition prompts and counting the calls"""
+
+    def __init__(self, model="stub-model", failing=()):
+        self.model = model
+        self.failing = set(failing)
+        self.prompts = []
+
+    def _answer(self, prompt):
+        self.prompts.append(prompt)
+        condition = next(c for c in CATALOGUE if f"information about {c}" in prompt)
+        if condition in self.failing:
+            raise ConnectionError("model server unavailable")
+        return f"About {condition} from {self.model}."
+
+    async def ainvoke(self, prompt, **params):
+        return self._answer(prompt)
+
+    async def astream(self, prompt, **params):
+        yield self._answer(prompt)
+
+
+def use_model(model):
+    """Point the condition store at a stub model; returns the original to restore"""
+    original = Conditions.get_llm
+    Conditions.get_llm = lambda: model
+    return original
+
+
+def test_refresh_and_reload():
+    """Missing answers are generated once, saved, and served from memory after a restart"""
+    model = StubModel()
+    original = use_model(model)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "condition_answers.json")
+            store = ConditionAnswers(CATALOGUE, path=path)
+            assert store.get("flu") is None
+            assert store.refresh() == 2 and len(model.prompts) == 2
+            assert store.get("flu") == "About flu from stub-model."
+
+            # Nothing is stale, so a second refresh makes no model calls
+            assert store.refresh() == 0 and len(model.prompts) == 2
+            restarted = ConditionAnswers(CATALOGUE, path=path)
+            assert restarted.get("headache") == "About headache from stub-model."
+            assert restarted.refresh() == 0
+            assert restarted.refresh(force=True) == 2 and len(model.prompts) == 4
+            print("Store stats:", restarted.stats)
+    finally:
+        Conditions.get_llm = original
+
+
+def test_outdated_answers_kept_until_regenerated():
+    """A changed model makes answers stale; one that fails to regenerate keeps being served"""
+    original = use_model(StubModel())
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            store = ConditionAnswers(CATALOGUE, path=os.path.join(directory, "condition_answers.json"))
+            store.refresh()
+
+            use_model(StubModel("new-model", failing={"headache"}))
+            assert store.refresh() == 2
+            assert store.get("flu") == "About flu from new-model."
+            assert store.get("headache") == "About headache from stub-model."
+            # The failed one is retried on the next refresh
+            use_model(StubModel("new-model"))
+            assert store.refresh() == 1
+            assert store.get("headache") == "About headache from new-model."
+    finally:
+        Conditions.get_llm = original
+
+
+def test_chat_falls_back_to_the_model():
+    """Chat serves stored answers without a model call, and generates and keeps a missing one"""
+    model = StubModel("chat-model")
+    original = use_model(model), Chatbot.condition_answers
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            store = Chatbot.condition_answers = ConditionAnswers(
+                CATALOGUE, path=os.path.join(directory, "condition_answers.json"))
+            store.put("flu", "Stored flu answer.")
+            chatbot = Chatbot.MedicalChatbot()
+            chatbot.model = model
+
+            assert chatbot.get_response("What are the symptoms of flu?") == "Stored flu answer."
+            assert model.prompts == []
+            reply = chatbot.get_response("Tell me about migraine")
+            print("Generated answer:", reply)
+            assert reply == "About headache from chat-model." and len(model.prompts) == 1
+            assert store.get("headache") == reply
+            # Streamed replies use the stored answer too
+            streamed = "".join(event["text"] for event in chatbot.stream_response("Is there a migraine remedy?"))
+            assert streamed == reply and len(model.prompts) == 1
+    finally:
+        Conditions.get_llm, Chatbot.condition_answers = original
+
+
+if __name__ == "__main__":
+    test_refresh_and_reload()
+    test_outdated_answers_kept_until_regenerated()
+    test_chat_falls_back_to_the_model()
+    print("All condition answer tests passed")
@@ -0,0 +1,87 @@
+"""
+Test script for PDF text extraction in the worker pool (no model server needed)
+"""
+
+import os
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils import Extraction
+
+
+def make_pdf(pages):
+    """A minimal PDF with one line of text per page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for n in range(pages):
+        text = f"BT /F1 12 Tf 72 720 Td (Page {n} notes) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+def test_short_and_long_documents():
+    """Short documents are read by one worker, long ones split across the pool, in page order"""
+    for pages in (3, 40):
+        text = Extraction.extract_pdf_bytes(make_pdf(pages))
+        print(f"{pages} pages:", len(text), "characters")
+        assert [f"Page {n} notes" in text for n in range(pages)] == [True] * pages
+        assert text.index("Page 1 notes") < text.index(f"Page {pages - 1} notes")
+
+
+def test_timeout_restarts_pool():
+    """An extraction that runs past the deadline fails and its workers are killed"""
+    pool = Extraction._get_pool()
+    Extraction.extract_pdf_bytes(make_pdf(1))
+    workers = list(pool._processes.values())
+
+    timeout = Extraction.PDF_EXTRACTION_TIMEOUT
+    Extraction.PDF_EXTRACTION_TIMEOUT = 0
+    try:
+        Extraction.extract_pdf_bytes(make_pdf(40))
+        raise AssertionError("extraction should have timed out")
+    except Exception as e:
+        print("Timed out:", e)
+        assert "timed out" in str(e)
+    finally:
+        Extraction.PDF_EXTRACTION_TIMEOUT = timeout
+
+    for worker in workers:
+        worker.join(5)
+    assert not any(worker.is_alive() for worker in workers)
+    assert Extraction._get_pool() is not pool
+    assert "Page 0 notes" in Extraction.extract_pdf_bytes(make_pdf(1))
+
+
+def test_page_limit():
+    """Documents over the page limit are rejected by the worker"""
+    try:
+        Extraction.extract_pdf_bytes(make_pdf(Extraction.PDF_MAX_PAGES + 1))
+        raise AssertionError("extraction should have been rejected")
+    except Exception as e:
+        print("Rejected:", e)
+        assert "too many pages" in str(e)
+
+
+if __name__ == "__main__":
+    test_short_and_long_documents()
+    test_timeout_restarts_pool()
+    test_page_limit()
+    print("All extraction tests passed")
@@ -0,0 +1,101 @@
+"""
+Test script for generation-time length limits, against a local fake Ollama server
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from benchmarks.fake_ollama import start_server
+from Utils import Ollama
+from Utils.Agents import Cardiologist, MultidisciplinaryTeam, alimit_words, generation_report, trim_words
+from Utils.Backends import BackendPool
+from Utils.Ollama import PooledOllama
+from Utils.Prompts import DEFAULT_LIMITS, PromptRegistry, prompt_registry
+
+
+def test_role_limits():
+    """Every role sends a token cap and stop sequences; the team gets a longer cap than the specialists"""
+    for role in ("Cardiologist", "Psychologist", "Pulmonologist", "SpecialistSynthesis"):
+        assert prompt_registry.get(role).generation_params() == {
+            "num_predict": 96, "stop": ["\n\n\n", "Patient Report:"]
+        }
+    team = prompt_registry.get("MultidisciplinaryTeam")
+    assert team.generation_params() == {"num_predict": 192, "stop": ["\n\n\n", "Given Reports:"]}
+    assert team.limits["word_limit"] == 120
+
+    # A role that sets some limits takes the defaults for the rest
+    registry = PromptRegistry({}, {}, {})
+    registry.register("Dermatologist", "Report: {medical_report}", {"num_predict": 48})
+    limits = registry.get("Dermatologist").limits
+    assert limits == {**DEFAULT_LIMITS, "num_predict": 48}
+    # Each call gets its own copy of the stop list
+    params = registry.get("Dermatologist").generation_params()
+    params["stop"].append("changed")
+    assert registry.get("Dermatologist").generation_params()["stop"] == DEFAULT_LIMITS["stop"]
+
+
+def test_limits_sent_to_model():
+    """The model is asked for at most num_predict tokens, and the answer is trimmed to the word limit"""
+    server = start_server(tokens=500, token_latency=0)
+    original = Ollama.backend_pool
+    Ollama.backend_pool = BackendPool([(server.base_url, 1)], health_interval=0)
+    try:
+        client = PooledOllama(model="medllama2", base_url=server.base_url)
+        before = generation_report().get("Cardiologist", {"generated_tokens": 0, "kept_tokens": 0})
+
+        # A report no earlier test has sent, so the response cache can't answer it
+        agent = Cardiologist(f"Chest pain on exertion, visit {uuid.uuid4()}")
+        agent.model = client
+        report = agent.generate()
+        print("Options sent:", server.last_options)
+        assert server.last_options["num_predict"] == 96
+        assert server.last_options["stop"] == ["\n\n\n", "Patient Report:"]
+        assert len(report.split()) == 60 and report.endswith("...")
+
+        after = generation_report()["Cardiologist"]
+        assert after["generated_tokens"] > before["generated_tokens"]
+        assert after["kept_tokens"] - before["kept_tokens"] < after["generated_tokens"] - before["generated_tokens"]
+
+        team = MultidisciplinaryTeam({"Cardiologist": report, "Pulmonologist": f"Clear lungs {uuid.uuid4()}"})
+        team.model = client
+        chunks = asyncio.run(collect(team.agenerate_stream()))
+        assert server.last_options["num_predict"] == 192
+        assert len("".join(chunks).split()) == 120
+    finally:
+        Ollama.backend_pool = original
+        server.shutdown()
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def test_stream_limit_matches_trim():
+    """A streamed response is cut at the same word as the same response trimmed whole"""
+    text = "Mild chest pain on exertion, relieved by rest; no palpitations. " * 5
+
+    async def stream(pieces):
+        for piece in pieces:
+            yield piece
+
+    def streamed(pieces, limit):
+        return "".join(asyncio.run(collect(alimit_words(stream(pieces), limit))))
+
+    # Arbitrary chunks, and one word with its trailing space per chunk as Ollama sends them
+    for pieces in ([text[i:i + 7] for i in range(0, len(text), 7)], [word + " " for word in text.split()]):
+        assert streamed(pieces, 20) == trim_words(text, 20)
+        assert streamed(pieces, 20).endswith("...") and len(streamed(pieces, 20).split()) == 20
+        # A response within the limit passes through untouched
+        assert streamed(pieces, 100) == text == trim_words(text, 100)
+
+if __name__ == "__main__":
+    test_role_limits()
+    test_limits_sent_to_model()
+    test_stream_limit_matches_trim()
+    print("All generation limit tests passed")
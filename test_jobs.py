@@ -0,0 +1,99 @@
+"""
+Test script for the background job queue (no model server needed)
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Jobs import JobQueue, QueueFullError
+
+
+def wait_until_finished(queue, job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.get(job.id).finished is None:
+        assert time.monotonic() < deadline, f"job {job.id} still {job.status}"
+        time.sleep(0.01)
+    return queue.get(job.id)
+
+
+def blocked_work(gate):
+    """Work that holds its worker until gate is set"""
+    async def work(job):
+        while not gate.is_set():
+            await asyncio.sleep(0.01)
+        return {"kind": job.kind}
+    return work
+
+
+def test_queue_full():
+    """Jobs beyond max_queued waiting for a worker are refused until the queue drains"""
+    queue = JobQueue(workers=1, max_queued=2)
+    gate = threading.Event()
+    running = queue.submit("analyze", blocked_work(gate))
+    while running.status != "running":
+        time.sleep(0.01)
+    waiting = [queue.submit("analyze", blocked_work(gate)) for _ in range(2)]
+    assert queue.depth() == 2
+    try:
+        queue.submit("analyze", blocked_work(gate))
+        raise AssertionError("submit should fail while the queue is full")
+    except QueueFullError as e:
+        print("Refused:", e)
+
+    gate.set()
+    for job in [running, *waiting]:
+        assert wait_until_finished(queue, job).status == "completed"
+    assert queue.depth() == 0
+    assert queue.submit("analyze", blocked_work(gate)) is not None
+
+
+def test_finished_jobs_are_evicted():
+    """Finished jobs stay pollable for the retention period; running jobs are never evicted"""
+    queue = JobQueue(workers=2, retention=0.1)
+    gate = threading.Event()
+
+    async def failing(job):
+        raise ValueError("unreadable report")
+
+    done = queue.submit("analyze", failing)
+    running = queue.submit("analyze", blocked_work(gate))
+    finished = wait_until_finished(queue, done)
+    assert finished.status == "failed" and finished.error == "unreadable report"
+    assert finished.to_dict()["job_id"] == done.id
+
+    time.sleep(0.2)
+    assert queue.get(done.id) is None
+    assert queue.get(running.id) is running and running.status == "running"
+    gate.set()
+    wait_until_finished(queue, running)
+
+
+def test_analyze_answers_503_when_full():
+    """/analyze answers 503 instead of queueing when the job queue is full"""
+    import app
+
+    original = app.job_queue
+    app.job_queue = JobQueue(workers=1, max_queued=0)
+    try:
+        response = app.app.test_client().post(
+            '/analyze', data={'report': (io.BytesIO(b"Chest pain since Monday."), 'report.txt')}
+        )
+    finally:
+        app.job_queue = original
+    print("Full queue:", response.status_code, response.get_json())
+    assert response.status_code == 503 and "full" in response.get_json()["error"]
+
+
+if __name__ == "__main__":
+    test_queue_full()
+    test_finished_jobs_are_evicted()
+    test_analyze_answers_503_when_full()
+    print("All job queue tests passed")
@@ -0,0 +1,88 @@
+"""
+Test script for the token-budgeted rolling summary memory (no model server needed)
+"""
+
+import os
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Memory import RollingSummaryMemory
+from Utils.Prompts import count_tokens
+
+
+class StubSummarizer:
+    """Answers every summary request with a fixed summary, counting the calls"""
+
+    def __init__(self, summary="Patient reported chest pain for three days."):
+        self.summary = summary
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return self.summary
+
+
+def save_turns(memory, count):
+    for n in range(count):
+        memory.save_context({"input": f"Turn {n}: my chest has hurt since Monday, " + "worse at night " * 4},
+                            {"response": f"Reply {n}: how severe is it, and does it spread? " + "Noted. " * 4})
+
+
+def wait_for_fold(memory):
+    # A finished fold may schedule the next one, so wait until none is running
+    folding = memory._folding
+    while folding is not None:
+        folding.result(5)
+        folding = memory._folding
+
+
+def test_history_stays_within_budget():
+    """Turns past the budget are left out of the prompt, and the latest exchange is always kept"""
+    memory = RollingSummaryMemory(max_token_limit=80)
+    save_turns(memory, 6)
+    history = memory.load_memory_variables({})["history"]
+    print("History tokens:", count_tokens(history), "of", memory.max_token_limit)
+    assert "Turn 5" in history and "Reply 5" in history
+    assert "Turn 0" not in history
+    assert len(memory.chat_memory.messages) == 12
+
+
+def test_old_turns_fold_into_summary():
+    """Turns that no longer fit are summarized in the background and dropped from the buffer"""
+    summarizer = StubSummarizer()
+    memory = RollingSummaryMemory(llm=summarizer, max_token_limit=80)
+    save_turns(memory, 6)
+    wait_for_fold(memory)
+
+    history = memory.load_memory_variables({})["history"]
+    print("Folded history:", history)
+    assert summarizer.prompts and "Turn 0" in summarizer.prompts[0]
+    assert memory.summary == summarizer.summary
+    assert history.startswith("Summary of earlier conversation: " + summarizer.summary)
+    assert "Turn 5" in history and "Turn 0" not in history
+    assert len(memory.chat_memory.messages) < 12
+    # The running size matches what is actually held
+    held = sum(len(message.content) for message in memory.chat_memory.messages)
+    assert memory.size() == held + len(memory.summary)
+
+
+def test_failed_fold_keeps_turns():
+    """A summary that fails leaves the buffer as it was, to be folded next time"""
+    class FailingSummarizer(StubSummarizer):
+        async def ainvoke(self, prompt):
+            raise ConnectionError("model server unavailable")
+
+    memory = RollingSummaryMemory(llm=FailingSummarizer(), max_token_limit=80)
+    save_turns(memory, 6)
+    wait_for_fold(memory)
+    assert memory.summary == "" and len(memory.chat_memory.messages) == 12
+
+
+if __name__ == "__main__":
+    test_history_stays_within_budget()
+    test_old_turns_fold_into_summary()
+    test_failed_fold_keeps_turns()
+    print("All conversation memory tests passed")
@@ -0,0 +1,100 @@
+"""
+Test script for the Prometheus text exposition of the metrics registry (no model server needed)
+"""
+
+import os
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Metrics import MetricsRegistry
+
+
+def test_counter_and_gauge_exposition():
+    """Each metric has HELP and TYPE lines, then one sample per label combination"""
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests_total", "Requests served", ["route", "status"])
+    requests.inc("/chat", "ok")
+    requests.inc("/chat", "ok")
+    requests.inc("/analyze", "error", amount=3)
+    registry.gauge("demo_queue_depth", "Jobs waiting", lambda: 4)
+    registry.gauge("demo_backend_healthy", "Backend health", lambda: {("http://b",): 0, ("http://a",): 1}, ["backend"])
+
+    lines = registry.render().splitlines()
+    print("\n".join(lines))
+    assert lines == [
+        "# HELP demo_requests_total Requests served",
+        "# TYPE demo_requests_total counter",
+        'demo_requests_total{route="/analyze",status="error"} 3',
+        'demo_requests_total{route="/chat",status="ok"} 2',
+        "# HELP demo_queue_depth Jobs waiting",
+        "# TYPE demo_queue_depth gauge",
+        "demo_queue_depth 4",
+        "# HELP demo_backend_healthy Backend health",
+        "# TYPE demo_backend_healthy gauge",
+        'demo_backend_healthy{backend="http://a"} 1',
+        'demo_backend_healthy{backend="http://b"} 0',
+    ]
+
+
+def test_histogram_exposition():
+    """Buckets are cumulative and end in +Inf, followed by the sum and count"""
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Stage latency", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        latency.observe(value, "team")
+
+    samples = registry.render().splitlines()[2:]
+    assert samples == [
+        'demo_seconds_bucket{stage="team",le="0.1"} 1',
+        'demo_seconds_bucket{stage="team",le="1"} 3',
+        'demo_seconds_bucket{stage="team",le="+Inf"} 4',
+        'demo_seconds_sum{stage="team"} 4.05',
+        'demo_seconds_count{stage="team"} 4',
+    ]
+
+
+def test_label_escaping_and_errors():
+    """Label values are escaped, and a gauge that raises doesn't break the rest of the page"""
+    registry = MetricsRegistry()
+    errors = registry.counter("demo_errors_total", "Errors", ["message"])
+    errors.inc('bad "quote" \\ and\nnewline')
+
+    def broken():
+        raise RuntimeError("store unavailable")
+
+    registry.gauge("demo_broken", "Raises when read", broken)
+    registry.gauge("demo_after", "Still rendered", lambda: 1)
+
+    text = registry.render()
+    assert 'demo_errors_total{message="bad \\"quote\\" \\\\ and\\nnewline"} 1\n' in text
+    assert "# TYPE demo_broken gauge\n# HELP demo_after Still rendered\n" in text
+    assert text.endswith("demo_after 1\n")
+
+    try:
+        registry.counter("demo_errors_total", "Registered twice")
+        raise AssertionError("registering a name twice should fail")
+    except ValueError:
+        pass
+
+
+def test_metrics_endpoint():
+    """/metrics serves the process registry with the exposition format's content type"""
+    import app
+
+    response = app.app.test_client().get('/metrics')
+    text = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE medintel_stage_duration_seconds histogram\n" in text
+    assert "# TYPE medintel_job_queue_depth gauge\nmedintel_job_queue_depth 0\n" in text
+
+
+if __name__ == "__main__":
+    test_counter_and_gauge_exposition()
+    test_histogram_exposition()
+    test_label_escaping_and_errors()
+    test_metrics_endpoint()
+    print("All metrics tests passed")
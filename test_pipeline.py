@@ -0,0 +1,100 @@
+"""
+Test script for the specialist fan-out when some specialists fail (no model server needed)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils import Pipeline
+from Utils.Agents import Agent
+from Utils.Chatbot import MedicalChatbot
+from Utils.Results import ResultStore
+
+REPORT = "Chest pain when climbing stairs and a dry cough at night."
+
+
+class StubModel:
+    """Stands in for the chatbot's model client, answering every prompt the same way"""
+
+    model = "stub-model"
+
+    def __init__(self, reply):
+        self.reply = reply
+
+    async def ainvoke(self, prompt, **params):
+        return self.reply
+
+    async def astream(self, prompt, **params):
+        yield self.reply
+
+
+@contextmanager
+def failing_specialists(*roles):
+    """Specialists in roles raise, the others and the team answer; yields the team's prompts"""
+    team_prompts = []
+
+    async def generate(agent):
+        await asyncio.sleep(0.01)
+        if agent.role in roles:
+            raise ConnectionError(f"{agent.role} model server unavailable")
+        return f"{agent.role} report"
+
+    async def generate_stream(agent):
+        team_prompts.append(agent.render_prompt())
+        yield "Team diagnosis"
+
+    original = Agent.agenerate, Agent.agenerate_stream, Pipeline.result_store
+    Agent.agenerate, Agent.agenerate_stream = generate, generate_stream
+    with tempfile.TemporaryDirectory() as directory:
+        store = Pipeline.result_store = ResultStore(os.path.join(directory, "results.db"))
+        try:
+            yield team_prompts
+        finally:
+            Agent.agenerate, Agent.agenerate_stream, Pipeline.result_store = original
+            store.flush()
+
+
+def test_failed_specialist_is_reported():
+    """A failed specialist is reported as failed, and the team works from the reports that came back"""
+    with failing_specialists("Pulmonologist") as team_prompts:
+        events = list(Pipeline.stream_diagnosis(REPORT))
+
+    specialists = {event["role"]: event for event in events if event["type"] == "specialist"}
+    result = events[-1]
+    print("Failed specialists:", result["failed_specialists"])
+    assert specialists["Pulmonologist"]["report"] is None
+    assert "unavailable" in specialists["Pulmonologist"]["error"]
+    assert specialists["Cardiologist"]["report"] == "Cardiologist report"
+    assert list(result["failed_specialists"]) == ["Pulmonologist"]
+    assert "Pulmonologist" not in result["specialist_reports"]
+    assert result["final_diagnosis"] == "Team diagnosis"
+    # The team is told the report is missing rather than given a canned one
+    assert "Pulmonologist Report: Not available (Pulmonologist analysis failed)." in team_prompts[0]
+    assert "Cardiologist Report: Cardiologist report" in team_prompts[0]
+
+
+def test_chatbot_notes_partial_assessment():
+    """The chatbot's reply says which reviews are missing from a partial assessment"""
+    chatbot = MedicalChatbot()
+    chatbot.model = StubModel("Primary symptoms: chest pain, dry cough")
+    with failing_specialists("Pulmonologist", "Cardiologist"):
+        reply = chatbot.process_symptoms("I get chest pain on the stairs and cough at night")
+
+    print("Reply:", reply)
+    assert reply.startswith("Primary symptoms: chest pain, dry cough")
+    assert reply.endswith("could not be completed: Cardiologist, Pulmonologist.") \
+        or reply.endswith("could not be completed: Pulmonologist, Cardiologist.")
+    assert set(chatbot.failed_specialists) == {"Cardiologist", "Pulmonologist"}
+
+
+if __name__ == "__main__":
+    test_failed_specialist_is_reported()
+    test_chatbot_notes_partial_assessment()
+    print("All pipeline tests passed")
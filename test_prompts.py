@@ -0,0 +1,87 @@
+"""
+Test script for the compiled prompt templates and the prompt registry (no model server needed)
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Prompts import DEFAULT_FALLBACK, DEFAULT_LIMITS, ROLE_FALLBACKS, CompiledPrompt, PromptRegistry
+
+
+def test_render_is_brace_safe():
+    """Report text is inserted as data, so braces in it are never parsed as variables"""
+    prompt = CompiledPrompt("Cardiologist", "Report: {medical_report}\nLiteral {{braces}} stay.")
+    assert prompt.input_variables == ["medical_report"]
+    report = 'BP {systolic}/{diastolic}, lab JSON {"k": 1} and a stray {'
+    rendered = prompt.render(medical_report=report)
+    print(rendered)
+    assert rendered == f"Report: {report}\nLiteral {{braces}} stay."
+
+
+def test_render_errors():
+    """A missing variable or a format spec in the template is a ValueError naming the role"""
+    prompt = CompiledPrompt("MultidisciplinaryTeam", "Reports:\n{specialist_reports}")
+    try:
+        prompt.render(medical_report="unused")
+        raise AssertionError("rendering without specialist_reports should fail")
+    except ValueError as e:
+        assert "specialist_reports" in str(e) and "MultidisciplinaryTeam" in str(e)
+
+    for template in ("Report: {medical_report:>20}", "Report: {medical_report!r}"):
+        try:
+            CompiledPrompt("Cardiologist", template)
+            raise AssertionError(f"{template!r} should be refused")
+        except ValueError as e:
+            print("Refused:", e)
+
+
+def test_registry_defaults():
+    """Built-in roles are registered with their limits and fallbacks; unknown roles are refused"""
+    registry = PromptRegistry()
+    assert {"Cardiologist", "Psychologist", "Pulmonologist", "MultidisciplinaryTeam"} <= set(registry.roles())
+    cardiologist = registry.get("Cardiologist")
+    assert cardiologist.fallback == ROLE_FALLBACKS["Cardiologist"]
+    assert cardiologist.generation_params() == {"num_predict": 96, "stop": DEFAULT_LIMITS["stop"]}
+    assert registry.get("MultidisciplinaryTeam").limits["word_limit"] == 120
+    assert registry.get("MultidisciplinaryTeam").fallback == DEFAULT_FALLBACK
+    try:
+        registry.get("Dermatologist")
+        raise AssertionError("an unregistered role should be refused")
+    except ValueError:
+        pass
+
+
+def test_load_dir():
+    """Every JSON file in the directory registers a role; other files are ignored"""
+    registry = PromptRegistry(templates={}, limits={}, fallbacks={})
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "dermatologist.json"), "w", encoding="utf-8") as f:
+            json.dump({"role": "Dermatologist", "template": "Skin findings in: {medical_report}",
+                       "word_limit": 40, "stop": ["END"], "fallback": "No skin findings."}, f)
+        with open(os.path.join(directory, "neurologist.json"), "w", encoding="utf-8") as f:
+            json.dump({"role": "Neurologist", "template": "Neurological findings in: {medical_report}"}, f)
+        with open(os.path.join(directory, "README.txt"), "w", encoding="utf-8") as f:
+            f.write("not a role")
+        registry.load_dir(directory)
+
+    assert registry.roles() == ["Dermatologist", "Neurologist"]
+    dermatologist = registry.get("Dermatologist")
+    assert dermatologist.limits == {"word_limit": 40, "num_predict": 96, "stop": ["END"]}
+    assert dermatologist.fallback == "No skin findings."
+    assert dermatologist.render(medical_report="{rash}") == "Skin findings in: {rash}"
+    neurologist = registry.get("Neurologist")
+    assert neurologist.limits == DEFAULT_LIMITS and neurologist.fallback == DEFAULT_FALLBACK
+
+
+if __name__ == "__main__":
+    test_render_is_brace_safe()
+    test_render_errors()
+    test_registry_defaults()
+    test_load_dir()
+    print("All prompt tests passed")
@@ -0,0 +1,69 @@
+"""
+Test script for the diagnosis results store (no model server needed)
+"""
+
+import os
+import sys
+import tempfile
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Results import ResultStore
+
+
+def make_result(n, failed=None):
+    return {
+        "specialist_reports": {"Cardiologist": f"report {n}"},
+        "final_diagnosis": f"diagnosis {n}",
+        "failed_specialists": failed or {},
+        "routing": {"Cardiologist": {"run": True, "score": 1}},
+    }
+
+
+def test_lookup_before_and_after_write():
+    """A saved diagnosis is found straight away, and again from disk after a restart"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.db")
+        store = ResultStore(path, flush_seconds=60)
+        result_id = store.save("key", "hash", make_result(1), {"total": 1.5}, "medllama2", "1", "report.txt")
+        store.save("failed-key", "hash", make_result(2, {"Cardiologist": "timed out"}), {}, "medllama2", "1")
+
+        # Still queued for the writer, but visible to lookups
+        assert store.lookup("key")["id"] == result_id
+        assert store.lookup("failed-key") is None
+
+        store.flush()
+        restarted = ResultStore(path)
+        stored = restarted.lookup("key")
+        print("Stored diagnosis:", stored)
+        assert stored["final_diagnosis"] == "diagnosis 1"
+        assert stored["timings"] == {"total": 1.5} and stored["report_name"] == "report.txt"
+        assert restarted.get(result_id)["specialist_reports"] == {"Cardiologist": "report 1"}
+        assert store.stats["batches"] == 1 and store.stats["written"] == 2
+
+
+def test_pagination():
+    """Pages come newest first, and can be narrowed to one report"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = ResultStore(os.path.join(directory, "results.db"), flush_seconds=0)
+        ids = [store.save(f"key {n}", f"hash {n % 2}", make_result(n), {}, "medllama2", "1") for n in range(5)]
+        store.flush()
+
+        first = store.query(page=1, per_page=2)
+        last = store.query(page=3, per_page=2)
+        print("First page:", [row["id"] for row in first["results"]], "of", first["total"])
+        assert first["total"] == 5 and first["pages"] == 3
+        assert [row["id"] for row in first["results"]] == [ids[4], ids[3]]
+        assert [row["id"] for row in last["results"]] == [ids[0]]
+        assert "final_diagnosis" not in first["results"][0]
+
+        one_report = store.query(report_hash="hash 0")
+        assert one_report["total"] == 3
+
+
+if __name__ == "__main__":
+    test_lookup_before_and_after_write()
+    test_pagination()
+    print("All results store tests passed")
@@ -0,0 +1,82 @@
+"""
+Test script checking the intent router against the original keyword classifier (no model server needed)
+"""
+
+import os
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Router import CONDITION_TERMS, QUESTION_PATTERNS, REFERENCE_PATTERNS, INTENT_KEYWORDS, IntentRouter, intent_router
+
+
+# The chatbot's original checks, scanning each table in turn
+def reference_condition(text):
+    text_lower = text.lower()
+    for patterns in (QUESTION_PATTERNS, REFERENCE_PATTERNS):
+        for condition, terms in CONDITION_TERMS.items():
+            for term in terms:
+                if any(pattern.format(term=term) in text_lower for pattern in patterns):
+                    return condition
+    return None
+
+
+def reference_intents(text):
+    text_lower = text.lower()
+    return {intent for intent, keywords in INTENT_KEYWORDS.items()
+            if any(keyword in text_lower for keyword in keywords)}
+
+
+CORPUS = [
+    "What are the symptoms of flu?",
+    "signs of influenza in adults",
+    "What is covid-19?",
+    "Do I have a cold or the flu?",
+    "Tell me about migraine",
+    "any treatment for indigestion?",
+    "what about allergies",
+    "Is there a fever remedy I can take at home?",
+    "How do I know if I have coronavirus",
+    "I have had chest pain and shortness of breath for three days",
+    "I feel anxious and can't sleep",
+    "My stomach ache started yesterday after dinner",
+    "Should I see a doctor about this?",
+    "Can I book an appointment with a specialist?",
+    "What medication helps with that?",
+    "Thanks, that's helpful",
+    "hello",
+    "What is the common cold and do I need a doctor?",
+    "about covid19 medicine and treatment for the flu",
+    "HIGH TEMPERATURE since Monday",
+    "",
+]
+
+
+def test_matches_reference_classifier():
+    """Conditions and intents agree with the original classifier on every message"""
+    for text in CORPUS:
+        condition, intents = intent_router.classify(text)
+        assert condition == reference_condition(text), (text, condition, reference_condition(text))
+        assert intents == reference_intents(text), (text, intents, reference_intents(text))
+    print(f"Router agrees with the reference classifier on {len(CORPUS)} messages")
+
+
+def test_extending_tables():
+    """Conditions and keywords added later are matched on the next message, without a build on first use"""
+    router = IntentRouter()
+    router.add_condition("asthma", ["asthma"])
+    router.add_keywords("doctor", ["gp"])
+    # Extending the tables rebuilds the automaton, not the next classification
+    automaton = router._automaton
+    condition, intents = router.classify("What is asthma? Should I call my GP?")
+    print("Extended router:", condition, sorted(intents))
+    assert condition == "asthma" and "doctor" in intents
+    assert router._automaton is automaton
+
+
+if __name__ == "__main__":
+    test_matches_reference_classifier()
+    test_extending_tables()
+    print("All intent router tests passed")
@@ -0,0 +1,61 @@
+"""
+Test script for routing reports to the relevant specialists (no model server needed)
+"""
+
+import os
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Chunking import RelevanceScorer
+from Utils.Pipeline import route_specialists
+from Utils.Specialists import load_specialists
+
+SPECIALISTS = load_specialists()
+ALL_TERMS = {role: config["terms"] for role, config in SPECIALISTS.items()}
+ENABLED = [role for role, config in SPECIALISTS.items() if config.get("enabled", True)]
+
+# Report text and the enabled specialists it should be sent to
+ROUTING_TABLE = [
+    ("Crushing chest pain radiating to the left arm since this morning.", {"Cardiologist", "Pulmonologist"}),
+    ("Chest tightness when climbing stairs.", {"Cardiologist", "Pulmonologist"}),
+    ("Palpitations and a racing heart at night.", {"Cardiologist"}),
+    ("Blood pressure 160/100 on two readings.", {"Cardiologist"}),
+    ("Productive cough and wheezing for two weeks.", {"Pulmonologist"}),
+    ("Short of breath and breathless on exertion.", {"Pulmonologist"}),
+    ("Pleuritic pain, worse on deep inspiration.", {"Pulmonologist"}),
+    ("Panic attacks, feeling anxious and sleeping badly.", {"Psychologist"}),
+    ("Low mood and feeling depressed since losing her job.", {"Psychologist"}),
+    ("Heart racing during panic attacks.", {"Cardiologist", "Psychologist"}),
+    # Heartburn is not a heart term; with nothing to route on, everyone runs
+    ("Heartburn and reflux after meals.", set(ENABLED)),
+]
+
+
+def test_routing_table():
+    """Each report is routed to the specialists whose terms it mentions as words"""
+    for text, expected in ROUTING_TABLE:
+        decisions = route_specialists(text, ENABLED)
+        routed = {role for role, decision in decisions.items() if decision["run"]}
+        assert routed == expected, (text, routed, expected)
+    print(f"Routed {len(ROUTING_TABLE)} reports as expected")
+
+
+def test_word_boundaries():
+    """Terms match whole words and plurals; only terms ending in * match longer words"""
+    scores = RelevanceScorer(ALL_TERMS).score("Heartburn, bloating and nauseous after meals.")
+    print("Heartburn scores:", scores)
+    assert scores["Cardiologist"] == 0 and scores["Gastroenterologist"] == 3
+
+    scorer = RelevanceScorer({"Cardiologist": ["heart", "palpitation"], "Pulmonologist": ["breath*"]})
+    assert scorer.score("Palpitations; her heart's racing and she is breathing fast")["Cardiologist"] == 2
+    assert scorer.score("Palpitations; her heart's racing and she is breathing fast")["Pulmonologist"] == 1
+    assert scorer.score("sweetheart, heartless, heartburn") == {"Cardiologist": 0, "Pulmonologist": 0}
+
+
+if __name__ == "__main__":
+    test_routing_table()
+    test_word_boundaries()
+    print("All specialist routing tests passed")
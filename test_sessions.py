@@ -0,0 +1,134 @@
+"""
+Test script for the bounded chatbot session store (no model server needed)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils.Metrics import SESSION_EVICTIONS
+from Utils.Sessions import SessionStore
+
+
+class FakeSession:
+    """Stands in for MedicalChatbot: a list of messages that can be saved and restored"""
+
+    def __init__(self, messages=None):
+        self.messages = list(messages or [])
+
+    def to_state(self):
+        return {"messages": self.messages}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["messages"])
+
+    def estimated_size(self):
+        return sum(len(message) for message in self.messages)
+
+
+def touch(store, user_id, message=None):
+    """One request: pin the session, optionally add a message, release it"""
+    with store.use(user_id) as session:
+        if message is not None:
+            session.messages.append(message)
+    return session
+
+
+def test_capacity_and_rehydrate():
+    """The least recently used session is spilled to disk and comes back on its next request"""
+    lru_before = SESSION_EVICTIONS.values().get(("lru",), 0)
+    with tempfile.TemporaryDirectory() as spill_dir:
+        store = SessionStore(FakeSession, max_entries=2, spill_dir=spill_dir)
+        touch(store, "alice", "chest pain")
+        touch(store, "bob", "cough")
+        touch(store, "alice")
+        touch(store, "carol", "headache")
+
+        metrics = store.metrics()
+        print("After capacity eviction:", metrics)
+        assert metrics["live_sessions"] == 2 and metrics["evicted_capacity"] == 1
+        assert SESSION_EVICTIONS.values()[("lru",)] == lru_before + 1
+        assert os.path.exists(os.path.join(spill_dir, "bob.json"))
+        assert oct(os.stat(os.path.join(spill_dir, "bob.json")).st_mode & 0o777) == "0o600"
+
+        assert touch(store, "bob").messages == ["cough"]
+        assert store.metrics()["rehydrated"] == 1
+        assert not os.path.exists(os.path.join(spill_dir, "bob.json"))
+        assert store.acquire("nobody", create=False) is None
+
+
+def test_idle_and_memory_eviction():
+    """Idle sessions are evicted by the sweeper, and the oldest go first when memory is over budget"""
+    evictions_before = SESSION_EVICTIONS.values()
+    with tempfile.TemporaryDirectory() as spill_dir:
+        store = SessionStore(FakeSession, idle_ttl=0.05, spill_dir=spill_dir)
+        touch(store, "alice", "chest pain")
+        time.sleep(0.1)
+        store.sweep()
+        assert store.metrics()["evicted_idle"] == 1 and store.metrics()["live_sessions"] == 0
+
+        store = SessionStore(FakeSession, max_memory_bytes=20, spill_dir=spill_dir)
+        touch(store, "bob", "x" * 10)
+        touch(store, "carol", "y" * 10)
+        # Carol's request grows her session, so Bob's is evicted on release
+        touch(store, "carol", "z" * 5)
+        metrics = store.metrics()
+        print("After memory eviction:", metrics)
+        assert metrics["evicted_memory"] == 1 and metrics["estimated_memory_bytes"] == 15
+
+    # Both are also counted on /metrics, by reason
+    evictions = SESSION_EVICTIONS.values()
+    for reason in ("ttl", "memory"):
+        assert evictions[(reason,)] == evictions_before.get((reason,), 0) + 1
+
+
+def test_sessions_in_use_are_kept():
+    """A pinned session is never evicted, so a request's updates are not lost"""
+    with tempfile.TemporaryDirectory() as spill_dir:
+        store = SessionStore(FakeSession, max_entries=1, spill_dir=spill_dir)
+        with store.use("alice") as alice:
+            touch(store, "bob", "cough")
+            store.sweep()
+            alice.messages.append("chest pain")
+            metrics = store.metrics()
+            print("While Alice's request runs:", metrics)
+            assert metrics["pinned_sessions"] == 1 and metrics["evicted_capacity"] == 1
+        assert touch(store, "alice").messages == ["chest pain"]
+        assert touch(store, "bob").messages == ["cough"]
+
+
+def test_slow_load_outside_lock():
+    """Creating one user's session doesn't hold up another user's request"""
+    started = threading.Event()
+
+    class SlowSession(FakeSession):
+        def __init__(self, messages=None):
+            started.set()
+            time.sleep(0.3)
+            super().__init__(messages)
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        store = SessionStore(SlowSession, spill_dir=spill_dir)
+        creating = threading.Thread(target=touch, args=(store, "alice"))
+        creating.start()
+        started.wait()
+        began = time.monotonic()
+        store.metrics()
+        assert time.monotonic() - began < 0.1
+        creating.join()
+        assert store.metrics()["created"] == 1
+
+
+if __name__ == "__main__":
+    test_capacity_and_rehydrate()
+    test_idle_and_memory_eviction()
+    test_sessions_in_use_are_kept()
+    test_slow_load_outside_lock()
+    print("All session store tests passed")
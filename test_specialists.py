@@ -0,0 +1,112 @@
+"""
+Test script for the configured specialist registry and N-way fan-out (no model server needed)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from Utils import Pipeline
+from Utils.Agents import Agent
+from Utils.Prompts import prompt_registry
+from Utils.Results import ResultStore
+from Utils.Specialists import SpecialistRegistry, load_specialists, specialist_registry
+
+EXTRA_SPECIALISTS = {
+    "TestDermatologist": {
+        "template": "You are a dermatologist.\n\nPatient Report: {medical_report}",
+        "word_limit": 40,
+        "fallback": "No skin findings.",
+        "terms": ["rash", "itch*"],
+    },
+    "TestEndocrinologist": {
+        "template": "You are an endocrinologist.\n\nPatient Report: {medical_report}",
+        "terms": ["thyroid"],
+    },
+    "TestRheumatologist": {
+        "enabled": False,
+        "template": "You are a rheumatologist.\n\nPatient Report: {medical_report}",
+        "terms": ["joint"],
+    },
+}
+
+
+def test_registry_loading():
+    """Enabled specialists are registered in file order with their own prompts; disabled ones are left out"""
+    assert specialist_registry.names() == ["Cardiologist", "Psychologist", "Pulmonologist"]
+    assert {"Neurologist", "Gastroenterologist"} <= set(load_specialists())
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "specialists.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"Cardiologist": {"terms": ["heart"]}, **EXTRA_SPECIALISTS}, f)
+        registry = SpecialistRegistry(load_specialists(path))
+
+    print("Loaded specialists:", registry.names())
+    assert registry.names() == ["Cardiologist", "TestDermatologist", "TestEndocrinologist"]
+    dermatologist = prompt_registry.get("TestDermatologist")
+    assert dermatologist.limits["word_limit"] == 40 and dermatologist.limits["num_predict"] == 96
+    assert dermatologist.fallback == "No skin findings."
+    agent = registry.create("TestDermatologist", "Itchy rash on both arms.")
+    assert agent.render_prompt().endswith("Patient Report: Itchy rash on both arms.")
+    assert registry.scorer().score("An itchy rash")["TestDermatologist"] == 2
+
+    for bad in (lambda: registry.create("TestRheumatologist", "report"),
+                lambda: registry.register("Podiatrist", {"terms": ["foot"]})):
+        try:
+            bad()
+            raise AssertionError("an unknown or template-less specialist should be refused")
+        except ValueError as e:
+            print("Refused:", e)
+
+
+def test_fan_out_to_every_specialist():
+    """Every enabled specialist runs at once, and the team gets one report line per specialist"""
+    registry = SpecialistRegistry({
+        **{role: {"terms": []} for role in ("Cardiologist", "Psychologist", "Pulmonologist")},
+        **EXTRA_SPECIALISTS,
+    })
+    running = []
+    most_running = []
+    team_prompts = []
+
+    async def generate(agent):
+        running.append(agent.role)
+        most_running.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(agent.role)
+        return f"{agent.role} report"
+
+    async def generate_stream(agent):
+        team_prompts.append(agent.render_prompt())
+        yield "Team diagnosis"
+
+    original = Agent.agenerate, Agent.agenerate_stream, Pipeline.specialist_registry, Pipeline.result_store
+    Agent.agenerate, Agent.agenerate_stream = generate, generate_stream
+    Pipeline.specialist_registry = registry
+    with tempfile.TemporaryDirectory() as directory:
+        store = Pipeline.result_store = ResultStore(os.path.join(directory, "results.db"))
+        try:
+            # Nothing in the report matches any specialist's terms, so all of them run
+            result = Pipeline.run_diagnosis("Patient feels generally unwell.")
+        finally:
+            Agent.agenerate, Agent.agenerate_stream, Pipeline.specialist_registry, Pipeline.result_store = original
+            store.flush()
+
+    print("Specialist reports:", list(result["specialist_reports"]))
+    assert list(result["specialist_reports"]) == registry.names() and len(registry.names()) == 5
+    assert max(most_running) == 5
+    report_lines = [line for line in team_prompts[0].splitlines() if " Report: " in line]
+    assert len(report_lines) == 5 and "TestEndocrinologist Report: TestEndocrinologist report" in report_lines
+
+
+if __name__ == "__main__":
+    test_registry_loading()
+    test_fan_out_to_every_specialist()
+    print("All specialist registry tests passed")
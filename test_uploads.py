@@ -0,0 +1,106 @@
+"""
+Test script for in-memory upload handling (no model server needed)
+"""
+
+import hashlib
+import io
+import os
+import sys
+
+# Ensure we're working from the project root
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from flask import Flask, jsonify, request
+
+from Utils.Extraction import text_cache
+from Utils.Uploads import Upload, UploadRequest
+
+
+class SmallUploadRequest(UploadRequest):
+    upload_max_bytes = 4096
+    upload_spool_bytes = 1024
+
+
+def make_app():
+    """A minimal app that keeps each upload past the end of its request, like a queued job"""
+    app = Flask(__name__)
+    app.request_class = SmallUploadRequest
+    app.uploads = []
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        received = Upload(request.files['report'])
+        app.uploads.append(received)
+        return jsonify({'sha256': received.sha256, 'size': received.size,
+                        'in_memory': received.in_memory})
+
+    return app
+
+
+def post(client, data, filename="report.txt"):
+    return client.post('/upload', data={'report': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+def test_spooling_and_hashing():
+    """Small uploads stay in memory, larger ones spool to disk; both are hashed on arrival"""
+    app = make_app()
+    client = app.test_client()
+
+    small = b"Patient reports chest pain."
+    large = b"Follow-up visit. " * 150
+    for data, in_memory in ((small, True), (large, False)):
+        response = post(client, data)
+        body = response.get_json()
+        print("Upload:", body)
+        assert response.status_code == 200
+        assert body['sha256'] == hashlib.sha256(data).hexdigest()
+        assert body['size'] == len(data) and body['in_memory'] is in_memory
+
+    # The request has finished, but the uploads are still readable
+    assert app.uploads[0].read_text() == small.decode()
+    assert app.uploads[1].read_text() == large.decode()
+    for upload in app.uploads:
+        upload.close()
+
+
+def test_size_limit():
+    """An upload over the limit is rejected with 413 while it is being received"""
+    app = make_app()
+    response = post(app.test_client(), b"x" * 5000)
+    print("Oversized upload:", response.status_code)
+    assert response.status_code == 413
+    assert not app.uploads
+
+
+def test_read_text_from_the_spool():
+    """Text is decoded straight from the spool, and a cached PDF's spool is never read"""
+    app = make_app()
+    client = app.test_client()
+
+    text = "Line one\r\nCaf\u00e9 visit. " * 100
+    for data in (text[:200].encode(), text.encode()):
+        assert post(client, data).status_code == 200
+    assert [upload.in_memory for upload in app.uploads] == [True, False]
+    assert app.uploads[0].read_text() == text[:200]
+    assert app.uploads[1].read_text() == text
+
+    # Not a parseable PDF, so this only passes if the cached text is used
+    pdf = b"%PDF-1.4 not really a pdf"
+    post(client, pdf, "scan.pdf")
+    text_cache.set(hashlib.sha256(pdf).hexdigest(), "Cached scan text.")
+    upload = app.uploads[2]
+    reads = []
+    original_read = upload._stream.read
+    upload._stream.read = lambda *args: reads.append(args) or original_read(*args)
+    assert upload.read_text() == "Cached scan text." and reads == []
+    for upload in app.uploads:
+        upload.close()
+
+
+if __name__ == "__main__":
+    test_spooling_and_hashing()
+    test_size_limit()
+    test_read_text_from_the_spool()
+    print("All upload tests passed")